@@ -0,0 +1,97 @@
+import hashlib
+import mimetypes
+import os
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+
+from .compression import encodings, negotiate
+from .http_cache import etag_match, variant_etag
+
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", str(365 * 24 * 3600)))
+
+
+# ------------------ STATIC ASSETS ------------------ #
+#
+# Every file under the static directory is read once at startup, hashed
+# and precompressed (gzip, and brotli when the module is installed).
+# Each file is served under two names:
+#   /static/js/app.3f2a9c1b7d4e.js  immutable, cached by browsers for a year
+#   /static/js/app.js               revalidated (ETag) on every use
+# Pages link the hashed names through static_url(), so a deploy changes
+# the URLs of whatever changed and browsers never revalidate the rest.
+# Files changed on disk are picked up on restart.
+
+class Asset:
+    """A body with its precompressed variants, each with its own strong ETag."""
+
+    def __init__(self, body, content_type):
+        self.content_type = content_type
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.etag = f'"{self.digest[:32]}"'
+        self.variants = encodings(body, content_type)
+
+    def response(self, headers, cache_control):
+        """The variant negotiated from request `headers`, or a 304."""
+        coding = negotiate(headers.get("accept-encoding"), self.variants)
+        common = {"ETag": variant_etag(self.etag, coding), "Cache-Control": cache_control}
+        if len(self.variants) > 1:
+            common["Vary"] = "Accept-Encoding"
+        if etag_match(headers.get("if-none-match"), self.etag):
+            # headers of the variant a 200 would have sent
+            return Response(status_code=304, headers=common)
+        if coding != "identity":
+            common["Content-Encoding"] = coding
+        return Response(self.variants[coding], media_type=self.content_type, headers=common)
+
+
+def _content_type(path):
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type == "application/javascript":
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+class StaticAssets:
+    """ASGI app serving a directory from memory, by plain and hashed name."""
+
+    def __init__(self, directory, prefix="/static"):
+        self.prefix = prefix
+        self.assets = {}  # served path -> (Asset, immutable)
+        self.hashed = {}  # plain path -> hashed path
+        for root, _, files in os.walk(directory):
+            for name in sorted(files):
+                full = os.path.join(root, name)
+                path = os.path.relpath(full, directory).replace(os.sep, "/")
+                with open(full, "rb") as f:
+                    asset = Asset(f.read(), _content_type(path))
+                stem, ext = os.path.splitext(path)
+                hashed = f"{stem}.{asset.digest[:12]}{ext}"
+                self.assets[path] = (asset, False)
+                self.assets[hashed] = (asset, True)
+                self.hashed[path] = hashed
+
+    def url(self, path):
+        """Immutable URL of the static file `path` (relative to the directory)."""
+        return f"{self.prefix}/{self.hashed[path]}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["method"] not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405)
+        else:
+            entry = self.assets.get(scope["path"][len(scope.get("root_path", "")):].lstrip("/"))
+            if entry is None:
+                response = PlainTextResponse("Not Found", status_code=404)
+            else:
+                asset, immutable = entry
+                cache_control = (
+                    f"public, max-age={STATIC_MAX_AGE}, immutable" if immutable else "no-cache"
+                )
+                response = asset.response(Headers(scope=scope), cache_control)
+        await response(scope, receive, send)
+
+
+def render_page(templates, name, **context):
+    """Render template `name` once into an Asset (HTML, precompressed)."""
+    html = templates.get_template(name).render(**context)
+    return Asset(html.encode("utf-8"), "text/html; charset=utf-8")
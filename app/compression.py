@@ -0,0 +1,78 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # optional, static assets fall back to gzip
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+
+# media types worth compressing; everything else (images, archives) is
+# sent as it is
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+
+
+# ------------------ CONTENT ENCODING ------------------ #
+#
+# Bodies that are known ahead of time (static files, the rendered index
+# page, cached report JSON) are compressed once and kept next to the
+# original; requests then only pick a variant. Dynamic responses are
+# compressed on the way out by GZipMiddleware (see main.py).
+
+def compressible(content_type):
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def encodings(body, content_type, codings=("gzip", "br")):
+    """
+    {"identity": body, "gzip": ..., "br": ...} for `body`, keeping only
+    variants that are actually smaller. Small or incompressible bodies get
+    the identity variant alone.
+    """
+    variants = {"identity": body}
+    if len(body) < COMPRESS_MIN_SIZE or not compressible(content_type):
+        return variants
+    candidates = {}
+    if "gzip" in codings:
+        candidates["gzip"] = gzip.compress(body, GZIP_LEVEL, mtime=0)
+    if "br" in codings and brotli is not None:
+        candidates["br"] = brotli.compress(body, quality=11)
+    for coding, encoded in candidates.items():
+        if len(encoded) < len(body):
+            variants[coding] = encoded
+    return variants
+
+
+def accepted(header):
+    """Codings the client accepts (q > 0) from an Accept-Encoding header."""
+    codings = set()
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().lower().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            codings.add(coding)
+    return codings
+
+
+def negotiate(header, variants):
+    """Best coding in `variants` for the Accept-Encoding `header`."""
+    codings = accepted(header)
+    for coding in ("br", "gzip"):
+        if coding in variants and (coding in codings or "*" in codings):
+            return coding
+    return "identity"
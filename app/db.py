@@ -1,10 +1,827 @@
-
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import random
+import re
 import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
-DB_PATH = Path(__file__).resolve().parent / "library.db"
+from . import metrics
 
-def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+DB_PATH = Path(os.getenv("LIBRARY_DB_PATH", Path(__file__).resolve().parent / "library.db"))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "20000"))
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(DB_POOL_SIZE)))
+DB_WRITE_RETRIES = int(os.getenv("DB_WRITE_RETRIES", "5"))
+DB_WRITE_RETRY_BACKOFF_MS = float(os.getenv("DB_WRITE_RETRY_BACKOFF_MS", "20"))
+# group commit: most operations per transaction, and how long the writer
+# waits for more operations once a group has started
+DB_WRITE_GROUP_SIZE = int(os.getenv("DB_WRITE_GROUP_SIZE", "64"))
+DB_WRITE_GROUP_WAIT_MS = float(os.getenv("DB_WRITE_GROUP_WAIT_MS", "0"))
+# slow-query log: off unless a threshold is set
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "0"))
+DB_SLOW_QUERY_MAX_ENTRIES = int(os.getenv("DB_SLOW_QUERY_MAX_ENTRIES", "200"))
+DB_SLOW_QUERY_SCAN_ROWS = int(os.getenv("DB_SLOW_QUERY_SCAN_ROWS", "10000"))
+
+logger = logging.getLogger(__name__)
+
+
+def _connect(readonly=False):
+    """
+    Open a raw connection and apply the per-connection pragmas once.
+    Read-only connections (mode=ro, query_only) read WAL snapshots and
+    never take the write lock.
+    """
+    if readonly:
+        uri = f"{Path(DB_PATH).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only=1")
+    else:
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    # negative cache_size is in KiB rather than pages
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
+
+
+# ------------------ STATEMENT TIMING ------------------ #
+#
+# Pooled connections hand out TimedCursor wrappers, which record every
+# statement in the db_statement_duration_seconds histogram, labelled by
+# operation and first table (not by SQL text, to keep cardinality low).
+# Time spent fetching rows is added to db_fetch_seconds_total.
+
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+\"?(\w+)", re.IGNORECASE)
+
+
+_DML = {"select", "insert", "update", "delete", "replace", "with"}
+
+
+@lru_cache(maxsize=2048)
+def statement_labels(sql):
+    words = sql.split(None, 1)
+    op = words[0].lower() if words else ""
+    match = _TABLE_RE.search(sql) if op in _DML else None
+    return op, match.group(1) if match else ""
+
+
+# rows fetched per step when a TimedCursor is iterated
+_ITER_BATCH = 256
+
+
+class TimedCursor:
+    """sqlite3.Cursor proxy that times execute and fetch calls."""
+
+    __slots__ = ("_cur", "_labels", "_sql", "_params", "_spent", "_slow")
+
+    def __init__(self, cur):
+        self._cur = cur
+        self._labels = ("", "")
+        self._sql, self._params = "", None
+        self._spent, self._slow = 0.0, None
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def __iter__(self):
+        # in batches through fetchmany, so `for row in cur` is timed (fetch
+        # metrics and slow-query log) like fetchall, at little cost per row
+        while True:
+            rows = self.fetchmany(_ITER_BATCH)
+            if not rows:
+                return
+            yield from rows
+
+    def _run(self, method, sql, params, many=False):
+        self._labels = statement_labels(sql)
+        started = time.perf_counter()
+        try:
+            method(sql, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.DB_SECONDS.observe(self._labels, elapsed)
+            # kept whatever the threshold: it may be set before the fetch
+            self._sql, self._params = sql, (None if many else params)
+            self._spent, self._slow = 0.0, None
+            if DB_SLOW_QUERY_MS:
+                self._check_slow(elapsed)
+        return self
+
+    def _check_slow(self, elapsed):
+        # execute and fetch time add up per statement; the statement is
+        # logged once when it crosses the threshold, and later fetches
+        # keep adding to that entry
+        self._spent += elapsed
+        if self._slow is not None:
+            slow_queries.extend(self._slow, elapsed)
+        elif self._spent * 1000 >= DB_SLOW_QUERY_MS:
+            self._slow = slow_queries.record(
+                self._cur.connection, self._sql, self._params, self._spent
+            )
+
+    def execute(self, sql, params=()):
+        return self._run(self._cur.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._run(self._cur.executemany, sql, seq_of_params, many=True)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.DB_FETCH_SECONDS.inc(self._labels, elapsed)
+            if DB_SLOW_QUERY_MS and self._labels[0]:
+                self._check_slow(elapsed)
+
+    def fetchone(self):
+        return self._fetch(self._cur.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(self._cur.fetchmany, size or self._cur.arraysize)
+
+    def fetchall(self):
+        return self._fetch(self._cur.fetchall)
+
+
+# ------------------ SLOW QUERY LOG ------------------ #
+#
+# With DB_SLOW_QUERY_MS set, every statement whose execute + fetch time
+# crosses the threshold is logged and aggregated by normalized SQL:
+# count, total/max time, parameter shape, calling routes and the
+# EXPLAIN QUERY PLAN captured the first time it was seen. Full scans of
+# tables with more than DB_SLOW_QUERY_SCAN_ROWS rows are flagged.
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ALIAS_RE = re.compile(
+    r"\b(?:FROM|JOIN)\s+\"?(\w+)\"?(?:\s+(?:AS\s+)?(?!WHERE|JOIN|ON|LEFT|INNER|CROSS|ORDER|GROUP|LIMIT|USING)(\w+))?",
+    re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """SQL with literals replaced by ? and IN lists collapsed, one line."""
+    text = _STRING_RE.sub("?", sql)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("(?...)", text)
+    return " ".join(text.split())
+
+
+def params_shape(params):
+    """Types (never values) of the bound parameters."""
+    if params is None:
+        return "executemany"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    params = list(params)
+    return " ".join([f"[{len(params)}]", *sorted({type(v).__name__ for v in params})])
+
+
+def _current_route():
+    scope = metrics.current_scope.get()
+    if scope is None:
+        return "background"
+    return f"{scope['method']} {metrics.route_template(scope)}"
+
+
+def explain(conn, sql, params):
+    """
+    EXPLAIN QUERY PLAN lines for `sql`, and the large tables it scans
+    without an index. `conn` is a raw sqlite3 connection.
+    """
+    rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    plan = [row[3] for row in rows]
+    aliases = {}
+    for table, alias in _ALIAS_RE.findall(sql):
+        aliases[table.lower()] = table
+        if alias:
+            aliases[alias.lower()] = table
+    scans = []
+    for line in plan:
+        words = line.split()
+        if len(words) < 2 or words[0] != "SCAN" or "VIRTUAL" in words:
+            continue
+        table = aliases.get(words[1].lower())
+        if table is None or "USING INTEGER PRIMARY KEY" in line:
+            continue
+        try:
+            rows = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        except sqlite3.Error:
+            continue
+        if rows >= DB_SLOW_QUERY_SCAN_ROWS:
+            scans.append({"table": table, "rows": rows, "plan": line})
+    return plan, scans
+
+
+class SlowQueryLog:
+    """Aggregated slow statements, keyed by normalized SQL."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def record(self, conn, sql, params, seconds):
+        key = normalize_sql(sql)
+        route = _current_route()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            plan, scans = None, []
+            if params is not None and statement_labels(sql)[0] in _DML:
+                try:
+                    plan, scans = explain(conn, sql, params)
+                except sqlite3.Error as e:
+                    plan = [f"EXPLAIN failed: {e}"]
+            entry = {
+                "sql": key,
+                "op": statement_labels(sql)[0],
+                "params": params_shape(params),
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "last_ms": 0.0,
+                "last_at": None,
+                "routes": {},
+                "plan": plan,
+                "full_scans": scans,
+            }
+        ms = seconds * 1000
+        with self._lock:
+            entry = self._entries.setdefault(key, entry)
+            entry["count"] += 1
+            entry["total_ms"] += ms
+            entry["last_ms"] = ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["last_at"] = time.time()
+            entry["routes"][route] = entry["routes"].get(route, 0) + 1
+            if len(self._entries) > self.max_entries:
+                # drop the entry that has cost the least so far (this
+                # statement's time already counted)
+                cheapest = min(self._entries, key=lambda k: self._entries[k]["total_ms"])
+                self._entries.pop(cheapest)
+        logger.warning(
+            "slow query %.1fms [%s] %s params=%s%s",
+            ms,
+            route,
+            key,
+            entry["params"],
+            " FULL SCAN " + ",".join(s["table"] for s in entry["full_scans"])
+            if entry["full_scans"] else "",
+        )
+        return entry
+
+    def extend(self, entry, seconds):
+        """More time (later fetches) spent on an already recorded statement."""
+        ms = seconds * 1000
+        with self._lock:
+            entry["total_ms"] += ms
+            entry["last_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], entry["last_ms"])
+
+    def top(self, limit=20, order="total_ms"):
+        with self._lock:
+            entries = [
+                dict(e, routes=dict(e["routes"]), total_ms=round(e["total_ms"], 3),
+                     max_ms=round(e["max_ms"], 3), last_ms=round(e["last_ms"], 3))
+                for e in self._entries.values()
+            ]
+        for e in entries:
+            e["avg_ms"] = round(e["total_ms"] / e["count"], 3)
+        entries.sort(key=lambda e: e[order], reverse=True)
+        return entries[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_queries = SlowQueryLog(DB_SLOW_QUERY_MAX_ENTRIES)
+
+
+class PooledConnection:
+    """
+    Thin proxy around a pooled sqlite3 connection.
+    close() hands the connection back to the pool instead of closing it,
+    so existing `conn = get_connection() ... conn.close()` code keeps working.
+    Cursors and statements go through TimedCursor.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def _raw(self):
+        conn = self.__dict__.get("_conn")
+        if conn is None:
+            raise sqlite3.ProgrammingError("Connection already returned to pool")
+        return conn
+
+    def __getattr__(self, name):
+        return getattr(self._raw(), name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self._conn.rollback()
+        return False
+
+    def cursor(self):
+        return TimedCursor(self._raw().cursor())
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            self._raw().commit()
+        finally:
+            metrics.DB_SECONDS.observe(("commit", ""), time.perf_counter() - started)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """
+    Bounded checkout/checkin pool of pre-configured SQLite connections.
+    Connections are created lazily up to `size`; callers beyond that wait
+    up to `timeout` seconds for a connection to be checked back in.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, readonly=False):
+        self.size = size
+        self.timeout = timeout
+        self.readonly = readonly
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_ms": 0.0,
+            "created": 0,
+            "discarded": 0,
+            "timeouts": 0,
+        }
+
+    def _healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+            self._stats["discarded"] += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def acquire(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                with self._lock:
+                    if self._created < self.size:
+                        self._created += 1
+                        self._stats["created"] += 1
+                        create = True
+                    else:
+                        create = False
+                if create:
+                    try:
+                        conn = _connect(self.readonly)
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                else:
+                    started = time.perf_counter()
+                    try:
+                        conn = self._idle.get(timeout=self.timeout)
+                    except queue.Empty:
+                        with self._lock:
+                            self._stats["timeouts"] += 1
+                        raise sqlite3.OperationalError(
+                            f"Timed out waiting {self.timeout}s for a database connection"
+                        )
+                    with self._lock:
+                        self._stats["waits"] += 1
+                        self._stats["wait_time_ms"] += (time.perf_counter() - started) * 1000
+
+            if not self._healthy(conn):
+                self._discard(conn)
+                continue
+
+            with self._lock:
+                self._stats["checkouts"] += 1
+            return PooledConnection(self, conn)
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["size"] = self.size
+            data["open"] = self._created
+        data["idle"] = self._idle.qsize()
+        data["in_use"] = data["open"] - data["idle"]
+        data["wait_time_ms"] = round(data["wait_time_ms"], 3)
+        return data
+
+
+pool = ConnectionPool()
+read_pool = ConnectionPool(DB_READ_POOL_SIZE, readonly=True)
+
+
+def get_connection():
+    return pool.acquire()
+
+
+def get_read_connection():
+    return read_pool.acquire()
+
+
+def get_db():
+    """FastAPI dependency yielding a pooled connection for the request."""
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def pool_stats():
+    return pool.stats()
+
+
+def read_pool_stats():
+    return read_pool.stats()
+
+
+# ------------------ ASYNC ACCESS ------------------ #
+#
+# Routers are `async def`, so sqlite3 calls must never run on the event
+# loop thread. Database work goes through run() / read(), which execute a
+# plain function `fn(conn, *args)` on a dedicated executor thread with a
+# pooled connection checked out for the duration of the call. read() uses
+# the read-only pool; writes go through run_write() below.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db"
+                )
+    return _executor
+
+
+def _call(pool, fn, args):
+    conn = pool.acquire()
+    try:
+        return fn(conn, *args)
+    finally:
+        conn.close()
+
+
+async def run(fn, *args):
+    """Run `fn(conn, *args)` on the DB executor and await its result."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), ctx.run, _call, pool, fn, args)
+
+
+async def read(fn, *args):
+    """Like run(), on a read-only connection: never waits on writers."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), ctx.run, _call, read_pool, fn, args)
+
+
+async def fetch_all(sql, params=()):
+    def _fetch(conn):
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+    return await read(_fetch)
+
+
+async def fetch_one(sql, params=()):
+    def _fetch(conn):
+        row = conn.execute(sql, params).fetchone()
+        return dict(row) if row else None
+
+    return await read(_fetch)
+
+
+# ------------------ WRITE TRANSACTIONS ------------------ #
+#
+# All writes go through a single writer thread fed by a queue. It takes
+# the first waiting operation, opens one BEGIN IMMEDIATE transaction and
+# keeps running queued operations in it -- each inside its own SAVEPOINT
+# -- until the queue is empty or DB_WRITE_GROUP_SIZE is reached, then
+# commits once. Under load many desk operations share one commit (and
+# one fsync); when idle a group is a single operation, so latency is
+# unchanged.
+#
+# An operation that raises is rolled back to its savepoint and fails
+# alone; the others in the group still commit. Results are only handed
+# back after the commit. If the write lock can't be had within
+# busy_timeout (another process is writing) the transaction is retried
+# with jittered backoff. A failure around the operations (no connection
+# from the pool ...) fails that group and the writer carries on; should
+# the thread die anyway, the next submit starts a new one.
+
+_write_stats_lock = threading.Lock()
+_write_stats = {
+    "transactions": 0,
+    "failed": 0,
+    "commits": 0,
+    "max_group": 0,
+    "retries": 0,
+    "busy_failures": 0,
+}
+
+
+def _is_busy(exc):
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    message = str(exc).lower()
+    return "locked" in message or "busy" in message
+
+
+def _count(**amounts):
+    with _write_stats_lock:
+        for key, amount in amounts.items():
+            _write_stats[key] += amount
+
+
+def _begin(conn):
+    for attempt in range(DB_WRITE_RETRIES + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == DB_WRITE_RETRIES:
+                if _is_busy(e):
+                    _count(busy_failures=1)
+                raise
+            _count(retries=1)
+            backoff = DB_WRITE_RETRY_BACKOFF_MS * (2 ** attempt)
+            time.sleep(random.uniform(0, backoff) / 1000)
+
+
+_STOP = object()
+
+
+class _WriteOp:
+    __slots__ = ("fn", "args", "ctx", "future")
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.ctx = contextvars.copy_context()
+        self.future = Future()
+
+    def fail(self, exc):
+        """Fail the op unless it already has a result (or was cancelled)."""
+        if self.future.done():
+            return False
+        if self.future.running() or self.future.set_running_or_notify_cancel():
+            self.future.set_exception(exc)
+            return True
+        return False
+
+
+class WriteQueue:
+    """Single writer thread committing queued operations in groups."""
+
+    def __init__(self, group_size=DB_WRITE_GROUP_SIZE, group_wait_ms=DB_WRITE_GROUP_WAIT_MS):
+        self.group_size = max(1, group_size)
+        self.group_wait = group_wait_ms / 1000
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._taken = []  # ops of the group in progress
+
+    def submit(self, fn, args):
+        op = _WriteOp(fn, args)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="db-writer", daemon=True)
+                self._thread.start()
+            self._queue.put(op)
+        return op.future
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+
+    def _loop(self):
+        try:
+            op = self._queue.get()
+            while op is not _STOP:
+                op = self._serve(op)
+                if op is None:
+                    op = self._queue.get()
+        finally:
+            # however the thread ends, the next submit() starts a new one
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+
+    def _serve(self, op):
+        """
+        Run one group starting with `op`. A failure outside the ops
+        themselves (no connection from the pool, a bug in the group
+        loop) fails the ops of that group; the writer keeps going.
+        """
+        try:
+            conn = get_connection()
+        except Exception as e:
+            logger.exception("Writer could not get a connection")
+            op.fail(e)
+            return None
+        self._taken = [op]
+        try:
+            return self._group(conn, op)
+        except Exception as e:
+            logger.exception("Write group failed")
+            _count(failed=sum(taken.fail(e) for taken in self._taken))
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                pass
+            return None
+        finally:
+            self._taken = []
+            conn.close()
+
+    def _next(self):
+        try:
+            if self.group_wait:
+                return self._queue.get(timeout=self.group_wait)
+            return self._queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _group(self, conn, op):
+        """
+        Run `op` and whatever is queued behind it in one transaction.
+        Returns None, or _STOP if it was dequeued meanwhile.
+        """
+        try:
+            _begin(conn)
+        except Exception as e:
+            if op.future.set_running_or_notify_cancel():
+                op.future.set_exception(e)
+            return None
+
+        done, taken = [], 0
+        while True:
+            taken += 1
+            if op.future.set_running_or_notify_cancel():
+                try:
+                    conn.execute("SAVEPOINT write_op")
+                    result = op.ctx.run(op.fn, conn, *op.args)
+                    conn.execute("RELEASE write_op")
+                    done.append((op, result))
+                except Exception as e:
+                    op.future.set_exception(e)
+                    _count(failed=1)
+                    try:
+                        conn.execute("ROLLBACK TO write_op")
+                        conn.execute("RELEASE write_op")
+                    except sqlite3.Error:
+                        # SQLite already rolled back the whole transaction
+                        # (disk full, I/O error ...): the group is lost
+                        if conn.in_transaction:
+                            conn.rollback()
+                        for other, _ in done:
+                            other.future.set_exception(e)
+                        _count(failed=len(done))
+                        return None
+            if taken >= self.group_size:
+                op = None
+                break
+            op = self._next()
+            if op is None or op is _STOP:
+                break
+            self._taken.append(op)
+
+        try:
+            conn.commit()
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for other, _ in done:
+                other.future.set_exception(e)
+            _count(failed=len(done))
+            return op
+        with _write_stats_lock:
+            _write_stats["transactions"] += len(done)
+            _write_stats["commits"] += 1 if done else 0
+            _write_stats["max_group"] = max(_write_stats["max_group"], len(done))
+        for other, result in done:
+            other.future.set_result(result)
+        return op
+
+
+writer = WriteQueue()
+
+
+async def run_write(fn, *args):
+    """
+    Queue `fn(conn, *args)` for the writer and await its result. `fn`
+    runs inside a transaction shared with other queued writes and must
+    not commit or roll back itself; an exception undoes only its own
+    changes and is re-raised here.
+    """
+    return await asyncio.wrap_future(writer.submit(fn, args))
+
+
+def write(fn, *args):
+    """Blocking run_write() for plain threads and scripts."""
+    return writer.submit(fn, args).result()
+
+
+def write_stats():
+    with _write_stats_lock:
+        data = dict(_write_stats)
+    data["queued"] = writer.depth()
+    return data
+
+
+def shutdown():
+    global _executor
+    writer.stop()
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    pool.close_all()
+    read_pool.close_all()
@@ -0,0 +1,347 @@
+"""
+Deterministic synthetic data at production scale.
+
+Replaces books, members, issues and issue_requests with generated rows
+(users are kept; seeded if the table is empty):
+
+    python -m app.db_generate --books 2000000 --members 300000 --issues 3000000
+
+The same --seed and --today always produce the same database.
+"""
+import argparse
+import bisect
+import itertools
+import random
+import re
+import time
+from datetime import date, timedelta
+
+from . import db, fines
+from .db_init import migrate, rebuild_search_index, seed_users
+from .rollups import rebuild_rollups
+from .routers.maintenance import MEMBERSHIP_PLANS, _glob_escape, plan_end_date
+
+TABLES = ("books", "members", "issues", "issue_requests")
+INSERT_BATCH = 50_000
+
+WORDS = (
+    "river stone light shadow garden empire silent winter market quantum "
+    "history secret ocean mountain digital economy children science story "
+    "journey forest machine city night dream money mind habit planet "
+    "atlas echo harbor lantern meadow orbit prism signal summit voyage"
+).split()
+FIRST_NAMES = "Aarav Vivaan Aditya Diya Ananya Ishaan Kavya Rohan Meera Arjun Sara Kabir Nisha Dev Priya".split()
+LAST_NAMES = "Sharma Verma Iyer Nair Gupta Reddy Das Khan Singh Patel Rao Bose Mehta Joshi Pillai".split()
+
+
+def _batched(rows, size=INSERT_BATCH):
+    it = iter(rows)
+    while batch := list(itertools.islice(it, size)):
+        yield batch
+
+
+def _load(conn, label, sql, rows):
+    started = time.perf_counter()
+    count = 0
+    for batch in _batched(rows):
+        conn.executemany(sql, batch)
+        count += len(batch)
+    conn.commit()
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else 0
+    print(f"{label:<16} {count:>10,} rows  {elapsed:>7.1f}s  {rate:>10,.0f} rows/s")
+    return count
+
+
+# ------------------ DEFERRED INDEXES ------------------ #
+#
+# Secondary indexes and triggers (FTS sync, write versions, rollups) on the
+# generated tables are dropped for the load and rebuilt once at the end:
+# one sorted index build is much cheaper than millions of b-tree inserts
+# and per-row trigger runs.
+
+def _drop_indexes_and_triggers(conn):
+    placeholders = ",".join("?" * len(TABLES))
+    saved = conn.execute(
+        f"""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+          AND tbl_name IN ({placeholders})
+        ORDER BY type, name
+        """,
+        TABLES,
+    ).fetchall()
+    for row in saved:
+        conn.execute(f'DROP {row["type"].upper()} "{row["name"]}"')
+    conn.commit()
+    return [row["sql"] for row in saved]
+
+
+def _restore_indexes_and_triggers(conn, saved):
+    started = time.perf_counter()
+    for sql in saved:
+        conn.execute(sql)
+    rebuild_search_index(conn.cursor())
+    rebuild_rollups(conn.cursor())
+    # cached reports and users must see the new data
+    conn.execute(
+        f"UPDATE table_versions SET version = version + 1 WHERE name IN ({','.join('?' * len(TABLES))})",
+        TABLES,
+    )
+    conn.commit()
+    print(f"{'indexes+rollups':<16} {len(saved):>10,} objs  {time.perf_counter() - started:>7.1f}s")
+
+
+# ------------------ ROWS ------------------ #
+
+def _categories(conn):
+    """(category, serial prefix, digit width) for every product_details range."""
+    result = []
+    for row in conn.execute("SELECT code_from, category FROM product_details ORDER BY id"):
+        m = re.fullmatch(r"(.*?)(\d+)", row["code_from"])
+        if m:
+            result.append((row["category"], m.group(1), len(m.group(2))))
+    return result
+
+
+def _split(total, parts, rnd):
+    """Deterministic uneven split of `total` into `parts` positive-ish counts."""
+    weights = [rnd.uniform(0.5, 1.5) for _ in range(parts)]
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    counts[0] += total - sum(counts)
+    return counts
+
+
+class Catalogue:
+    """Maps a book index 0..N-1 to its category block and serial number."""
+
+    def __init__(self, categories, counts):
+        self.categories = categories
+        self.counts = counts
+        self.starts = list(itertools.accumulate([0] + counts[:-1]))
+        self.total = sum(counts)
+
+    def serial(self, index):
+        block = bisect.bisect_right(self.starts, index) - 1
+        _, prefix, width = self.categories[block]
+        return f"{prefix}{index - self.starts[block] + 1:0{width}d}"
+
+    def rows(self, rnd, issued, today):
+        for block, (category, prefix, width) in enumerate(self.categories):
+            start = self.starts[block]
+            for n in range(self.counts[block]):
+                index = start + n
+                kind = "Movie" if rnd.random() < 0.15 else "Book"
+                yield (
+                    f"{prefix}{n + 1:0{width}d}",
+                    " ".join(rnd.choices(WORDS, k=rnd.randint(2, 4))).title() + f" {index}",
+                    f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_NAMES)} {rnd.randrange(5000)}",
+                    category,
+                    "Issued" if index in issued else "Available",
+                    round(rnd.uniform(80, 1500), 2),
+                    (today - timedelta(days=rnd.randint(30, 5 * 365))).isoformat(),
+                    kind,
+                )
+
+
+def _member_id(index):
+    return f"GM{index:07d}"
+
+
+def _member_rows(count, rnd, today):
+    plans = list(MEMBERSHIP_PLANS)
+    for i in range(count):
+        start = today - timedelta(days=rnd.randint(0, 3 * 365))
+        end = plan_end_date(start, rnd.choice(plans))
+        yield (
+            _member_id(i),
+            rnd.choice(FIRST_NAMES),
+            rnd.choice(LAST_NAMES),
+            f"9{rnd.randrange(10**9):09d}",
+            f"{rnd.randint(1, 999)} {rnd.choice(WORDS).title()} Road",
+            f"{rnd.randrange(10**12):012d}",
+            start.isoformat(),
+            end.isoformat(),
+            "Active" if end >= today else "Expired",
+        )
+
+
+def _issue_rows(args, catalogue, open_copies, rnd, today):
+    """
+    Closed history first, then the open issues (one per copy in
+    `open_copies`). Borrowing is skewed towards low member indexes;
+    about a fifth of returns are late, with an exponential tail.
+    """
+    members = args.members
+
+    def member():
+        return _member_id(int(members * rnd.random() ** args.member_skew))
+
+    for _ in range(args.issues - len(open_copies)):
+        issued = today - timedelta(days=rnd.randint(16, args.history_days))
+        planned = issued + timedelta(days=rnd.randint(7, 15))
+        if rnd.random() < 0.8:
+            late = 0
+            returned = max(issued, planned - timedelta(days=rnd.randint(0, 6)))
+        else:
+            late = min(int(rnd.expovariate(1 / 6)) + 1, 120)
+            returned = min(planned + timedelta(days=late), today)
+            late = (returned - planned).days
+        fine = fines.fine_for_days(late)
+        yield (
+            catalogue.serial(rnd.randrange(catalogue.total)),
+            member(),
+            issued.isoformat(),
+            planned.isoformat(),
+            returned.isoformat(),
+            fine,
+            1 if fine else 0,
+        )
+
+    for index in open_copies:
+        if rnd.random() < args.overdue_ratio:
+            # overdue: out for weeks to months
+            issued = today - timedelta(days=16 + min(int(rnd.expovariate(1 / 30)), 365))
+        else:
+            issued = today - timedelta(days=rnd.randint(0, 7))
+        planned = issued + timedelta(days=rnd.randint(7, 15))
+        yield (
+            catalogue.serial(index),
+            member(),
+            issued.isoformat(),
+            planned.isoformat(),
+            None,
+            0,
+            0,
+        )
+
+
+def _request_rows(count, members, rnd, today):
+    waiting = set()
+    for _ in range(count):
+        requested = today - timedelta(days=rnd.randint(0, 365))
+        fulfilled = requested + timedelta(days=rnd.randint(1, 20))
+        member = _member_id(rnd.randrange(members))
+        title = " ".join(rnd.choices(WORDS, k=3)).title()
+        if fulfilled <= today and rnd.random() < 0.7:
+            yield member, title, requested.isoformat(), fulfilled.isoformat(), "Collected"
+        elif (title, member) not in waiting:
+            # one waiting hold per member and title
+            waiting.add((title, member))
+            yield member, title, requested.isoformat(), None, "Waiting"
+
+
+# ------------------ GENERATE ------------------ #
+
+def generate(args):
+    today = date.fromisoformat(args.today) if args.today else date.today()
+    rnd = random.Random(args.seed)
+    migrate()
+    conn = db.get_connection()
+    started = time.perf_counter()
+    saved = None  # dropped index/trigger DDL, until it is restored
+    try:
+        if not conn.execute("SELECT 1 FROM users LIMIT 1").fetchone():
+            seed_users(conn.cursor())
+            conn.commit()
+
+        # bulk-load settings, only for this connection / this run
+        conn.execute("PRAGMA journal_mode=MEMORY")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-200000")
+
+        saved = _drop_indexes_and_triggers(conn)
+        for table in TABLES:
+            conn.execute(f"DELETE FROM {table}")
+        conn.commit()
+
+        categories = _categories(conn)
+        catalogue = Catalogue(categories, _split(args.books, len(categories), rnd))
+        open_count = min(int(args.issues * args.open_ratio), args.books)
+        open_copies = rnd.sample(range(args.books), open_count)
+
+        _load(conn, "members", """
+            INSERT INTO members(membership_id,first_name,last_name,phone,address,aadhar,
+                                start_date,end_date,status,pending_fine)
+            VALUES (?,?,?,?,?,?,?,?,?,0)
+        """, _member_rows(args.members, rnd, today))
+
+        _load(conn, "books", """
+            INSERT INTO books(serial_no,name,author,category,status,cost,procurement_date,type)
+            VALUES (?,?,?,?,?,?,?,?)
+        """, catalogue.rows(rnd, set(open_copies), today))
+
+        _load(conn, "issues", """
+            INSERT INTO issues(serial_no,membership_id,issue_date,planned_return,
+                               actual_return_date,fine_amount,fine_paid)
+            VALUES (?,?,?,?,?,?,?)
+        """, _issue_rows(args, catalogue, open_copies, rnd, today))
+
+        _load(conn, "issue_requests", """
+            INSERT INTO issue_requests(membership_id,book_name,requested_date,fulfilled_date,status)
+            VALUES (?,?,?,?,?)
+        """, _request_rows(args.issues // 100, args.members, rnd, today))
+
+        # new copies must continue after the generated serials
+        conn.execute("DELETE FROM serial_sequences")
+        conn.executemany(
+            "INSERT INTO serial_sequences(prefix, last_value) VALUES (?, ?)",
+            [(prefix, count) for (_, prefix, _), count in zip(categories, catalogue.counts)],
+        )
+        # and the code ranges (which bound new serials) cover them
+        conn.executemany(
+            "UPDATE product_details SET code_to = :code_to "
+            "WHERE category = :category AND code_from GLOB :pattern AND code_to < :code_to",
+            [
+                {
+                    "code_to": f"{prefix}{count:0{width}d}",
+                    "category": category,
+                    "pattern": _glob_escape(prefix) + "[0-9]*",
+                }
+                for (category, prefix, width), count in zip(categories, catalogue.counts)
+            ],
+        )
+        conn.commit()
+
+        _restore_indexes_and_triggers(conn, saved)
+        saved = None
+
+        fines.refresh_pending_fines(conn, today)
+        conn.commit()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        if saved is not None:
+            # interrupted or failed mid-load: migrate() would not bring
+            # the indexes and triggers back, so put them back now
+            if conn.in_transaction:
+                conn.rollback()
+            _restore_indexes_and_triggers(conn, saved)
+        conn.close()
+        db.shutdown()
+    print(f"done in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, default=1_000_000, help="copies (books and movies)")
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--issues", type=int, default=1_000_000, help="issue history rows, open ones included")
+    parser.add_argument("--open-ratio", type=float, default=0.05, help="share of issues still open")
+    parser.add_argument("--overdue-ratio", type=float, default=0.3, help="share of open issues overdue")
+    parser.add_argument("--member-skew", type=float, default=2.0, help=">1 concentrates borrowing on fewer members")
+    parser.add_argument("--history-days", type=int, default=730)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--today", help="reference date (YYYY-MM-DD); default: today")
+    args = parser.parse_args()
+    if args.books < 1 or args.members < 1:
+        parser.error("--books and --members must be at least 1")
+    if args.history_days < 16:
+        parser.error("--history-days must be at least 16")
+    generate(args)
+
+
+if __name__ == "__main__":
+    main()
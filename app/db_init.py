@@ -1,10 +1,11 @@
 
-from .db import get_connection
+import re
 
-def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
+from .db import get_connection
+from .passwords import hash_password
+from .rollups import add_rollup_triggers, create_rollup_tables, rebuild_rollups
 
+def _m001_base_schema(cur):
     # Users table
     cur.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -103,16 +104,319 @@ def init_db():
         )
     """)
 
-    # Seed users
+
+def _m002_issue_remarks(cur):
+    cur.execute("PRAGMA table_info(issues)")
+    if "remarks" not in {r["name"] for r in cur.fetchall()}:
+        cur.execute("ALTER TABLE issues ADD COLUMN remarks TEXT")
+
+
+def _m003_hot_query_indexes(cur):
+    # return flow: open issue by member + serial
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_issues_open_member_serial "
+        "ON issues(membership_id, serial_no) WHERE actual_return_date IS NULL"
+    )
+    # open issues by copy and by due date (active issues, live overdue)
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_issues_open_serial "
+        "ON issues(serial_no) WHERE actual_return_date IS NULL"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_issues_open_planned "
+        "ON issues(planned_return) WHERE actual_return_date IS NULL"
+    )
+    # /reports/overdue: returned after the planned date
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_issues_returned_late "
+        "ON issues(issue_id) WHERE actual_return_date > planned_return"
+    )
+    # master lists per type and availability by status
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_type_serial ON books(type, serial_no)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_status_type ON books(status, type)")
+
+
+def _m004_books_search_index(cur):
+    # External-content FTS5 index over the catalogue, keyed by books.rowid.
+    # Note: VACUUM may renumber rowids of books (no INTEGER PRIMARY KEY),
+    # so run rebuild_search_index() after a VACUUM.
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            name, author, category,
+            content='books', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        """
+    )
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, name, author, category)
+            VALUES (new.rowid, new.name, new.author, new.category);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, name, author, category)
+            VALUES ('delete', old.rowid, old.name, old.author, old.category);
+        END
+    """)
+    # status flips on issue/return don't touch the index
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF name, author, category ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, name, author, category)
+            VALUES ('delete', old.rowid, old.name, old.author, old.category);
+            INSERT INTO books_fts(rowid, name, author, category)
+            VALUES (new.rowid, new.name, new.author, new.category);
+        END
+    """)
+    rebuild_search_index(cur)
+
+
+def rebuild_search_index(cur):
+    cur.execute("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+
+def _m005_report_page_indexes(cur):
+    # keyset pages of open issues, and of books filtered by status
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_issues_open_id "
+        "ON issues(issue_id) WHERE actual_return_date IS NULL"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_books_type_status_serial "
+        "ON books(type, status, serial_no)"
+    )
+
+
+def _m006_table_versions(cur):
+    # Per-table write counters bumped by triggers, so any worker can tell
+    # cheaply whether a table changed since it last looked.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    add_version_triggers(cur, "users")
+
+
+def add_version_triggers(cur, table):
+    cur.execute(
+        "INSERT OR IGNORE INTO table_versions(name, version) VALUES (?, 0)", (table,)
+    )
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+            AFTER {event} ON {table} BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+            END
+        """)
+
+
+def _m007_serial_sequences(cur):
+    # Last serial number handed out per prefix ('B', 'M', 'SC(B/M)', ...),
+    # seeded from the serials already in the catalogue.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS serial_sequences (
+            prefix TEXT PRIMARY KEY,
+            last_value INTEGER NOT NULL
+        )
+    """)
+    last = {}
+    for row in cur.execute("SELECT serial_no FROM books").fetchall():
+        m = re.fullmatch(r"(.*?)(\d+)", row["serial_no"])
+        if m:
+            last[m.group(1)] = max(last.get(m.group(1), 0), int(m.group(2)))
+    cur.executemany(
+        "INSERT OR IGNORE INTO serial_sequences(prefix, last_value) VALUES (?, ?)",
+        last.items(),
+    )
+
+
+def _m008_scheduler(cur):
+    # Leader lease (one row per lease name) so only one worker runs the
+    # background jobs, and a history of every job run.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS scheduler_lease (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            run_id INTEGER PRIMARY KEY,
+            job TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            duration_ms REAL,
+            rows_affected INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL CHECK(status IN ('running','ok','failed')),
+            error TEXT
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs(job, run_id)")
+    # membership expiry: active members past their end date
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_members_status_end "
+        "ON members(status, end_date)"
+    )
+
+
+def _m009_report_table_versions(cur):
+    # write versions for every table behind a cached report
+    for table in ("books", "members", "issues", "issue_requests", "product_details"):
+        add_version_triggers(cur, table)
+
+
+def _m010_circulation_rollups(cur):
+    # trigger-maintained counters for the analytics reports (app.rollups),
+    # backfilled from the existing history
+    create_rollup_tables(cur)
+    add_rollup_triggers(cur)
+    rebuild_rollups(cur)
+
+
+def _m011_issue_request_holds(cur):
+    # issue_requests becomes the hold queue (see routers/transactions.py):
+    # Waiting -> Fulfilled (copy Reserved for the member) -> Collected,
+    # or Cancelled
+    cur.execute("PRAGMA table_info(issue_requests)")
+    columns = {r["name"] for r in cur.fetchall()}
+    if "status" not in columns:
+        cur.execute(
+            "ALTER TABLE issue_requests ADD COLUMN status TEXT NOT NULL DEFAULT 'Waiting'"
+        )
+        # requests recorded before holds existed: fulfilled ones are history
+        cur.execute("UPDATE issue_requests SET status='Collected' WHERE fulfilled_date IS NOT NULL")
+    if "serial_no" not in columns:
+        cur.execute("ALTER TABLE issue_requests ADD COLUMN serial_no TEXT")
+    # one waiting hold per member and title: keep the oldest of duplicates
+    cur.execute("""
+        UPDATE issue_requests SET status='Cancelled'
+        WHERE status='Waiting' AND request_id NOT IN (
+            SELECT MIN(request_id) FROM issue_requests
+            WHERE status='Waiting' GROUP BY book_name, membership_id
+        )
+    """)
+    # head of a title's queue, and positions in it
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_issue_requests_queue "
+        "ON issue_requests(book_name, request_id) WHERE status='Waiting'"
+    )
+    cur.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_issue_requests_waiting_member "
+        "ON issue_requests(book_name, membership_id) WHERE status='Waiting'"
+    )
+    # a member's open holds; the hold a reserved copy belongs to
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_issue_requests_member_open "
+        "ON issue_requests(membership_id) WHERE status IN ('Waiting', 'Fulfilled')"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_issue_requests_reserved "
+        "ON issue_requests(serial_no) WHERE status='Fulfilled'"
+    )
+    # copies of a title (placing a hold)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_books_name_status ON books(name, status)")
+
+
+# Ordered schema migrations: (version, name, step). Steps run once each,
+# inside their own write transaction, and must never be edited or
+# reordered once released -- add a new step instead.
+MIGRATIONS = [
+    (1, "base schema", _m001_base_schema),
+    (2, "issues.remarks column", _m002_issue_remarks),
+    (3, "indexes for hot queries", _m003_hot_query_indexes),
+    (4, "full-text catalogue search", _m004_books_search_index),
+    (5, "indexes for report pagination", _m005_report_page_indexes),
+    (6, "table write versions", _m006_table_versions),
+    (7, "serial number sequences", _m007_serial_sequences),
+    (8, "background scheduler", _m008_scheduler),
+    (9, "report table write versions", _m009_report_table_versions),
+    (10, "circulation rollups", _m010_circulation_rollups),
+    (11, "issue request holds", _m011_issue_request_holds),
+]
+
+
+def schema_version(conn):
+    cur = conn.execute("SELECT COALESCE(MAX(version), 0) AS v FROM schema_migrations")
+    return cur.fetchone()["v"]
+
+
+def migrate(conn=None):
+    """
+    Bring the schema up to the latest version. Safe to call on every
+    startup and from several workers at once: each step re-checks the
+    version after taking the write lock, so it is applied exactly once.
+    Returns the list of versions applied by this call.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    applied = []
+    try:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+            """
+        )
+        conn.commit()
+
+        for version, name, step in MIGRATIONS:
+            if schema_version(conn) >= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if schema_version(conn) >= version:
+                    conn.rollback()
+                    continue
+                step(conn.cursor())
+                conn.execute(
+                    "INSERT INTO schema_migrations(version, name) VALUES (?, ?)",
+                    (version, name),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+
+        if applied:
+            conn.execute("PRAGMA optimize")
+    finally:
+        if own_conn:
+            conn.close()
+    return applied
+
+
+def seed_users(cur):
     cur.execute("DELETE FROM users")
     cur.executemany(
         "INSERT INTO users(username,password,role,is_active) VALUES (?,?,?,1)",
         [
-            ("adm", "adm", "admin"),
-            ("user", "user", "user"),
+            ("adm", hash_password("adm"), "admin"),
+            ("user", hash_password("user"), "user"),
         ],
     )
 
+
+def init_db():
+    migrate()
+
+    conn = get_connection()
+    cur = conn.cursor()
+
+    # Seed users
+    seed_users(cur)
+
     # Seed some books
     cur.execute("DELETE FROM books")
     sample_books = [
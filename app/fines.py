@@ -0,0 +1,74 @@
+from datetime import date
+
+# Fine = No. of late days * DAILY_FINE
+DAILY_FINE = 10
+
+# Whole days an open issue is past its planned return date, as of :today.
+# Shared by every query that reports accrued (not yet charged) fines.
+DAYS_LATE_SQL = "CAST(julianday(:today) - julianday(planned_return) AS INTEGER)"
+
+# Open issues past their planned return date. Served by the partial index
+# idx_issues_open_planned (planned_return WHERE actual_return_date IS NULL).
+OPEN_OVERDUE_WHERE = "actual_return_date IS NULL AND planned_return < :today"
+
+
+def fine_for_days(days_late):
+    return max(0, days_late) * DAILY_FINE
+
+
+def sql_params(today=None):
+    """Named parameters used by the fine SQL fragments above."""
+    return {
+        "today": (today or date.today()).isoformat(),
+        "daily_fine": DAILY_FINE,
+    }
+
+
+def refresh_pending_fines(conn, today=None, after=None, upto=None):
+    """
+    Recompute members.pending_fine -- the fine accrued so far on all of a
+    member's open overdue issues -- in two set-based UPDATEs. Only rows
+    whose value actually changes are written. `after`/`upto` restrict the
+    pass to membership ids in (after, upto], so a caller can walk the
+    members table in chunks. Returns the number of members updated.
+    Does not commit.
+    """
+    params = sql_params(today)
+    params.update(after=after, upto=upto)
+    # plain range terms (not ":after IS NULL OR ...") so SQLite can use
+    # the primary key / open-issue index for the range
+    in_range = ["1"]
+    if after is not None:
+        in_range.append("membership_id > :after")
+    if upto is not None:
+        in_range.append("membership_id <= :upto")
+    in_range = " AND ".join(in_range)
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        UPDATE members
+        SET pending_fine = due.fine
+        FROM (
+            SELECT membership_id, SUM({DAYS_LATE_SQL}) * :daily_fine AS fine
+            FROM issues
+            WHERE {OPEN_OVERDUE_WHERE} AND {in_range}
+            GROUP BY membership_id
+        ) AS due
+        WHERE members.membership_id = due.membership_id
+          AND members.pending_fine IS NOT due.fine
+        """,
+        params,
+    )
+    updated = cur.rowcount
+    cur.execute(
+        f"""
+        UPDATE members
+        SET pending_fine = 0
+        WHERE pending_fine != 0 AND {in_range}
+          AND membership_id NOT IN (
+              SELECT membership_id FROM issues WHERE {OPEN_OVERDUE_WHERE} AND {in_range}
+          )
+        """,
+        params,
+    )
+    return updated + cur.rowcount
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import date
+
+from fastapi import HTTPException, Request, Response
+
+from . import db
+from .compression import encodings, negotiate
+from .jsonrows import dumps
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# bodies at least this big are gzipped on a worker thread, not the loop
+_COMPRESS_OFF_LOOP = 64 * 1024
+
+
+# ------------------ CONDITIONAL GET ------------------ #
+#
+# A cached endpoint names the tables it reads. Its ETag is a hash of the
+# path, the normalised query string, today's date and the write versions
+# of those tables (table_versions, bumped by triggers on every insert,
+# update and delete -- whoever the writer is). So:
+#   - a matching If-None-Match is answered 304 after one lookup in
+#     table_versions, without running the report query;
+#   - rendered JSON bodies are kept in memory under the same key and ETag,
+#     and are never served once any of their tables has been written;
+#     large ones are kept gzipped as well, so hits aren't compressed again.
+# Today's date is part of the key because several reports (overdue,
+# accrued fines) change at midnight without any write.
+
+def _size(variants):
+    return sum(len(body) for body in variants.values())
+
+
+class ResponseCache:
+    """
+    LRU of rendered JSON bodies (as encodings() variants), bounded by entry
+    count and total bytes.
+    """
+
+    def __init__(self, size, max_bytes):
+        self.size = size
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+    def get(self, key, etag):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != etag:
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats["hits"] += 1
+        return entry[1]
+
+    def put(self, key, etag, variants):
+        size = _size(variants)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= _size(old[1])
+        self._entries[key] = (etag, variants)
+        self._bytes += size
+        while len(self._entries) > self.size or self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= _size(evicted)
+            self._stats["evictions"] += 1
+
+    def not_modified(self):
+        self._stats["not_modified"] += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self):
+        return dict(self._stats, entries=len(self._entries), bytes=self._bytes)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_MAX_BYTES)
+
+
+def _table_versions(conn, tables):
+    placeholders = ",".join("?" * len(tables))
+    rows = conn.execute(
+        f"SELECT name, version FROM table_versions WHERE name IN ({placeholders})",
+        tables,
+    ).fetchall()
+    return {r["name"]: r["version"] for r in rows}
+
+
+# byte-different encodings of one body get distinct strong ETags
+_CODING_SUFFIX = {"gzip": "gz", "br": "br"}
+
+
+def variant_etag(etag, coding):
+    """ETag of one content coding of a representation: "<v>" -> "<v>-gz"."""
+    if coding == "identity":
+        return etag
+    return f'{etag[:-1]}-{_CODING_SUFFIX[coding]}"'
+
+
+def etag_match(header, etag):
+    """
+    The entity tag in an If-None-Match `header` that matches `etag` or
+    one of its encoded variants (weak comparison, as If-None-Match uses),
+    or None. `*` matches `etag`.
+    """
+    if not header:
+        return None
+    candidates = {etag, *(variant_etag(etag, c) for c in _CODING_SUFFIX)}
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return etag
+        if tag.removeprefix("W/") in candidates:
+            return tag.removeprefix("W/")
+    return None
+
+
+class CachedResponse:
+    """Per-request handle returned by the cached() dependency."""
+
+    def __init__(self, key, etag, accept_encoding=None):
+        self.key = key
+        self.etag = etag
+        self.accept_encoding = accept_encoding
+
+    def _response(self, variants):
+        coding = negotiate(self.accept_encoding, variants)
+        # browsers may keep the body but must revalidate it every time
+        headers = {"ETag": variant_etag(self.etag, coding), "Cache-Control": "private, no-cache"}
+        if len(variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(variants[coding], media_type="application/json", headers=headers)
+
+    async def respond(self, fn, *args, **kwargs):
+        """
+        Serve the cached body, or await `fn(...)` and cache its result --
+        JSON bytes as they are, anything else rendered with dumps().
+        """
+        variants = response_cache.get(self.key, self.etag)
+        if variants is None:
+            body = dumps(await fn(*args, **kwargs))
+            if len(body) >= _COMPRESS_OFF_LOOP:
+                variants = await asyncio.to_thread(encodings, body, "application/json", ("gzip",))
+            else:
+                variants = encodings(body, "application/json", ("gzip",))
+            response_cache.put(self.key, self.etag, variants)
+        return self._response(variants)
+
+
+def cached(*tables):
+    """
+    Dependency factory for read endpoints whose response depends only on
+    the request URL and the contents of `tables`:
+
+        cache: CachedResponse = Depends(cached("books"))
+        ...
+        return await cache.respond(keyset_page, page, "books", ...)
+    """
+    tables = tuple(sorted(tables))
+
+    async def dependency(request: Request):
+        versions = await db.read(_table_versions, tables)
+        query = "&".join(sorted(str(request.query_params).split("&")))
+        key = f"{request.url.path}?{query}"
+        stamp = ",".join(f"{t}={versions.get(t)}" for t in tables)
+        digest = hashlib.sha256(
+            f"{key}|{date.today().isoformat()}|{stamp}".encode()
+        ).hexdigest()[:32]
+        etag = f'"{digest}"'
+        matched = etag_match(request.headers.get("if-none-match"), etag)
+        if matched:
+            response_cache.not_modified()
+            raise HTTPException(status_code=304, headers={"ETag": matched})
+        return CachedResponse(key, etag, request.headers.get("accept-encoding"))
+
+    return dependency
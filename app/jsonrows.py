@@ -0,0 +1,88 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # optional speed-up, not a requirement
+    orjson = None
+
+JSON_FETCH_CHUNK = int(os.getenv("JSON_FETCH_CHUNK", "500"))
+
+
+# ------------------ JSON ROWS ------------------ #
+#
+# Report rows are rendered to JSON by SQLite itself: the query is wrapped
+# in `SELECT json_object('col', col, ...) FROM (query)`, so each row comes
+# back as one ready-made JSON text. No sqlite3.Row, no dict per row and no
+# jsonable_encoder walk -- Python only joins the strings.
+#
+# Columns whose name starts with "_" are helpers (sort keys such as a
+# bm25 rank) and are left out of the JSON.
+
+class RawJSON(str):
+    """A str that already holds encoded JSON."""
+
+
+def dumps(content):
+    """JSON bytes for an arbitrary payload (orjson when installed)."""
+    if isinstance(content, (bytes, bytearray)):
+        return bytes(content)
+    if orjson is not None:
+        return orjson.dumps(content)
+    # same encoding as FastAPI's JSONResponse
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def select_json(conn, sql, params=(), extra=(), order_by=None):
+    """
+    Execute `sql` so that every row is (json_text, *extra): the row as a
+    JSON object followed by the values of the `extra` columns (e.g. the
+    keyset key). `order_by` re-applies the query's order on the wrapper.
+    Returns the cursor.
+    """
+    described = conn.execute(f"SELECT * FROM ({sql}) LIMIT 0", params).description
+    names = [d[0] for d in described if not d[0].startswith("_")]
+    pairs = ", ".join(
+        "'" + n.replace("'", "''") + "', " + _ident(n) for n in names
+    )
+    wrapped = f"SELECT json_object({pairs})"
+    if extra:
+        wrapped += ", " + ", ".join(_ident(c) for c in extra)
+    wrapped += f" FROM ({sql})"
+    if order_by:
+        wrapped += f" ORDER BY {order_by}"
+    return conn.execute(wrapped, params)
+
+
+def iter_chunks(cur, size=JSON_FETCH_CHUNK):
+    """Rows of `cur`, fetched `size` at a time."""
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def json_array(conn, sql, params=(), order_by=None):
+    """All rows of `sql` as one JSON array."""
+    cur = select_json(conn, sql, params, order_by=order_by)
+    return RawJSON("[" + ",".join(row[0] for row in iter_chunks(cur)) + "]")
+
+
+def json_object_body(**fields):
+    """
+    Assemble a JSON object from RawJSON fragments and plain values, in
+    keyword order. Returns bytes.
+    """
+    parts = []
+    for key, value in fields.items():
+        if not isinstance(value, RawJSON):
+            value = dumps(value).decode("utf-8")
+        parts.append(json.dumps(key) + ":" + value)
+    return ("{" + ",".join(parts) + "}").encode("utf-8")
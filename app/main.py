@@ -1,19 +1,45 @@
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi import Request
 from dotenv import load_dotenv
 
+from . import db, metrics, passwords
+from .assets import StaticAssets, render_page
+from .compression import COMPRESS_MIN_SIZE, GZIP_LEVEL
+from .db_init import migrate
+from .http_cache import response_cache
+from .scheduler import scheduler
 from .routers import auth, transactions, reports, maintenance
 
 load_dotenv()
 
-app = FastAPI(title="Library Management System")
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # idempotent: only applies schema migrations this DB hasn't seen yet
+    await db.run(migrate)
+    scheduler.start()
+    yield
+    await scheduler.stop()
+    passwords.shutdown()
+    db.shutdown()
+
+
+app = FastAPI(title="Library Management System", lifespan=lifespan)
+# JSON and exports above COMPRESS_MIN_SIZE are gzipped on the way out;
+# responses that already carry a Content-Encoding pass through untouched
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE, compresslevel=GZIP_LEVEL)
+app.add_middleware(metrics.MetricsMiddleware)
+
+static = StaticAssets("app/static")
+app.mount("/static", static, name="static")
 templates = Jinja2Templates(directory="app/templates")
+# the page only changes with a deploy: render it once, linking hashed assets
+index_page = render_page(templates, "index.html", static_url=static.url)
 
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(transactions.router, prefix="/api/transactions", tags=["transactions"])
@@ -23,4 +49,45 @@ app.include_router(maintenance.router, prefix="/api/maintenance", tags=["mainten
 
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return index_page.response(request.headers, "no-cache")
+
+
+def _collect_db_state():
+    """Pool, write and response-cache counters, read at scrape time."""
+    pools = {"readwrite": db.pool_stats(), "readonly": db.read_pool_stats()}
+    pool = pools["readwrite"]
+    writes = db.write_stats()
+    cache = response_cache.stats()
+    return [
+        ("db_pool_connections", "gauge", "Pooled SQLite connections by pool and state.",
+         [({"pool": p, "state": s}, stats[s])
+          for p, stats in pools.items() for s in ("open", "idle", "in_use")]),
+        ("db_pool_checkouts_total", "counter", "Connections checked out of the pool.",
+         [({}, pool["checkouts"])]),
+        ("db_pool_waits_total", "counter", "Checkouts that had to wait for a free connection.",
+         [({}, pool["waits"])]),
+        ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a free connection.",
+         [({}, pool["wait_time_ms"] / 1000)]),
+        ("db_write_transactions_total", "counter", "Committed write operations.",
+         [({}, writes["transactions"])]),
+        ("db_write_failed_total", "counter", "Write operations rolled back.",
+         [({}, writes["failed"])]),
+        ("db_write_commits_total", "counter", "Group commits of the single writer.",
+         [({}, writes["commits"])]),
+        ("db_write_queue_depth", "gauge", "Write operations waiting for the writer.",
+         [({}, writes["queued"])]),
+        ("db_write_busy_retries_total", "counter", "Write transactions retried on SQLITE_BUSY.",
+         [({}, writes["retries"])]),
+        ("response_cache_events_total", "counter", "Report response cache lookups by result.",
+         [({"result": r}, cache[r]) for r in ("hits", "misses", "not_modified")]),
+        ("response_cache_bytes", "gauge", "Memory held by cached report bodies.",
+         [({}, cache["bytes"])]),
+    ]
+
+
+metrics.COLLECTORS.append(_collect_db_state)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,203 @@
+import bisect
+import contextvars
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+# ASGI scope of the request being handled (propagates into db.run's
+# executor threads), so the DB layer can tell which route a query is for
+current_scope = contextvars.ContextVar("current_scope", default=None)
+
+
+# ------------------ METRICS ------------------ #
+#
+# Minimal Prometheus-style metrics. Recording is a dict lookup and a few
+# additions under a lock; all formatting happens in render(), i.e. only
+# when /metrics is scraped. Label values are passed as a tuple in the
+# order of the metric's label names.
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                cumulative += n
+                le = _labels(self.label_names, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{base} {total!r}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+REGISTRY = []
+# callables returning [(name, type, help, [(labels dict, value)])],
+# evaluated at scrape time for state that already lives elsewhere
+COLLECTORS = []
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    for collect in COLLECTORS:
+        for name, type, help, samples in collect():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+            for labels, value in samples:
+                lines.append(
+                    f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}"
+                )
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")
+)
+HTTP_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route")
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being handled.")
+DB_SECONDS = Histogram(
+    "db_statement_duration_seconds",
+    "SQLite statement execute (and commit) time by operation and table.",
+    ("op", "table"),
+    buckets=DB_BUCKETS,
+)
+DB_FETCH_SECONDS = Counter(
+    "db_fetch_seconds_total", "Time spent fetching result rows by operation and table.", ("op", "table")
+)
+
+
+def route_template(scope):
+    """
+    The matched route as a path template, e.g.
+    /api/maintenance/book/{serial_no}. Built from the request path and
+    path_params, so it doesn't depend on how routers were included.
+    """
+    if scope.get("route") is None:
+        # mounted sub-apps (static files) leave their prefix in root_path
+        mount = scope.get("root_path", "")[len(scope.get("app_root_path", "")):]
+        if mount and scope.get("endpoint") is not None:
+            return mount + "/{path}"
+        return "unmatched"
+    path = scope["path"]
+    for name, value in (scope.get("path_params") or {}).items():
+        value = str(value)
+        if value and path.endswith("/" + value):
+            path = path[: -len(value)] + "{" + name + "}"
+        elif value:
+            path = path.replace("/" + value + "/", "/{" + name + "}/", 1)
+    return path
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request. Routes are labelled by
+    their path template (/api/maintenance/book/{serial_no}), never by the
+    raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        token = current_scope.set(scope)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_scope.reset(token)
+            HTTP_IN_FLIGHT.dec()
+            route = route_template(scope)
+            HTTP_SECONDS.observe((scope["method"], route), elapsed)
+            HTTP_REQUESTS.inc((scope["method"], route, str(status)))
@@ -0,0 +1,150 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ------------------ PASSWORD HASHING ------------------ #
+#
+# Salted, adaptive hashes from the standard library. Stored strings carry
+# their scheme and cost, so the cost can be raised later: rows hashed with
+# weaker settings (or still in plaintext from before hashing) verify as
+# before and are rehashed on the next successful login.
+#
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>
+#   pbkdf2_sha256$<iterations>$<salt>$<hash>
+#
+# Hashing costs tens of milliseconds of CPU by design, so request handlers
+# use the *_async variants, which run on a small dedicated thread pool
+# (hashlib releases the GIL while hashing) and never on the event loop.
+
+PASSWORD_SCHEME = os.getenv("PASSWORD_SCHEME", "scrypt")
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", str(2**14)))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv("PASSWORD_PBKDF2_ITERATIONS", "600000"))
+PASSWORD_HASH_WORKERS = int(
+    os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+if PASSWORD_SCHEME not in ("scrypt", "pbkdf2_sha256"):
+    raise ValueError(f"Unknown PASSWORD_SCHEME: {PASSWORD_SCHEME}")
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    # OpenSSL needs ~128 * n * r bytes; leave headroom over its 32 MiB default
+    return hashlib.scrypt(
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+        maxmem=256 * n * r + 1024 * 1024, dklen=HASH_BYTES,
+    )
+
+
+def _pbkdf2(password, salt, iterations):
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations, HASH_BYTES)
+
+
+def _current_params():
+    if PASSWORD_SCHEME == "scrypt":
+        return ["scrypt", str(PASSWORD_SCRYPT_N), str(PASSWORD_SCRYPT_R), str(PASSWORD_SCRYPT_P)]
+    return ["pbkdf2_sha256", str(PASSWORD_PBKDF2_ITERATIONS)]
+
+
+def hash_password(password):
+    """Hash `password` with the configured scheme and a fresh salt."""
+    params = _current_params()
+    salt = secrets.token_bytes(SALT_BYTES)
+    if params[0] == "scrypt":
+        digest = _scrypt(password, salt, *map(int, params[1:]))
+    else:
+        digest = _pbkdf2(password, salt, int(params[1]))
+    return "$".join([*params, _b64(salt), _b64(digest)])
+
+
+def verify_password(password, stored):
+    """
+    True if `password` matches the stored value. Values without a known
+    scheme prefix are legacy plaintext rows. With `stored=None` (no such
+    user) a dummy hash is checked, so unknown usernames take as long as
+    wrong passwords.
+    """
+    if stored is None:
+        verify_password(password, _dummy_hash())
+        return False
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            n, r, p = map(int, parts[1:4])
+            digest = _scrypt(password, _unb64(parts[4]), n, r, p)
+        elif parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            digest = _pbkdf2(password, _unb64(parts[2]), int(parts[1]))
+        else:
+            return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+        return hmac.compare_digest(digest, _unb64(parts[-1]))
+    except ValueError:
+        # malformed row or cost parameters OpenSSL refuses
+        return False
+
+
+def needs_rehash(stored):
+    """True if `stored` is plaintext or was hashed with other settings."""
+    parts = stored.split("$")
+    return parts[:-2] != _current_params()
+
+
+_dummy = None
+
+
+def _dummy_hash():
+    global _dummy
+    if _dummy is None:
+        _dummy = hash_password(secrets.token_hex(8))
+    return _dummy
+
+
+# ------------------ HASHING POOL ------------------ #
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash"
+                )
+    return _executor
+
+
+async def hash_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), hash_password, password)
+
+
+async def verify_async(password, stored):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), verify_password, password, stored)
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
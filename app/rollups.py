@@ -0,0 +1,252 @@
+"""
+Circulation rollups behind the analytics reports.
+
+Counters per day x category x type (issues, returns, late returns, fines
+charged and paid), per month x title and per month x member, plus
+all-time totals per title. Triggers on `issues` keep them current as
+transactions write, so analytics never scan the issue history.
+
+Backfill or repair existing history (holds the write lock while it runs):
+
+    python -m app.rollups
+"""
+import time
+
+# ------------------ ROLLUP TABLES ------------------ #
+#
+# Every issues row contributes:
+#   - when issued (issue_date): one issue to its day/category/type, to its
+#     title's month and all-time counters and to its member's month;
+#   - once returned (actual_return_date): one return, a late return if
+#     after planned_return, its fine charged and, if paid, fine paid to
+#     the return day/category/type and to its member's return month.
+# Triggers add a row's contribution on INSERT, remove it on DELETE and
+# swap the old one for the new one on UPDATE. Category and type are the
+# copy's at the time of the write; rebuild_rollups() recomputes from the
+# current catalogue.
+
+ROLLUP_TABLES = ("circulation_daily", "title_monthly", "title_totals", "member_monthly")
+
+
+def create_rollup_tables(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS circulation_daily (
+            day TEXT NOT NULL,
+            category TEXT NOT NULL,
+            type TEXT NOT NULL,
+            issues INTEGER NOT NULL DEFAULT 0,
+            returns INTEGER NOT NULL DEFAULT 0,
+            late_returns INTEGER NOT NULL DEFAULT 0,
+            fines_charged REAL NOT NULL DEFAULT 0,
+            fines_paid REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, category, type)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS title_monthly (
+            month TEXT NOT NULL,
+            name TEXT NOT NULL,
+            author TEXT NOT NULL,
+            type TEXT NOT NULL,
+            issues INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, name, author, type)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS title_totals (
+            name TEXT NOT NULL,
+            author TEXT NOT NULL,
+            type TEXT NOT NULL,
+            issues INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, author, type)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS member_monthly (
+            month TEXT NOT NULL,
+            membership_id TEXT NOT NULL,
+            issues INTEGER NOT NULL DEFAULT 0,
+            returns INTEGER NOT NULL DEFAULT 0,
+            late_returns INTEGER NOT NULL DEFAULT 0,
+            fines_charged REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, membership_id)
+        ) WITHOUT ROWID
+    """)
+    # top-N per month / all time straight off an index
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_title_monthly_rank ON title_monthly(month, issues)"
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_title_totals_rank ON title_totals(issues)")
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_member_monthly_rank ON member_monthly(month, issues)"
+    )
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_member_monthly_member ON member_monthly(membership_id, month)"
+    )
+
+
+def _with_book(row):
+    # the copy's catalogue row (or '' columns if it is gone): one lookup
+    return f"""
+        FROM (SELECT 1) LEFT JOIN books b ON b.serial_no = {row}.serial_no
+    """
+
+
+def _issued(row, sign):
+    """Statements adding (sign 1) or removing (-1) `row`'s issue counters."""
+    return f"""
+        INSERT INTO circulation_daily(day, category, type, issues)
+        SELECT {row}.issue_date, COALESCE(b.category, ''), COALESCE(b.type, ''), {sign}
+        {_with_book(row)} WHERE true
+        ON CONFLICT(day, category, type) DO UPDATE SET issues = issues + excluded.issues;
+        INSERT INTO title_monthly(month, name, author, type, issues)
+        SELECT substr({row}.issue_date, 1, 7), COALESCE(b.name, ''), COALESCE(b.author, ''),
+               COALESCE(b.type, ''), {sign}
+        {_with_book(row)} WHERE true
+        ON CONFLICT(month, name, author, type) DO UPDATE SET issues = issues + excluded.issues;
+        INSERT INTO title_totals(name, author, type, issues)
+        SELECT COALESCE(b.name, ''), COALESCE(b.author, ''), COALESCE(b.type, ''), {sign}
+        {_with_book(row)} WHERE true
+        ON CONFLICT(name, author, type) DO UPDATE SET issues = issues + excluded.issues;
+        INSERT INTO member_monthly(month, membership_id, issues)
+        VALUES (substr({row}.issue_date, 1, 7), {row}.membership_id, {sign})
+        ON CONFLICT(month, membership_id) DO UPDATE SET issues = issues + excluded.issues;
+    """
+
+
+def _returned(row, sign):
+    """Statements adding or removing `row`'s return and fine counters."""
+    late = f"({row}.actual_return_date > {row}.planned_return)"
+    paid = f"(CASE WHEN {row}.fine_paid THEN {row}.fine_amount ELSE 0 END)"
+    return f"""
+        INSERT INTO circulation_daily(day, category, type, returns, late_returns, fines_charged, fines_paid)
+        SELECT {row}.actual_return_date, COALESCE(b.category, ''), COALESCE(b.type, ''),
+               {sign}, {sign} * {late}, {sign} * {row}.fine_amount, {sign} * {paid}
+        {_with_book(row)}
+        WHERE {row}.actual_return_date IS NOT NULL
+        ON CONFLICT(day, category, type) DO UPDATE SET
+            returns = returns + excluded.returns,
+            late_returns = late_returns + excluded.late_returns,
+            fines_charged = fines_charged + excluded.fines_charged,
+            fines_paid = fines_paid + excluded.fines_paid;
+        INSERT INTO member_monthly(month, membership_id, returns, late_returns, fines_charged)
+        SELECT substr({row}.actual_return_date, 1, 7), {row}.membership_id,
+               {sign}, {sign} * {late}, {sign} * {row}.fine_amount
+        WHERE {row}.actual_return_date IS NOT NULL
+        ON CONFLICT(month, membership_id) DO UPDATE SET
+            returns = returns + excluded.returns,
+            late_returns = late_returns + excluded.late_returns,
+            fines_charged = fines_charged + excluded.fines_charged;
+    """
+
+
+def add_rollup_triggers(cur):
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS issues_rollup_ai AFTER INSERT ON issues BEGIN
+            {_issued("new", 1)}
+            {_returned("new", 1)}
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS issues_rollup_ad AFTER DELETE ON issues BEGIN
+            {_issued("old", -1)}
+            {_returned("old", -1)}
+        END
+    """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS issues_rollup_au_issued
+        AFTER UPDATE OF serial_no, membership_id, issue_date ON issues BEGIN
+            {_issued("old", -1)}
+            {_issued("new", 1)}
+        END
+    """)
+    # renewals (planned_return on open issues) don't touch the rollups
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS issues_rollup_au_returned
+        AFTER UPDATE OF serial_no, membership_id, planned_return,
+                        actual_return_date, fine_amount, fine_paid ON issues
+        WHEN old.actual_return_date IS NOT NULL OR new.actual_return_date IS NOT NULL
+        BEGIN
+            {_returned("old", -1)}
+            {_returned("new", 1)}
+        END
+    """)
+
+
+def rebuild_rollups(cur):
+    """Recompute every rollup table from the full issue history."""
+    for table in ROLLUP_TABLES:
+        cur.execute(f"DELETE FROM {table}")
+    cur.execute("""
+        INSERT INTO circulation_daily(day, category, type, issues, returns, late_returns,
+                                      fines_charged, fines_paid)
+        SELECT day, category, type, SUM(issues), SUM(returns), SUM(late), SUM(charged), SUM(paid)
+        FROM (
+            SELECT i.issue_date AS day, COALESCE(b.category, '') AS category,
+                   COALESCE(b.type, '') AS type,
+                   1 AS issues, 0 AS returns, 0 AS late, 0 AS charged, 0 AS paid
+            FROM issues i LEFT JOIN books b ON b.serial_no = i.serial_no
+            UNION ALL
+            SELECT i.actual_return_date, COALESCE(b.category, ''), COALESCE(b.type, ''),
+                   0, 1, i.actual_return_date > i.planned_return, i.fine_amount,
+                   CASE WHEN i.fine_paid THEN i.fine_amount ELSE 0 END
+            FROM issues i LEFT JOIN books b ON b.serial_no = i.serial_no
+            WHERE i.actual_return_date IS NOT NULL
+        )
+        GROUP BY day, category, type
+    """)
+    cur.execute("""
+        INSERT INTO title_monthly(month, name, author, type, issues)
+        SELECT substr(i.issue_date, 1, 7), COALESCE(b.name, ''), COALESCE(b.author, ''),
+               COALESCE(b.type, ''), COUNT(*)
+        FROM issues i LEFT JOIN books b ON b.serial_no = i.serial_no
+        GROUP BY 1, 2, 3, 4
+    """)
+    cur.execute("""
+        INSERT INTO title_totals(name, author, type, issues)
+        SELECT name, author, type, SUM(issues) FROM title_monthly
+        GROUP BY name, author, type
+    """)
+    cur.execute("""
+        INSERT INTO member_monthly(month, membership_id, issues, returns, late_returns, fines_charged)
+        SELECT month, membership_id, SUM(issues), SUM(returns), SUM(late), SUM(charged)
+        FROM (
+            SELECT substr(issue_date, 1, 7) AS month, membership_id,
+                   1 AS issues, 0 AS returns, 0 AS late, 0 AS charged
+            FROM issues
+            UNION ALL
+            SELECT substr(actual_return_date, 1, 7), membership_id,
+                   0, 1, actual_return_date > planned_return, fine_amount
+            FROM issues WHERE actual_return_date IS NOT NULL
+        )
+        GROUP BY month, membership_id
+    """)
+    # cached analytics responses are keyed on the issues write version
+    cur.execute("UPDATE table_versions SET version = version + 1 WHERE name = 'issues'")
+
+
+def main():
+    from . import db
+    from .db_init import migrate
+
+    migrate()
+    conn = db.get_connection()
+    started = time.perf_counter()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild_rollups(conn.cursor())
+        conn.commit()
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ROLLUP_TABLES
+        }
+    finally:
+        conn.close()
+        db.shutdown()
+    for table, count in counts.items():
+        print(f"{table:<18} {count:>10,} rows")
+    print(f"rebuilt in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
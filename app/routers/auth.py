@@ -1,4 +1,6 @@
 import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 
 from fastapi import APIRouter, Form, HTTPException, Request, Response, Depends
@@ -6,7 +8,7 @@ from fastapi.responses import JSONResponse
 from fastapi.templating import Jinja2Templates
 from jose import JWTError, jwt
 
-from ..db import get_connection
+from .. import db, passwords
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/templates")
@@ -15,6 +17,68 @@ SECRET_KEY = os.getenv("SECRET_KEY", "temp-key-if-not-set")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 ALGORITHM = "HS256"
 
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_VERSION_CHECK_SECONDS = float(os.getenv("USER_CACHE_VERSION_CHECK_SECONDS", "2"))
+
+
+class UserCache:
+    """
+    Bounded LRU of user active/role state with a per-entry TTL.
+
+    Writes through add_user/update_user invalidate their entry directly.
+    Writes from other workers are picked up through the `users` row of
+    table_versions (bumped by triggers): at most every
+    USER_CACHE_VERSION_CHECK_SECONDS the counter is read and, if it moved,
+    the whole cache is dropped.
+    """
+
+    def __init__(self, size, ttl, version_check):
+        self.size = size
+        self.ttl = ttl
+        self.version_check = version_check
+        self._entries = OrderedDict()
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self, username):
+        entry = self._entries.get(username)
+        if entry is None:
+            return None
+        user, expires = entry
+        if expires < time.monotonic():
+            del self._entries[username]
+            return None
+        self._entries.move_to_end(username)
+        return user
+
+    def put(self, username, user):
+        self._entries[username] = (user, time.monotonic() + self.ttl)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, username=None):
+        if username is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(username, None)
+
+    async def sync_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.version_check:
+            return
+        # claim the check before awaiting so concurrent requests skip it
+        self._checked_at = now
+        row = await db.fetch_one("SELECT version FROM table_versions WHERE name='users'")
+        version = row["version"] if row else None
+        if version != self._version:
+            self.invalidate()
+            self._version = version
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS, USER_CACHE_VERSION_CHECK_SECONDS)
+
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     to_encode = data.copy()
@@ -43,14 +107,15 @@ async def get_current_user(request: Request):
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT username, password, role, is_active FROM users WHERE username=?",
-        (username,),
-    )
-    user = cur.fetchone()
-    conn.close()
+    await user_cache.sync_version()
+    user = user_cache.get(username)
+    if user is None:
+        user = await db.fetch_one(
+            "SELECT username, role, is_active FROM users WHERE username=?",
+            (username,),
+        )
+        if user:
+            user_cache.put(username, user)
 
     if not user or not user["is_active"]:
         raise HTTPException(status_code=401, detail="Inactive or invalid user")
@@ -82,16 +147,13 @@ async def login(
     Validate username/password, issue JWT in HttpOnly cookie,
     and return JSON so frontend can handle UI.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
+    user = await db.fetch_one(
         "SELECT username, password, role, is_active FROM users WHERE username=?",
         (username,),
     )
-    user = cur.fetchone()
-    conn.close()
 
-    if not user or user["password"] != password:
+    stored = user["password"] if user else None
+    if not await passwords.verify_async(password, stored):
         return JSONResponse(
             {"success": False, "message": "Invalid username or password"},
             status_code=400,
@@ -103,6 +165,12 @@ async def login(
             status_code=400,
         )
 
+    if passwords.needs_rehash(stored):
+        # fully authenticated, with a plaintext or outdated hash: upgrade
+        # while we know the password. Conditional on the old value so a
+        # concurrent change wins.
+        await db.run_write(_set_password, username, await passwords.hash_async(password), stored)
+
     token_data = {
         "sub": user["username"],
         "role": user["role"],
@@ -131,6 +199,13 @@ async def login(
     return resp
 
 
+def _set_password(conn, username, new_hash, old_value):
+    conn.execute(
+        "UPDATE users SET password=? WHERE username=? AND password=?",
+        (new_hash, username, old_value),
+    )
+
+
 @router.get("/me")
 async def read_current_user(current_user=Depends(get_current_user)):
     return current_user  # {"username": "...", "role": "admin" or "user"}
@@ -153,19 +228,19 @@ async def add_user(
     is_active: bool = Form(True),
 ):
     role = "admin" if is_admin else "user"
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "INSERT INTO users(username,password,role,is_active) VALUES (?,?,?,?)",
-            (username, password, role, 1 if is_active else 0),
-        )
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    password = await passwords.hash_async(password)
+
+    def _insert(conn):
+        try:
+            conn.execute(
+                "INSERT INTO users(username,password,role,is_active) VALUES (?,?,?,?)",
+                (username, password, role, 1 if is_active else 0),
+            )
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    await db.run_write(_insert)
+    user_cache.invalidate(username)
     return {"message": "User added"}
 
 
@@ -177,30 +252,27 @@ async def update_user(
     is_active: bool = Form(True),
 ):
     role = "admin" if is_admin else "user"
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE users SET password=?, role=?, is_active=? WHERE username=?",
-        (password, role, 1 if is_active else 0, username),
-    )
-    if cur.rowcount == 0:
-        conn.close()
-        raise HTTPException(status_code=404, detail="User not found")
-    conn.commit()
-    conn.close()
+    password = await passwords.hash_async(password)
+
+    def _update(conn):
+        cur = conn.execute(
+            "UPDATE users SET password=?, role=?, is_active=? WHERE username=?",
+            (password, role, 1 if is_active else 0, username),
+        )
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=404, detail="User not found")
+
+    await db.run_write(_update)
+    user_cache.invalidate(username)
     return {"message": "User updated"}
 
 
 @router.get("/users/{username}")
 async def get_user(username: str):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
+    row = await db.fetch_one(
         "SELECT username, role, is_active FROM users WHERE username=?",
         (username,),
     )
-    row = cur.fetchone()
-    conn.close()
     if not row:
         raise HTTPException(status_code=404, detail="User not found")
-    return dict(row)
+    return row
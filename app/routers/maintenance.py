@@ -1,8 +1,15 @@
+import csv
+import json
+import os
+import re
+import sqlite3
+import time
 from datetime import date
 from dateutil.relativedelta import relativedelta
-from fastapi import APIRouter, HTTPException, Form, Depends
+from fastapi import APIRouter, HTTPException, Form, Depends, Query, Request
 from .auth import require_admin
-from ..db import get_connection
+from .. import db, fines, scheduler
+from ..http_cache import response_cache
 
 router = APIRouter(dependencies=[Depends(require_admin)])
 #     prefix="/api/maintenance",
@@ -12,6 +19,20 @@ router = APIRouter(dependencies=[Depends(require_admin)])
 
 # ------------------ MEMBERSHIP ------------------ #
 
+MEMBERSHIP_PLANS = {
+    "6m": relativedelta(months=6),
+    "1y": relativedelta(years=1),
+    "2y": relativedelta(years=2),
+}
+
+
+def plan_end_date(start_dt, plan):
+    """End date for a new membership; ValueError for an unknown plan."""
+    if plan not in MEMBERSHIP_PLANS:
+        raise ValueError(f"Invalid membership plan: {plan}")
+    return start_dt + MEMBERSHIP_PLANS[plan]
+
+
 @router.post("/membership/add")
 async def add_membership(
     membership_id: str = Form(...),
@@ -33,44 +54,37 @@ async def add_membership(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid start date")
 
-    if plan == "6m":
-        end_dt = start_dt + relativedelta(months=6)
-    elif plan == "1y":
-        end_dt = start_dt + relativedelta(years=1)
-    elif plan == "2y":
-        end_dt = start_dt + relativedelta(years=2)
-    else:
+    try:
+        end_dt = plan_end_date(start_dt, plan)
+    except ValueError:
         raise HTTPException(status_code=400, detail="Invalid membership plan")
 
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            """
-            INSERT INTO members(
-                membership_id, first_name, last_name, phone, address,
-                aadhar, start_date, end_date, status, pending_fine
+    def _insert(conn):
+        try:
+            conn.execute(
+                """
+                INSERT INTO members(
+                    membership_id, first_name, last_name, phone, address,
+                    aadhar, start_date, end_date, status, pending_fine
+                )
+                VALUES (?,?,?,?,?,?,?,?,?,0)
+                """,
+                (
+                    membership_id,
+                    first_name,
+                    last_name,
+                    phone,
+                    address,
+                    aadhar,
+                    start_date,
+                    end_dt.isoformat(),
+                    "Active",
+                ),
             )
-            VALUES (?,?,?,?,?,?,?,?,?,0)
-            """,
-            (
-                membership_id,
-                first_name,
-                last_name,
-                phone,
-                address,
-                aadhar,
-                start_date,
-                end_dt.isoformat(),
-                "Active",
-            ),
-        )
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=f"Could not add membership: {e}")
-    finally:
-        conn.close()
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not add membership: {e}")
+
+    await db.run_write(_insert)
 
     return {"message": "Membership added"}
 
@@ -80,18 +94,14 @@ async def get_membership(membership_id: str):
     """
     Used by update form to auto-populate details.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
+    row = await db.fetch_one(
         "SELECT membership_id, first_name, last_name, phone, address, aadhar, start_date, end_date, status "
         "FROM members WHERE membership_id=?",
         (membership_id,),
     )
-    row = cur.fetchone()
-    conn.close()
     if not row:
         raise HTTPException(status_code=404, detail="Membership not found")
-    return dict(row)
+    return row
 
 
 @router.post("/membership/update")
@@ -106,84 +116,138 @@ async def update_membership(
     - extend2y: extend by 2 years
     - remove: mark membership as Inactive
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT end_date, status FROM members WHERE membership_id=?", (membership_id,))
-    row = cur.fetchone()
+    if action not in ("remove", "extend6", "extend1y", "extend2y"):
+        raise HTTPException(status_code=400, detail="Invalid action")
 
-    if not row:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Membership not found")
+    def _update(conn):
+        cur = conn.cursor()
+        cur.execute("SELECT end_date, status FROM members WHERE membership_id=?", (membership_id,))
+        row = cur.fetchone()
 
-    end_dt = date.fromisoformat(row["end_date"])
-
-    if action == "remove":
-        new_status = "Inactive"
-        new_end = end_dt.isoformat()
-    elif action == "extend6":
-        new_status = "Active"
-        new_end = (end_dt + relativedelta(months=6)).isoformat()
-    elif action == "extend1y":
-        new_status = "Active"
-        new_end = (end_dt + relativedelta(years=1)).isoformat()
-    elif action == "extend2y":
-        new_status = "Active"
-        new_end = (end_dt + relativedelta(years=2)).isoformat()
-    else:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Invalid action")
+        if not row:
+            raise HTTPException(status_code=404, detail="Membership not found")
 
-    cur.execute(
-        "UPDATE members SET end_date=?, status=? WHERE membership_id=?",
-        (new_end, new_status, membership_id),
-    )
-    conn.commit()
-    conn.close()
+        end_dt = date.fromisoformat(row["end_date"])
+
+        if action == "remove":
+            new_status = "Inactive"
+            new_end = end_dt.isoformat()
+        elif action == "extend6":
+            new_status = "Active"
+            new_end = (end_dt + relativedelta(months=6)).isoformat()
+        elif action == "extend1y":
+            new_status = "Active"
+            new_end = (end_dt + relativedelta(years=1)).isoformat()
+        else:
+            new_status = "Active"
+            new_end = (end_dt + relativedelta(years=2)).isoformat()
+
+        cur.execute(
+            "UPDATE members SET end_date=?, status=? WHERE membership_id=?",
+            (new_end, new_status, membership_id),
+        )
+        return new_end, new_status
+
+    new_end, new_status = await db.run_write(_update)
     return {"message": "Membership updated", "new_end_date": new_end, "status": new_status}
 
 
 # ------------------ BOOK / MOVIE ------------------ #
 
+SERIAL_DIGITS = 6
+# most copies one add (or one import record) may create
+BOOK_MAX_QUANTITY = int(os.getenv("BOOK_MAX_QUANTITY", "1000"))
+
+
+def serial_prefix(cur, type, category=""):
+    """
+    Serial prefix, digit width and highest allowed number for a new copy.
+    Categories listed in product_details use their code range (e.g.
+    'SC(B/M)' from 'SC(B/M)000001', up to the number in code_to);
+    anything else falls back to 'B' / 'M' by type.
+    """
+    if category:
+        cur.execute(
+            "SELECT code_from, code_to FROM product_details WHERE category = ? COLLATE NOCASE "
+            "ORDER BY id LIMIT 1",
+            (category,),
+        )
+        row = cur.fetchone()
+        if row:
+            m = re.fullmatch(r"(.*?)(\d+)", row["code_from"])
+            if m:
+                prefix, width = m.group(1), len(m.group(2))
+                end = re.fullmatch(re.escape(prefix) + r"(\d+)", row["code_to"] or "")
+                return prefix, width, int(end.group(1)) if end else 10 ** width - 1
+    return ("B" if type == "Book" else "M"), SERIAL_DIGITS, 10 ** SERIAL_DIGITS - 1
+
+
+def _glob_escape(text):
+    return re.sub(r"([\[\]*?])", r"[\1]", text)
+
+
+def allocate_serials(cur, type, count, category=""):
+    """
+    Reserve `count` consecutive serial numbers in one atomic upsert on
+    serial_sequences and return them. The statement takes the write lock,
+    so concurrent allocations (other requests or workers) serialize on it
+    and never hand out the same block; the caller's commit makes the
+    reservation durable together with the inserted copies.
+
+    A prefix seen for the first time is seeded from the highest serial
+    with that prefix already in books. A block that would run past the
+    end of the range is refused (400) and nothing is reserved.
+    """
+    prefix, width, limit = serial_prefix(cur, type, category)
+    cur.execute(
+        """
+        INSERT INTO serial_sequences(prefix, last_value)
+        SELECT :prefix, COALESCE(MAX(CAST(substr(serial_no, :start) AS INTEGER)), 0) + :count
+        FROM books WHERE serial_no GLOB :pattern
+        HAVING COALESCE(MAX(CAST(substr(serial_no, :start) AS INTEGER)), 0) + :count <= :limit
+        ON CONFLICT(prefix) DO UPDATE SET last_value = last_value + :count
+            WHERE last_value + :count <= :limit
+        RETURNING last_value
+        """,
+        {
+            "prefix": prefix,
+            "start": len(prefix) + 1,
+            "count": count,
+            "pattern": _glob_escape(prefix) + "[0-9]*",
+            "limit": limit,
+        },
+    )
+    row = cur.fetchone()
+    if row is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Serial range full: {count} more would pass {prefix}{limit:0{width}d}",
+        )
+    last = row["last_value"]
+    return [f"{prefix}{n:0{width}d}" for n in range(last - count + 1, last + 1)]
+
+
 @router.post("/book/add")
 async def add_book(
     type: str = Form(...),               # "Book" or "Movie"
     name: str = Form(...),
     procurement_date: str = Form(...),   # "YYYY-MM-DD"
     quantity: int = Form(...),
+    category: str = Form(""),            # product_details category, optional
 ):
     if type not in ("Book", "Movie"):
         raise HTTPException(status_code=400, detail="Type must be Book or Movie")
 
     if quantity <= 0:
         raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+    if quantity > BOOK_MAX_QUANTITY:
+        raise HTTPException(status_code=400, detail=f"Quantity must be at most {BOOK_MAX_QUANTITY}")
 
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Decide prefix for serial numbers
-    prefix = "B" if type == "Book" else "M"
-
-    # Find the last serial for this type, if any
-    cur.execute(
-        "SELECT serial_no FROM books WHERE type=? ORDER BY serial_no DESC LIMIT 1",
-        (type,),
-    )
-    row = cur.fetchone()
-    last_num = 0
-    if row:
-        # assume serial like 'B000001' or 'M000010'
-        existing = row["serial_no"]
-        # take trailing digits
-        digits = "".join(ch for ch in existing if ch.isdigit())
-        if digits:
-            last_num = int(digits)
-
-    try:
-        for i in range(1, quantity + 1):
-            new_num = last_num + i
-            serial_no = f"{prefix}{new_num:06d}"  # e.g. B000001, M000002
-
-            cur.execute(
+    def _insert(conn):
+        cur = conn.cursor()
+        serials = allocate_serials(cur, type, quantity, category)
+        try:
+            cur.executemany(
                 """
                 INSERT INTO books(
                     serial_no, name, author, category,
@@ -191,26 +255,31 @@ async def add_book(
                 )
                 VALUES (?,?,?,?,?,?,?,?)
                 """,
-                (
-                    serial_no,
-                    name,
-                    "",                 # author (not in this screen)
-                    "",                 # category (not in this screen)
-                    "Available",        # status default
-                    0.0,                # cost default
-                    procurement_date,
-                    type,
-                ),
+                [
+                    (
+                        serial_no,
+                        name,
+                        "",                 # author (not in this screen)
+                        category,
+                        "Available",        # status default
+                        0.0,                # cost default
+                        procurement_date,
+                        type,
+                    )
+                    for serial_no in serials
+                ],
             )
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Could not add book/movie: {e}")
+        return serials
 
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=f"Could not add book/movie: {e}")
-    finally:
-        conn.close()
+    serials = await db.run_write(_insert)
 
-    return {"message": "Book/Movie added"}
+    return {
+        "message": "Book/Movie added",
+        "serial_from": serials[0],
+        "serial_to": serials[-1],
+    }
 
 
 @router.get("/book/{serial_no}")
@@ -218,18 +287,14 @@ async def get_book(serial_no: str):
     """
     Used by update book form to auto-populate.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
+    row = await db.fetch_one(
         "SELECT serial_no, name, author, category, status, procurement_date, type "
         "FROM books WHERE serial_no=?",
         (serial_no,),
     )
-    row = cur.fetchone()
-    conn.close()
     if not row:
         raise HTTPException(status_code=404, detail="Book/Movie not found")
-    return dict(row)
+    return row
 
 
 @router.post("/book/update")
@@ -241,19 +306,476 @@ async def update_book(
     status: str = Form(...),
     procurement_date: str = Form(...),
 ):
-    if status not in ("Available", "Issued"):
+    if status not in ("Available", "Issued", "Reserved"):
         raise HTTPException(status_code=400, detail="Invalid status")
 
-    conn = get_connection()
+    def _update(conn):
+        # Reserved belongs to the hold queue: a copy set aside for a
+        # Fulfilled hold keeps it, and no other copy can be given it
+        held = conn.execute(
+            "SELECT 1 FROM issue_requests WHERE serial_no=? AND status='Fulfilled'",
+            (serial_no,),
+        ).fetchone()
+        if held and status != "Reserved":
+            raise HTTPException(
+                status_code=400, detail="Copy is reserved for a hold, cancel the hold first"
+            )
+        if not held and status == "Reserved":
+            raise HTTPException(status_code=400, detail="Only copies set aside for a hold are Reserved")
+        cur = conn.execute(
+            "UPDATE books SET name=?, author=?, category=?, status=?, procurement_date=? WHERE serial_no=?",
+            (name, author, category, status, procurement_date, serial_no),
+        )
+        if cur.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Book/Movie not found")
+
+    await db.run_write(_update)
+    return {"message": "Book/Movie updated"}
+
+
+# ------------------ BULK IMPORT ------------------ #
+#
+# The request body is consumed as a stream: records are parsed line by
+# line, validated, and inserted in chunked transactions of
+# IMPORT_CHUNK_SIZE rows, so memory stays flat whatever the file size.
+# Committed chunks stay committed if a later chunk fails.
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+IMPORT_MAX_ERRORS = 1000
+# most lines one CSV record (quoted fields with line breaks) may span
+IMPORT_MAX_RECORD_LINES = 100
+
+
+
+async def _iter_lines(request):
+    buf = b""
+    first = True
+    async for chunk in request.stream():
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            text = line.decode("utf-8").rstrip("\r")
+            if first:
+                text, first = text.lstrip("\ufeff"), False
+            yield text
+    if buf:
+        text = buf.decode("utf-8").rstrip("\r")
+        yield text.lstrip("\ufeff") if first else text
+
+
+def _csv_open_quote(line, quoted):
+    """
+    Whether a CSV record is inside a quoted field at the end of `line`
+    (`quoted`: it already was at the start). As in csv.reader, only a
+    quote opening a field starts one; a quote inside an unquoted field
+    (5" Floppy) is an ordinary character.
+    """
+    state = "quoted" if quoted else "start"
+    for ch in line:
+        if state == "quoted":
+            if ch == '"':
+                state = "closed"
+        elif ch == ",":
+            state = "start"
+        elif ch == '"' and state in ("start", "closed"):
+            # opens a field, or "" inside a quoted one
+            state = "quoted"
+        else:
+            state = "unquoted"
+    return state == "quoted"
+
+
+class _CsvRecords:
+    """
+    Groups CSV lines into records. A record whose quoted field is still
+    open after IMPORT_MAX_RECORD_LINES lines (or at the end of the body)
+    is reported as unterminated, and the lines after its first are read
+    again as records of their own.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.quoted = False
+
+    def feed(self, line):
+        """Records completed by `line`: text, or a ValueError."""
+        self.pending.append(line)
+        self.quoted = _csv_open_quote(line, self.quoted)
+        if not self.quoted:
+            text, self.pending = "\n".join(self.pending), []
+            return [text]
+        if len(self.pending) >= IMPORT_MAX_RECORD_LINES:
+            return self._resync()
+        return []
+
+    def finish(self):
+        """Records left at the end of the body."""
+        records = []
+        while self.pending:
+            records += self._resync()
+        return records
+
+    def _resync(self):
+        rest, self.pending, self.quoted = self.pending[1:], [], False
+        records = [ValueError("unterminated quoted field")]
+        for line in rest:
+            records += self.feed(line)
+        return records
+
+
+async def _iter_records(request, fmt):
+    """Yield (record_no, dict) from a CSV (with header) or NDJSON body."""
+    record_no = 0
+    if fmt == "ndjson":
+        async for line in _iter_lines(request):
+            if not line.strip():
+                continue
+            record_no += 1
+            try:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                yield record_no, e
+                continue
+            yield record_no, record
+        return
+
+    header = None
+    splitter = _CsvRecords()
+
+    async def lines():
+        async for line in _iter_lines(request):
+            yield splitter.feed(line)
+        yield splitter.finish()
+
+    async for texts in lines():
+        for text in texts:
+            if isinstance(text, ValueError):
+                record_no += 1
+                yield record_no, text
+                continue
+            if not text.strip():
+                continue
+            values = next(csv.reader([text]))
+            if header is None:
+                header = [h.strip().lower() for h in values]
+                continue
+            record_no += 1
+            if len(values) != len(header):
+                yield record_no, ValueError(f"expected {len(header)} columns, got {len(values)}")
+                continue
+            yield record_no, dict(zip(header, values))
+
+
+def _import_format(request, fmt):
+    if fmt is None:
+        content_type = request.headers.get("content-type", "")
+        fmt = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be csv or ndjson")
+    return fmt
+
+
+def _field(record, name, required=True):
+    value = record.get(name)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(f"{name} is required")
+    return value
+
+
+def _parse_book(record):
+    type = _field(record, "type").capitalize()
+    if type not in ("Book", "Movie"):
+        raise ValueError("type must be Book or Movie")
+    procurement_date = _field(record, "procurement_date", required=False) or date.today().isoformat()
+    date.fromisoformat(procurement_date)
+    quantity = int(_field(record, "quantity", required=False) or 1)
+    if quantity <= 0:
+        raise ValueError("quantity must be at least 1")
+    if quantity > BOOK_MAX_QUANTITY:
+        raise ValueError(f"quantity must be at most {BOOK_MAX_QUANTITY}")
+    return (
+        type,
+        _field(record, "name"),
+        _field(record, "author", required=False),
+        _field(record, "category", required=False),
+        float(_field(record, "cost", required=False) or 0),
+        procurement_date,
+        quantity,
+    )
+
+
+def _parse_member(record):
+    start_date = _field(record, "start_date")
+    end_dt = plan_end_date(date.fromisoformat(start_date), _field(record, "plan"))
+    return (
+        _field(record, "membership_id"),
+        _field(record, "first_name"),
+        _field(record, "last_name"),
+        _field(record, "phone"),
+        _field(record, "address"),
+        _field(record, "aadhar"),
+        start_date,
+        end_dt.isoformat(),
+    )
+
+
+def _insert_chunk(conn, sql, build):
+    """
+    Insert the rows returned by `build(cur)` -- [(record_no, params)] --
+    as one write (run through db.run_write). If the fast executemany path
+    hits a constraint, redo the chunk row by row (rebuilding it, so
+    anything `build` reserved is reserved again) so each bad record is
+    reported and the rest still go in. Returns (inserted, [(record_no, error)]).
+    """
     cur = conn.cursor()
-    cur.execute(
-        "UPDATE books SET name=?, author=?, category=?, status=?, procurement_date=? WHERE serial_no=?",
-        (name, author, category, status, procurement_date, serial_no),
+    cur.execute("SAVEPOINT import_chunk")
+    try:
+        rows = build(cur)
+        cur.executemany(sql, [params for _, params in rows])
+        cur.execute("RELEASE import_chunk")
+        return len(rows), []
+    except sqlite3.IntegrityError:
+        cur.execute("ROLLBACK TO import_chunk")
+        cur.execute("RELEASE import_chunk")
+
+    inserted, errors = 0, []
+    for record_no, params in build(cur):
+        try:
+            cur.execute("SAVEPOINT import_row")
+            cur.execute(sql, params)
+            cur.execute("RELEASE import_row")
+            inserted += 1
+        except sqlite3.IntegrityError as e:
+            cur.execute("ROLLBACK TO import_row")
+            cur.execute("RELEASE import_row")
+            errors.append((record_no, str(e)))
+    return inserted, errors
+
+
+BOOK_INSERT_SQL = """
+    INSERT INTO books(
+        serial_no, name, author, category,
+        status, cost, procurement_date, type
     )
-    if cur.rowcount == 0:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Book/Movie not found")
+    VALUES (?,?,?,?,'Available',?,?,?)
+"""
 
-    conn.commit()
-    conn.close()
-    return {"message": "Book/Movie updated"}
+MEMBER_INSERT_SQL = """
+    INSERT INTO members(
+        membership_id, first_name, last_name, phone, address,
+        aadhar, start_date, end_date, status, pending_fine
+    )
+    VALUES (?,?,?,?,?,?,?,?,'Active',0)
+"""
+
+
+def _insert_book_chunk(conn, chunk):
+    """
+    Expand each title into `quantity` copies with fresh serials: one
+    block reservation per (type, category) prefix in the chunk.
+    """
+    groups = {}
+    for record_no, params in chunk:
+        groups.setdefault((params[0], params[3]), []).append((record_no, params))
+
+    full = []  # records of groups whose serial range is exhausted
+
+    def build(cur):
+        rows = []
+        full.clear()
+        for (type, category), titles in groups.items():
+            try:
+                serials = iter(allocate_serials(cur, type, sum(p[6] for _, p in titles), category))
+            except HTTPException as e:
+                full.extend((record_no, e.detail) for record_no, _ in titles)
+                continue
+            for record_no, (_, name, author, category, cost, procurement_date, quantity) in titles:
+                for _ in range(quantity):
+                    rows.append(
+                        (record_no, (next(serials), name, author, category, cost, procurement_date, type))
+                    )
+        return rows
+
+    inserted, errors = _insert_chunk(conn, BOOK_INSERT_SQL, build)
+    return inserted, full + errors
+
+
+def _insert_member_chunk(conn, chunk):
+    return _insert_chunk(conn, MEMBER_INSERT_SQL, lambda cur: chunk)
+
+
+async def _run_import(request, fmt, parse, insert_chunk, rows_of=lambda params: 1):
+    """
+    Parse and insert the records of the request body in chunks of about
+    IMPORT_CHUNK_SIZE rows; `rows_of(params)` says how many rows one
+    parsed record becomes.
+    """
+    started = time.perf_counter()
+    stats = {"records": 0, "inserted": 0, "failed": 0}
+    errors = []
+    failed_records = set()
+
+    def record_error(record_no, message):
+        if record_no not in failed_records:
+            failed_records.add(record_no)
+            stats["failed"] += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"record": record_no, "error": message})
+
+    async def flush(chunk):
+        inserted, chunk_errors = await db.run_write(insert_chunk, chunk)
+        stats["inserted"] += inserted
+        for record_no, message in chunk_errors:
+            record_error(record_no, message)
+
+    chunk, chunk_rows = [], 0
+    async for record_no, record in _iter_records(request, fmt):
+        stats["records"] += 1
+        if isinstance(record, Exception):
+            record_error(record_no, str(record))
+            continue
+        try:
+            params = parse(record)
+        except (ValueError, TypeError) as e:
+            record_error(record_no, str(e))
+            continue
+        chunk.append((record_no, params))
+        chunk_rows += rows_of(params)
+        if chunk_rows >= IMPORT_CHUNK_SIZE:
+            await flush(chunk)
+            chunk, chunk_rows = [], 0
+    if chunk:
+        await flush(chunk)
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["records_per_second"] = round(stats["records"] / elapsed, 1) if elapsed else None
+    stats["errors"] = sorted(errors, key=lambda e: e["record"])
+    stats["errors_truncated"] = len(errors) < stats["failed"]
+    return stats
+
+
+@router.post("/import/books")
+async def import_books(
+    request: Request,
+    format: str | None = Query(None, description="csv or ndjson (default: from Content-Type)"),
+):
+    """
+    Bulk-add Books/Movies. Columns: type, name, author, category, cost,
+    procurement_date, quantity (only type and name are required).
+    Each record becomes `quantity` (at most BOOK_MAX_QUANTITY) copies
+    with newly allocated serials.
+    `inserted` counts copies; `records`/`failed` count input records.
+    """
+    fmt = _import_format(request, format)
+    return await _run_import(
+        request, fmt, _parse_book, _insert_book_chunk, rows_of=lambda params: params[6]
+    )
+
+
+@router.post("/import/memberships")
+async def import_memberships(
+    request: Request,
+    format: str | None = Query(None, description="csv or ndjson (default: from Content-Type)"),
+):
+    """
+    Bulk-add memberships. Columns: membership_id, first_name, last_name,
+    phone, address, aadhar, start_date, plan (6m/1y/2y) -- all required.
+    """
+    fmt = _import_format(request, format)
+    return await _run_import(request, fmt, _parse_member, _insert_member_chunk)
+
+
+# ------------------ FINES ------------------ #
+
+@router.post("/fines/refresh")
+async def refresh_pending_fines():
+    """
+    Recompute every member's pending_fine (accrued on open overdue
+    issues) in one set-based pass.
+    """
+    updated = await db.run_write(fines.refresh_pending_fines)
+    return {"message": "Pending fines refreshed", "members_updated": updated}
+
+
+# ------------------ SCHEDULED JOBS ------------------ #
+
+@router.get("/jobs")
+async def job_history(
+    job: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Most recent background job runs with durations and rows affected."""
+    sql = "SELECT * FROM job_runs"
+    params = []
+    if job:
+        sql += " WHERE job=?"
+        params.append(job)
+    sql += " ORDER BY run_id DESC LIMIT ?"
+    params.append(limit)
+    runs = await db.fetch_all(sql, params)
+    lease = await db.fetch_one(
+        "SELECT owner, expires_at FROM scheduler_lease WHERE name=?",
+        (scheduler.LEASE_NAME,),
+    )
+    return {"jobs": list(scheduler.JOBS), "lease": lease, "runs": runs}
+
+
+@router.post("/jobs/{name}/run")
+async def run_job_now(name: str):
+    """Run a background job immediately in this worker."""
+    if name not in scheduler.JOBS:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return await scheduler.run_job(name)
+
+
+# ------------------ DATABASE ------------------ #
+
+@router.get("/db/pool")
+async def db_pool_stats():
+    """
+    Connection pool usage: open/idle/in-use connections, checkouts,
+    waits and time spent waiting for a free connection. The read-only
+    pool used by reports is under "read_pool".
+    """
+    return {**db.pool_stats(), "read_pool": db.read_pool_stats()}
+
+
+@router.get("/db/writes")
+async def db_write_stats():
+    """
+    Write operations committed and failed, group commits and the largest
+    group, queued operations, SQLITE_BUSY retries and give-ups.
+    """
+    return db.write_stats()
+
+
+@router.get("/db/slow-queries")
+async def slow_queries(
+    limit: int = Query(20, ge=1, le=200),
+    order: str = Query("total_ms", pattern="^(total_ms|max_ms|avg_ms|count)$"),
+):
+    """
+    Top slow statements (DB_SLOW_QUERY_MS must be set): normalized SQL,
+    counts and timings, calling routes, query plan and flagged full scans.
+    """
+    return {
+        "enabled": db.DB_SLOW_QUERY_MS > 0,
+        "threshold_ms": db.DB_SLOW_QUERY_MS,
+        "queries": db.slow_queries.top(limit, order),
+    }
+
+
+@router.post("/db/slow-queries/reset")
+async def reset_slow_queries():
+    db.slow_queries.reset()
+    return {"message": "Slow query log cleared"}
+
+
+@router.get("/cache/responses")
+async def response_cache_stats():
+    """Report response cache: hits, misses, 304s, evictions and size."""
+    return response_cache.stats()
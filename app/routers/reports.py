@@ -1,89 +1,614 @@
+import base64
+import csv
+import io
+import json
+import os
+from datetime import date, timedelta
 
-from fastapi import APIRouter, Depends
-from ..db import get_connection
-from .auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from .. import db, fines
+from ..http_cache import CachedResponse, cached
+from ..jsonrows import RawJSON, iter_chunks, json_array, json_object_body, select_json
+from .auth import get_current_user, require_admin, require_authenticated
 
 router = APIRouter()
 
+REPORT_PAGE_SIZE = 100
+REPORT_MAX_PAGE_SIZE = 1000
+
+
+# ------------------ KEYSET PAGINATION ------------------ #
+#
+# Reports are paged on their sort key (`WHERE key > :after ORDER BY key
+# LIMIT n`), so every page costs one index seek regardless of how deep it
+# is. The cursor is the last key of the previous page, base64-encoded.
+# Composite keys compare as row values: (a, b) > (:a, :b).
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or not values:
+            raise ValueError(cursor)
+        # key values are bound as SQL parameters: scalars only
+        if not all(v is None or isinstance(v, (str, int, float)) for v in values):
+            raise ValueError(cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+class Page:
+    """Common query parameters of every paginated report."""
+
+    def __init__(
+        self,
+        limit: int = Query(REPORT_PAGE_SIZE, ge=1, le=REPORT_MAX_PAGE_SIZE),
+        after: str | None = Query(None, description="next_cursor of the previous page"),
+        include_total: bool = Query(False, description="Also count all matching rows"),
+    ):
+        self.limit = limit
+        self.after = decode_cursor(after) if after else None
+        self.include_total = include_total
+
+
+async def keyset_page(page, table, key, where=(), params=None, columns="*"):
+    """
+    Fetch one page of `table` (a table name or a parenthesised subquery)
+    ordered by `key` -- a column name or a tuple of them. `where` is a
+    list of SQL conditions joined with AND; `params` holds the named
+    parameters used by `columns`, `table` and `where`.
+    Returns the report response body as JSON bytes, rows rendered by
+    SQLite (see jsonrows).
+    """
+    keys = (key,) if isinstance(key, str) else tuple(key)
+    if page.after is not None and len(page.after) != len(keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    def _fetch(conn):
+        clauses = list(where)
+        args = dict(params or {})
+        if page.after is not None:
+            names = [f":after_{i}" for i in range(len(keys))]
+            clauses.append(f"({', '.join(keys)}) > ({', '.join(names)})")
+            args.update({n[1:]: v for n, v in zip(names, page.after)})
+        order = ", ".join(keys)
+        sql = f"SELECT {columns} FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order} LIMIT :page_limit"
+        # one extra row tells us whether another page exists
+        args["page_limit"] = page.limit + 1
+
+        cur = select_json(conn, sql, args, extra=keys, order_by=order)
+        rows, last, next_cursor = [], None, None
+        for row in iter_chunks(cur):
+            if len(rows) == page.limit:
+                next_cursor = encode_cursor(last)
+                break
+            rows.append(row[0])
+            last = row[1:]
+        body = {
+            "results": RawJSON("[" + ",".join(rows) + "]"),
+            "next_cursor": next_cursor,
+        }
+
+        if page.include_total:
+            count_sql = f"SELECT COUNT(*) FROM {table}"
+            if where:
+                count_sql += " WHERE " + " AND ".join(where)
+            body["total"] = conn.execute(count_sql, dict(params or {})).fetchone()[0]
+        return json_object_body(**body)
+
+    return await db.read(_fetch)
+
+
+# ------------------ REPORTS ------------------ #
+#
+# Each report is described once by a ReportQuery, used both by its paged
+# JSON endpoint and by the streaming export below.
+
+class ReportQuery:
+    """
+    A report as keyset_page() arguments, plus `date_column`: the column
+    export date filters apply to (None if the report has none).
+    """
+
+    def __init__(self, table, key, where=(), params=None, columns="*", date_column=None):
+        self.table = table
+        self.key = key
+        self.where = list(where)
+        self.params = dict(params or {})
+        self.columns = columns
+        self.date_column = date_column
+
+    async def page(self, page):
+        return await keyset_page(
+            page, self.table, self.key, self.where, self.params, self.columns
+        )
+
+
+def _catalogue_filter(type, status):
+    where, params = ["type=:type"], {"type": type}
+    if status:
+        where.append("status=:status")
+        params["status"] = status
+    return where, params
+
+
+def books_report(status=None):
+    where, params = _catalogue_filter("Book", status)
+    return ReportQuery("books", "serial_no", where, params, date_column="procurement_date")
+
+
+def movies_report(status=None):
+    where, params = _catalogue_filter("Movie", status)
+    return ReportQuery("books", "serial_no", where, params, date_column="procurement_date")
+
+
+def members_report():
+    return ReportQuery("members", "membership_id", date_column="start_date")
+
+
+def active_issues_report(membership_id=None):
+    where, params = ["actual_return_date IS NULL"], {}
+    if membership_id:
+        where.append("membership_id=:membership_id")
+        params["membership_id"] = membership_id
+    return ReportQuery("issues", "issue_id", where, params, date_column="issue_date")
+
+
+def overdue_returns_report():
+    return ReportQuery(
+        "issues",
+        "issue_id",
+        ["actual_return_date IS NOT NULL", "actual_return_date > planned_return"],
+        date_column="issue_date",
+    )
+
+
+def requests_report():
+    return ReportQuery("issue_requests", "request_id", date_column="requested_date")
+
+
+def currently_overdue_report():
+    return ReportQuery(
+        "issues",
+        ("planned_return", "issue_id"),
+        [fines.OPEN_OVERDUE_WHERE],
+        fines.sql_params(),
+        columns=(
+            "issue_id, serial_no, membership_id, issue_date, planned_return, "
+            f"{fines.DAYS_LATE_SQL} AS days_late, "
+            f"{fines.DAYS_LATE_SQL} * :daily_fine AS accrued_fine"
+        ),
+        date_column="issue_date",
+    )
+
+
+def overdue_by_member_report():
+    return ReportQuery(
+        f"""(
+            SELECT membership_id,
+                   COUNT(*) AS overdue_items,
+                   MAX({fines.DAYS_LATE_SQL}) AS max_days_late,
+                   SUM({fines.DAYS_LATE_SQL}) * :daily_fine AS accrued_fine
+            FROM issues
+            WHERE {fines.OPEN_OVERDUE_WHERE}
+            GROUP BY membership_id
+        )""",
+        "membership_id",
+        params=fines.sql_params(),
+    )
+
 
 @router.get("/books")
-async def master_books():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM books WHERE type='Book' ORDER BY serial_no")
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return {"results": rows}
+async def master_books(
+    page: Page = Depends(),
+    status: str | None = None,
+    cache: CachedResponse = Depends(cached("books")),
+):
+    return await cache.respond(books_report(status).page, page)
 
 
 @router.get("/movies")
-async def master_movies():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM books WHERE type='Movie' ORDER BY serial_no")
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return {"results": rows}
+async def master_movies(
+    page: Page = Depends(),
+    status: str | None = None,
+    cache: CachedResponse = Depends(cached("books")),
+):
+    return await cache.respond(movies_report(status).page, page)
 
-@router.get("/product-details")
-async def get_product_details(current_user = Depends(get_current_user)):
-    conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "SELECT code_from, code_to, category FROM product_details ORDER BY id"
+
+@router.get("/books/lookup")
+async def books_by_serial(
+    serial: list[str] = Query(..., max_length=200),
+    current_user=Depends(require_authenticated),
+    cache: CachedResponse = Depends(cached("books")),
+):
+    """Books/Movies for a list of serial numbers (?serial=A&serial=B)."""
+    placeholders = ",".join("?" * len(serial))
+
+    def _lookup(conn):
+        rows = json_array(
+            conn,
+            f"SELECT * FROM books WHERE serial_no IN ({placeholders}) ORDER BY serial_no",
+            serial,
+            order_by="serial_no",
         )
-        rows = cur.fetchall()
-    finally:
-        conn.close()
-
-    return [
-        {
-            "code_from": row["code_from"],
-            "code_to": row["code_to"],
-            "category": row["category"],
-        }
-        for row in rows
-    ]
+        return json_object_body(results=rows)
+
+    return await cache.respond(db.read, _lookup)
+
+@router.get("/product-details")
+async def get_product_details(
+    current_user = Depends(get_current_user),
+    cache: CachedResponse = Depends(cached("product_details")),
+):
+    def _fetch(conn):
+        return json_array(
+            conn, "SELECT code_from, code_to, category, id AS _id FROM product_details",
+            order_by="_id",
+        ).encode("utf-8")
+
+    return await cache.respond(db.read, _fetch)
 
 
 @router.get("/members")
-async def master_memberships():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM members ORDER BY membership_id")
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return {"results": rows}
+async def master_memberships(
+    page: Page = Depends(),
+    current_user=Depends(require_admin),
+    cache: CachedResponse = Depends(cached("members")),
+):
+    """Admin only, like its export: members carry phone, address and aadhar."""
+    return await cache.respond(members_report().page, page)
 
 
 @router.get("/active-issues")
-async def active_issues():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM issues WHERE actual_return_date IS NULL")
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return {"results": rows}
+async def active_issues(
+    page: Page = Depends(),
+    membership_id: str | None = None,
+    cache: CachedResponse = Depends(cached("issues")),
+):
+    return await cache.respond(active_issues_report(membership_id).page, page)
 
 
 @router.get("/overdue")
-async def overdue_returns():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT * FROM issues WHERE actual_return_date IS NOT NULL AND actual_return_date > planned_return"
-    )
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return {"results": rows}
+async def overdue_returns(
+    page: Page = Depends(), cache: CachedResponse = Depends(cached("issues"))
+):
+    return await cache.respond(overdue_returns_report().page, page)
 
 
 @router.get("/requests")
-async def issue_requests():
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM issue_requests")
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return {"results": rows}
+async def issue_requests(
+    page: Page = Depends(), cache: CachedResponse = Depends(cached("issue_requests"))
+):
+    return await cache.respond(requests_report().page, page)
+
+
+@router.get("/overdue/current")
+async def currently_overdue(
+    page: Page = Depends(), cache: CachedResponse = Depends(cached("issues"))
+):
+    """
+    Copies that are out right now and past their planned return date,
+    most overdue first, with days late and the fine accrued so far.
+    """
+    return await cache.respond(currently_overdue_report().page, page)
+
+
+@router.get("/overdue/members")
+async def overdue_by_member(
+    page: Page = Depends(), cache: CachedResponse = Depends(cached("issues"))
+):
+    """Per-member totals of overdue copies and accrued fines."""
+    return await cache.respond(overdue_by_member_report().page, page)
+
+
+# ------------------ ANALYTICS ------------------ #
+#
+# Served from the rollup tables maintained by triggers on issues (see
+# app.rollups), so every query reads a few hundred rollup rows at most,
+# whatever the size of the issue history. Cached on the issues version.
+
+ANALYTICS_MAX_ROWS = 100
+
+
+def _month_param(month):
+    if month is None:
+        return date.today().isoformat()[:7]
+    try:
+        return date.fromisoformat(month + "-01").isoformat()[:7]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Month must be YYYY-MM")
+
+
+@router.get("/analytics/circulation")
+async def circulation_summary(
+    from_: date | None = Query(None, alias="from", description="First day (default: a year before `to`)"),
+    to: date | None = Query(None, description="Last day (default: today)"),
+    group: str = Query("month", pattern="^(day|month)$"),
+    category: str | None = None,
+    type: str | None = None,
+    current_user=Depends(require_authenticated),
+    cache: CachedResponse = Depends(cached("issues")),
+):
+    """
+    Issues, returns, late returns, fines charged and fines paid per
+    day or month x category x type, with totals for the whole range.
+    """
+    to = to or date.today()
+    from_ = from_ or to - timedelta(days=365)
+    if from_ > to:
+        raise HTTPException(status_code=400, detail="`from` must not be after `to`")
+
+    where, params = ["day BETWEEN :from AND :to"], {"from": from_.isoformat(), "to": to.isoformat()}
+    if category:
+        where.append("category = :category")
+        params["category"] = category
+    if type:
+        where.append("type = :type")
+        params["type"] = type
+    period = "day" if group == "day" else "substr(day, 1, 7)"
+    sums = (
+        "SUM(issues) AS issues, SUM(returns) AS returns, SUM(late_returns) AS late_returns, "
+        "SUM(fines_charged) AS fines_charged, SUM(fines_paid) AS fines_paid"
+    )
+    filters = " AND ".join(where)
+
+    def _fetch(conn):
+        rows = json_array(
+            conn,
+            f"SELECT {period} AS period, category, type, {sums} FROM circulation_daily "
+            f"WHERE {filters} GROUP BY 1, 2, 3",
+            params,
+            order_by="period, category, type",
+        )
+        totals = select_json(
+            conn, f"SELECT {sums} FROM circulation_daily WHERE {filters}", params
+        ).fetchone()[0]
+        return json_object_body(
+            results=rows, totals=RawJSON(totals), **{"from": from_.isoformat(), "to": to.isoformat()}
+        )
+
+    return await cache.respond(db.read, _fetch)
+
+
+@router.get("/analytics/top-titles")
+async def top_titles(
+    month: str | None = Query(None, description="YYYY-MM; all time if omitted"),
+    type: str | None = None,
+    limit: int = Query(20, ge=1, le=ANALYTICS_MAX_ROWS),
+    current_user=Depends(require_authenticated),
+    cache: CachedResponse = Depends(cached("issues")),
+):
+    """Most borrowed titles (all copies of a title together)."""
+    where, params = ["issues > 0"], {"limit": limit}
+    if month is not None:
+        table = "title_monthly"
+        where.append("month = :month")
+        params["month"] = _month_param(month)
+    else:
+        table = "title_totals"
+    if type:
+        where.append("type = :type")
+        params["type"] = type
+
+    def _fetch(conn):
+        return json_object_body(
+            month=params.get("month"),
+            results=json_array(
+                conn,
+                f"SELECT name, author, type, issues FROM {table} "
+                f"WHERE {' AND '.join(where)} ORDER BY issues DESC, name LIMIT :limit",
+                params,
+                order_by="issues DESC, name",
+            ),
+        )
+
+    return await cache.respond(db.read, _fetch)
+
+
+@router.get("/analytics/members")
+async def member_activity(
+    month: str | None = Query(None, description="YYYY-MM (default: this month)"),
+    limit: int = Query(20, ge=1, le=ANALYTICS_MAX_ROWS),
+    current_user=Depends(require_authenticated),
+    cache: CachedResponse = Depends(cached("issues", "members")),
+):
+    """Most active members of a month: issues, returns, late returns, fines."""
+    params = {"month": _month_param(month), "limit": limit}
+
+    def _fetch(conn):
+        return json_object_body(
+            month=params["month"],
+            results=json_array(
+                conn,
+                """
+                SELECT a.membership_id, m.first_name, m.last_name,
+                       a.issues, a.returns, a.late_returns, a.fines_charged
+                FROM member_monthly a
+                LEFT JOIN members m ON m.membership_id = a.membership_id
+                WHERE a.month = :month AND a.issues > 0
+                ORDER BY a.issues DESC, a.membership_id LIMIT :limit
+                """,
+                params,
+                order_by="issues DESC, membership_id",
+            ),
+        )
+
+    return await cache.respond(db.read, _fetch)
+
+
+@router.get("/analytics/members/{membership_id}")
+async def member_history(
+    membership_id: str,
+    current_user=Depends(require_authenticated),
+    cache: CachedResponse = Depends(cached("issues")),
+):
+    """One member's activity month by month."""
+
+    def _fetch(conn):
+        return json_object_body(
+            membership_id=membership_id,
+            results=json_array(
+                conn,
+                "SELECT month, issues, returns, late_returns, fines_charged "
+                "FROM member_monthly WHERE membership_id = ? ORDER BY month",
+                (membership_id,),
+                order_by="month",
+            ),
+        )
+
+    return await cache.respond(db.read, _fetch)
+
+
+# ------------------ EXPORTS ------------------ #
+#
+# /export/<report> streams a whole report as CSV or NDJSON. Rows are read
+# in keyset batches of EXPORT_BATCH_SIZE, each batch its own short read on
+# the read-only pool, and written out as they come: memory stays flat
+# whatever the table size, and a slow download never pins a pooled
+# connection or holds a WAL snapshot open.
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+EXPORTS = {
+    "books": lambda f: books_report(f.get("status")),
+    "movies": lambda f: movies_report(f.get("status")),
+    "members": lambda f: members_report(),
+    "active-issues": lambda f: active_issues_report(f.get("membership_id")),
+    "overdue": lambda f: overdue_returns_report(),
+    "overdue/current": lambda f: currently_overdue_report(),
+    "overdue/members": lambda f: overdue_by_member_report(),
+    "requests": lambda f: requests_report(),
+    "analytics/circulation": lambda f: ReportQuery(
+        "circulation_daily", ("day", "category", "type"), date_column="day"
+    ),
+}
+
+# members carry personal details: admin only, as GET /members is
+ADMIN_EXPORTS = {"members"}
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+
+def _report_columns(conn, report):
+    sql = f"SELECT {report.columns} FROM {report.table} LIMIT 0"
+    return [d[0] for d in conn.execute(sql, report.params).description]
+
+
+def _export_batch(conn, report, names, fmt, after):
+    """
+    One batch of rows after the keyset `after` (None: from the start),
+    rendered. Returns (bytes, last key or None when done).
+    """
+    keys = (report.key,) if isinstance(report.key, str) else tuple(report.key)
+    clauses, args = list(report.where), dict(report.params)
+    if after is not None:
+        placeholders = [f":after_{i}" for i in range(len(keys))]
+        clauses.append(f"({', '.join(keys)}) > ({', '.join(placeholders)})")
+        args.update({p[1:]: v for p, v in zip(placeholders, after)})
+    key_columns = [f"_key_{i}" for i in range(len(keys))]
+    inner = f"SELECT {report.columns}, " + ", ".join(
+        f"{k} AS {alias}" for k, alias in zip(keys, key_columns)
+    )
+    inner += f" FROM {report.table}"
+    if clauses:
+        inner += " WHERE " + " AND ".join(clauses)
+    inner += f" ORDER BY {', '.join(keys)} LIMIT :batch_size"
+    args["batch_size"] = EXPORT_BATCH_SIZE
+    order = ", ".join(key_columns)
+    selected = ", ".join('"' + n.replace('"', '""') + '"' for n in names)
+    sql = f"SELECT {selected}, {order} FROM ({inner})"
+
+    if fmt == "ndjson":
+        rows = select_json(conn, sql, args, extra=key_columns, order_by=order).fetchall()
+        text = "".join(row[0] + "\n" for row in rows)
+    else:
+        rows = conn.execute(sql + f" ORDER BY {order}", args).fetchall()
+        out = io.StringIO()
+        csv.writer(out).writerows(tuple(row)[: len(names)] for row in rows)
+        text = out.getvalue()
+    if len(rows) < EXPORT_BATCH_SIZE:
+        return text.encode("utf-8"), None
+    return text.encode("utf-8"), tuple(rows[-1])[-len(keys):]
+
+
+async def _stream_export(report, names, fmt):
+    if fmt == "csv":
+        out = io.StringIO()
+        csv.writer(out).writerow(names)
+        yield out.getvalue().encode("utf-8")
+    after = None
+    while True:
+        chunk, after = await db.read(_export_batch, report, names, fmt, after)
+        if chunk:
+            yield chunk
+        if after is None:
+            return
+
+
+@router.get("/export/{report:path}")
+async def export_report(
+    report: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    columns: str | None = Query(None, description="Comma-separated columns (default: all)"),
+    from_: date | None = Query(None, alias="from", description="Rows on or after this date"),
+    to: date | None = Query(None, description="Rows on or before this date"),
+    status: str | None = None,
+    membership_id: str | None = None,
+    current_user=Depends(require_authenticated),
+):
+    """
+    Download a whole report as CSV or NDJSON, streamed in batches. Reports
+    are named after their endpoints (books, overdue/current, ...). `from`
+    and `to` filter on the report's main date (procurement, start, issue
+    or request date). Needs a login; the members export is admin only.
+    """
+    build = EXPORTS.get(report)
+    if build is None:
+        raise HTTPException(
+            status_code=404, detail=f"Unknown report. Exportable: {', '.join(EXPORTS)}"
+        )
+    if report in ADMIN_EXPORTS and current_user["role"].lower() != "admin":
+        raise HTTPException(status_code=403, detail="Admin only. Access denied.")
+    query = build({"status": status, "membership_id": membership_id})
+
+    if from_ or to:
+        if query.date_column is None:
+            raise HTTPException(status_code=400, detail="This report has no date to filter on")
+        if from_:
+            query.where.append(f"{query.date_column} >= :export_from")
+            query.params["export_from"] = from_.isoformat()
+        if to:
+            query.where.append(f"{query.date_column} <= :export_to")
+            query.params["export_to"] = to.isoformat()
+
+    available = await db.read(_report_columns, query)
+    names = available
+    if columns:
+        names = [c.strip() for c in columns.split(",") if c.strip()]
+        unknown = [c for c in names if c not in available]
+        if unknown or not names:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown columns: {', '.join(unknown)}. Available: {', '.join(available)}",
+            )
+
+    filename = report.replace("/", "-") + "." + format
+    return StreamingResponse(
+        _stream_export(query, names, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Cache-Control": "no-store",
+        },
+    )
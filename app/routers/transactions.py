@@ -1,95 +1,294 @@
+import os
+import re
 from datetime import date, timedelta
-from fastapi import APIRouter, HTTPException, Query, Form, Depends
+from fastapi import APIRouter, HTTPException, Query, Form, Depends, Response
 from .auth import require_authenticated
-from ..db import get_connection
+from .. import db
+from ..fines import DAYS_LATE_SQL, fine_for_days
+from ..jsonrows import json_array, json_object_body
 
 router = APIRouter(
     tags=["transactions"],
     dependencies=[Depends(require_authenticated)],
 )
 
-DAILY_FINE = 10
+def _match_terms(text, column=None):
+    """
+    Turn free text into an FTS5 query: every word must match as a prefix.
+    Words are quoted so user input can never inject FTS syntax.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = " ".join('"' + w.replace('"', '""') + '"*' for w in words)
+    return f"{column} : ({terms})" if column else f"({terms})"
+
 
 @router.get("/availability")
-async def availability(book: str = Query("", alias="book"), author: str = Query("", alias="author")):
-    if not book and not author:
+async def availability(
+    book: str = Query("", alias="book"),
+    author: str = Query("", alias="author"),
+    q: str = Query("", description="Free text over name, author and category"),
+    type: str | None = Query(None, description="Book or Movie"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+):
+    """
+    Ranked (bm25) full-text search over available copies. Name matches
+    weigh more than author matches, author more than category.
+    """
+    if type is not None and type not in ("Book", "Movie"):
+        raise HTTPException(status_code=400, detail="Type must be Book or Movie")
+
+    # same semantics as the old LIKE search: name OR author
+    clauses = [
+        c for c in (
+            _match_terms(book, "name"),
+            _match_terms(author, "author"),
+            _match_terms(q),
+        ) if c
+    ]
+    if not clauses:
         raise HTTPException(status_code=400, detail="Enter book name or author")
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT * FROM books WHERE status='Available' AND (name LIKE ? OR author LIKE ?)",
-        (f"%{book}%", f"%{author}%"),
+
+    sql = (
+        "SELECT b.*, bm25(books_fts, 10.0, 5.0, 1.0) AS _rank "
+        "FROM books_fts f JOIN books b ON b.rowid = f.rowid "
+        "WHERE books_fts MATCH ? AND b.status='Available'"
     )
-    rows = [dict(r) for r in cur.fetchall()]
-    conn.close()
-    return {"results": rows}
+    params = [" OR ".join(clauses)]
+    if type:
+        sql += " AND b.type=?"
+        params.append(type)
+    sql += " ORDER BY _rank, b.serial_no LIMIT ? OFFSET ?"
+    params += [limit, offset]
 
+    def _search(conn):
+        rows = json_array(conn, sql, params, order_by="_rank, serial_no")
+        return json_object_body(results=rows, limit=limit, offset=offset)
 
-@router.post("/issue")
-async def issue_book(
-    serial_no: str = Form(...),
-    membership_id: str = Form(...),
-    issue_date: str = Form(...),
-    planned_return: str = Form(...),
-    remarks: str = Form(""),
-):
-    # date validations
-    today = date.today()
-    try:
-        issue_dt = date.fromisoformat(issue_date)
-        return_dt = date.fromisoformat(planned_return)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid date format")
+    return Response(await db.read(_search), media_type="application/json")
 
-    if issue_dt < today:
-        raise HTTPException(status_code=400, detail="Issue date cannot be earlier than today")
 
-    if return_dt > issue_dt + timedelta(days=15):
-        raise HTTPException(status_code=400, detail="Return date cannot be more than 15 days from issue date")
+@router.get("/member/{membership_id}/desk")
+async def member_desk_view(membership_id: str):
+    """
+    Everything the return desk needs for one member in a single query:
+    membership status, open issues with book details, and the fine
+    accrued so far on each (as of today).
+    """
+    def _fetch(conn):
+        return conn.execute(
+            f"""
+            SELECT
+              m.membership_id, m.first_name, m.last_name, m.status,
+              m.end_date, m.pending_fine,
+              i.issue_id, i.serial_no, i.issue_date, i.planned_return,
+              b.name AS book_name, b.author, b.type,
+              MAX(0, {DAYS_LATE_SQL}) AS days_late
+            FROM members m
+            LEFT JOIN issues i
+              ON i.membership_id = m.membership_id AND i.actual_return_date IS NULL
+            LEFT JOIN books b ON b.serial_no = i.serial_no
+            WHERE m.membership_id = :membership_id
+            ORDER BY i.planned_return, i.issue_id
+            """,
+            {"today": date.today().isoformat(), "membership_id": membership_id},
+        ).fetchall()
 
-    conn = get_connection()
-    cur = conn.cursor()
+    rows = await db.read(_fetch)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Member not found")
+
+    first = rows[0]
+    issues = [
+        {
+            "issue_id": r["issue_id"],
+            "membership_id": r["membership_id"],
+            "serial_no": r["serial_no"],
+            "book_name": r["book_name"],
+            "author": r["author"],
+            "type": r["type"],
+            "issue_date": r["issue_date"],
+            "planned_return": r["planned_return"],
+            "days_late": r["days_late"],
+            "accrued_fine": fine_for_days(r["days_late"]),
+        }
+        for r in rows
+        if r["issue_id"] is not None
+    ]
+    return {
+        "member": {
+            "membership_id": first["membership_id"],
+            "first_name": first["first_name"],
+            "last_name": first["last_name"],
+            "status": first["status"],
+            "end_date": first["end_date"],
+            "pending_fine": first["pending_fine"],
+        },
+        "issues": issues,
+        "total_accrued_fine": sum(i["accrued_fine"] for i in issues),
+    }
 
-    # book exists & available
+
+# Most copies a single batch checkout/return request may carry.
+BATCH_MAX_ITEMS = 50
+
+
+def _claim_copy(cur, serial_no, membership_id):
+    """
+    Mark a copy Issued if it exists and is still Available, or if it was
+    set aside for a hold of this member (the hold is then Collected).
+    """
+    cur.execute(
+        "UPDATE books SET status='Issued' WHERE serial_no=? AND status='Available'",
+        (serial_no,),
+    )
+    if cur.rowcount == 1:
+        return
+    cur.execute(
+        "UPDATE issue_requests SET status='Collected' "
+        "WHERE serial_no=? AND status='Fulfilled' AND membership_id=?",
+        (serial_no, membership_id),
+    )
+    if cur.rowcount == 1:
+        cur.execute(
+            "UPDATE books SET status='Issued' WHERE serial_no=? AND status='Reserved'",
+            (serial_no,),
+        )
+        if cur.rowcount == 1:
+            return
+        # the hold points at a copy no longer set aside (edited by hand):
+        # the raise rolls the Collected hold back with the write
+        raise HTTPException(status_code=409, detail="Book not available")
     cur.execute("SELECT status FROM books WHERE serial_no=?", (serial_no,))
     book = cur.fetchone()
     if not book:
-        conn.close()
         raise HTTPException(status_code=404, detail="Book not found")
-    if book["status"] != "Available":
-        conn.close()
-        raise HTTPException(status_code=400, detail="Book not available")
+    if book["status"] == "Reserved":
+        raise HTTPException(status_code=400, detail="Book reserved for another member")
+    raise HTTPException(status_code=400, detail="Book not available")
 
-    # member exists & active
+
+def _check_member(cur, membership_id):
+    """Member exists & is active."""
     cur.execute("SELECT status FROM members WHERE membership_id=?", (membership_id,))
     member = cur.fetchone()
     if not member:
-        conn.close()
         raise HTTPException(status_code=404, detail="Member not found")
     if member["status"] != "Active":
-        conn.close()
         raise HTTPException(status_code=400, detail="Membership inactive")
 
-    # insert issue and update book status
-    try:
-        cur.execute(
-            "INSERT INTO issues(serial_no,membership_id,issue_date,planned_return,actual_return_date,fine_amount,fine_paid) "
-            "VALUES (?,?,?,?,NULL,0,0)",
-            (serial_no, membership_id, issue_date, planned_return),
-        )
-        cur.execute(
-            "UPDATE books SET status='Issued' WHERE serial_no=?", (serial_no,)
+
+def _insert_issue(cur, serial_no, membership_id, issue_date, planned_return, remarks):
+    cur.execute(
+        "INSERT INTO issues(serial_no,membership_id,issue_date,planned_return,actual_return_date,fine_amount,fine_paid,remarks) "
+        "VALUES (?,?,?,?,NULL,0,0,?)",
+        (serial_no, membership_id, issue_date, planned_return, remarks or None),
+    )
+    return cur.lastrowid
+
+
+def issue_copy(conn, serial_no, membership_id, issue_date, planned_return, remarks=""):
+    """
+    Issue one copy. Runs inside a write transaction (db.run_write): the
+    conditional UPDATE claims the copy only if it is still Available, so
+    two desks can never issue the same copy.
+    """
+    cur = conn.cursor()
+    _claim_copy(cur, serial_no, membership_id)
+    # a failure here rolls the claim back
+    _check_member(cur, membership_id)
+    return _insert_issue(cur, serial_no, membership_id, issue_date, planned_return, remarks)
+
+
+def _batch_failed(message, items):
+    # the whole batch is rolled back; items say which entries caused it
+    raise HTTPException(status_code=400, detail={"message": message, "items": items})
+
+
+def issue_copies(conn, serials, membership_id, issue_date, planned_return, remarks=""):
+    """
+    Issue several copies to one member, all or nothing. Runs inside one
+    write transaction: the member is checked once, then every copy is
+    claimed; if any claim fails nothing is issued and the per-copy
+    results are reported. Returns the per-copy results with issue ids.
+    """
+    cur = conn.cursor()
+    _check_member(cur, membership_id)
+
+    items, failed = [], False
+    for serial_no in serials:
+        try:
+            _claim_copy(cur, serial_no, membership_id)
+        except HTTPException as e:
+            items.append({"serial_no": serial_no, "ok": False, "detail": e.detail})
+            failed = True
+        else:
+            items.append({"serial_no": serial_no, "ok": True})
+    if failed:
+        _batch_failed("No copies issued", items)
+
+    for item in items:
+        item["issue_id"] = _insert_issue(
+            cur, item["serial_no"], membership_id, issue_date, planned_return, remarks
         )
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    return items
+
+
+def _validate_issue_dates(issue_date, planned_return):
+    today = date.today()
+    try:
+        issue_dt = date.fromisoformat(issue_date)
+        return_dt = date.fromisoformat(planned_return)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+
+    if issue_dt < today:
+        raise HTTPException(status_code=400, detail="Issue date cannot be earlier than today")
+
+    if return_dt > issue_dt + timedelta(days=15):
+        raise HTTPException(status_code=400, detail="Return date cannot be more than 15 days from issue date")
+
+
+@router.post("/issue")
+async def issue_book(
+    serial_no: str = Form(...),
+    membership_id: str = Form(...),
+    issue_date: str = Form(...),
+    planned_return: str = Form(...),
+    remarks: str = Form(""),
+):
+    _validate_issue_dates(issue_date, planned_return)
+
+    await db.run_write(issue_copy, serial_no, membership_id, issue_date, planned_return, remarks)
 
     return {"message": "Book issued successfully"}
 
 
+@router.post("/issue/batch")
+async def issue_books(
+    serial_no: list[str] = Form(..., description="Repeat for every copy"),
+    membership_id: str = Form(...),
+    issue_date: str = Form(...),
+    planned_return: str = Form(...),
+    remarks: str = Form(""),
+):
+    """
+    Check out several copies to one member in a single transaction.
+    Either every copy is issued or none is; on failure `detail.items`
+    says which copies were the problem.
+    """
+    if len(serial_no) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} copies per batch")
+    _validate_issue_dates(issue_date, planned_return)
+
+    items = await db.run_write(
+        issue_copies, serial_no, membership_id, issue_date, planned_return, remarks
+    )
+    return {"message": f"{len(items)} copies issued", "items": items}
+
+
 @router.post("/return")
 async def start_return(
     serial_no: str = Form(...),
@@ -102,24 +301,24 @@ async def start_return(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format")
 
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT * FROM issues WHERE serial_no=? AND membership_id=? AND actual_return_date IS NULL",
-        (serial_no, membership_id),
-    )
-    issue = cur.fetchone()
-    if not issue:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Active issue not found for this book and member")
+    def _start(conn):
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT * FROM issues WHERE serial_no=? AND membership_id=? AND actual_return_date IS NULL",
+            (serial_no, membership_id),
+        )
+        issue = cur.fetchone()
+        if not issue:
+            raise HTTPException(status_code=404, detail="Active issue not found for this book and member")
 
-    cur.execute(
-        "UPDATE issues SET planned_return=? WHERE issue_id=?",
-        (planned_return, issue["issue_id"]),
-    )
-    conn.commit()
-    conn.close()
-    return {"message": "Return initiated", "issue_id": issue["issue_id"]}
+        cur.execute(
+            "UPDATE issues SET planned_return=? WHERE issue_id=?",
+            (planned_return, issue["issue_id"]),
+        )
+        return issue["issue_id"]
+
+    issue_id = await db.run_write(_start)
+    return {"message": "Return initiated", "issue_id": issue_id}
 
 @router.post("/return/start")
 async def start_return(
@@ -134,55 +333,42 @@ async def start_return(
     - Optionally update planned return date
     - Return book + issue details to drive Pay Fine screen
     """
-    conn = get_connection()
-    cur = conn.cursor()
+    def _start(conn):
+        cur = conn.cursor()
 
-    # NOTE: issue_id and planned_return are the real column names in your DB
-    cur.execute(
-        """
-        SELECT 
-          i.issue_id        AS issue_id,
-          i.membership_id   AS membership_id,
-          i.serial_no       AS serial_no,
-          i.issue_date      AS issue_date,
-          i.planned_return  AS planned_return,
-          b.name            AS book_name,
-          b.author          AS author
-        FROM issues i
-        JOIN books b ON b.serial_no = i.serial_no
-        WHERE i.membership_id = ?
-          AND i.serial_no = ?
-          AND i.actual_return_date IS NULL
-        """,
-        (membership_id, serial_no),
-    )
-    row = cur.fetchone()
-
-    if not row:
-        conn.close()
-        raise HTTPException(
-            status_code=404,
-            detail="No active issue found for this membership and serial number"
+        # NOTE: issue_id and planned_return are the real column names in your DB
+        cur.execute(
+            """
+            SELECT 
+              i.issue_id        AS issue_id,
+              i.membership_id   AS membership_id,
+              i.serial_no       AS serial_no,
+              i.issue_date      AS issue_date,
+              i.planned_return  AS planned_return,
+              b.name            AS book_name,
+              b.author          AS author
+            FROM issues i
+            JOIN books b ON b.serial_no = i.serial_no
+            WHERE i.membership_id = ?
+              AND i.serial_no = ?
+              AND i.actual_return_date IS NULL
+            """,
+            (membership_id, serial_no),
         )
+        row = cur.fetchone()
 
-    # Use existing planned_return if user didn't change Return Date
-    effective_return = return_date or row["planned_return"]
-
-    planned_dt = date.fromisoformat(row["planned_return"])
-    today = date.today()
-    late_days = (today - planned_dt).days
-    if late_days > 0:
-        fine_amount = late_days * DAILY_FINE
-    else:
-        fine_amount = 0
+        if not row:
+            raise HTTPException(
+                status_code=404,
+                detail="No active issue found for this membership and serial number"
+            )
 
-    # If user changed return_date on the Return Book screen,
-    # update planned_return in DB so /fine uses this new value.
-    try:
+        # If user changed return_date on the Return Book screen,
+        # update planned_return in DB so /fine uses this new value.
         if return_date:
             cur.execute(
                 "UPDATE issues SET planned_return = ? WHERE issue_id = ?",
-                (effective_return, row["issue_id"]),
+                (return_date, row["issue_id"]),
             )
         elif remarks:
             cur.execute(
@@ -190,9 +376,16 @@ async def start_return(
                 (remarks, row["issue_id"]),
             )
 
-        conn.commit()
-    finally:
-        conn.close()
+        return dict(row)
+
+    row = await db.run_write(_start)
+
+    # Use existing planned_return if user didn't change Return Date
+    effective_return = return_date or row["planned_return"]
+
+    planned_dt = date.fromisoformat(row["planned_return"])
+    today = date.today()
+    fine_amount = fine_for_days((today - planned_dt).days)
 
     # This dict shape matches what your JS expects
     return {
@@ -207,74 +400,307 @@ async def start_return(
     }
 
 
-@router.post("/fine")
-async def complete_return(
-    issue_id: int = Form(...),
-    actual_return_date: str = Form(...),
-    fine_paid: bool = Form(False),
-):
-    # Parse date
-    try:
-        actual_dt = date.fromisoformat(actual_return_date)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid date format")
-
-    conn = get_connection()
+def return_copy(conn, issue_id, actual_dt, fine_paid, membership_id=None):
+    """
+    Close an issue and free its copy. Runs inside a write transaction; the
+    conditional UPDATE makes a second return of the same issue a no-op
+    error instead of a double return. With `membership_id`, the issue
+    must belong to that member. The copy goes to the first waiting hold
+    on its title, if any. Returns the fine charged and the hold fulfilled
+    (or None).
+    """
     cur = conn.cursor()
 
     # Load issue
     cur.execute("SELECT * FROM issues WHERE issue_id=?", (issue_id,))
     issue = cur.fetchone()
     if not issue:
-        conn.close()
         raise HTTPException(status_code=404, detail="Issue not found")
+    if membership_id is not None and issue["membership_id"] != membership_id:
+        raise HTTPException(status_code=400, detail="Issue belongs to another member")
+    if issue["actual_return_date"] is not None:
+        raise HTTPException(status_code=400, detail="Issue already returned")
 
     planned_dt = date.fromisoformat(issue["planned_return"])
     days_late = (actual_dt - planned_dt).days
 
     # Calculate fine (Rs 10 per late day)
-    fine = 0
-    if days_late > 0:
-        fine = days_late * 10
+    fine = fine_for_days(days_late)
 
     # Enforce "Fine Paid" rule
     if fine > 0 and not fine_paid:
-        conn.close()
         raise HTTPException(
             status_code=400,
             detail="Fine pending, please mark Fine Paid"
         )
 
+    # Update issue record
+    cur.execute(
+        """
+        UPDATE issues
+        SET actual_return_date = ?, 
+            fine_amount = ?, 
+            fine_paid = ?
+        WHERE issue_id = ? AND actual_return_date IS NULL
+        """,
+        (
+            actual_dt.isoformat(),
+            fine,
+            1 if fine_paid and fine > 0 else 0,
+            issue_id,
+        ),
+    )
+    if cur.rowcount == 0:
+        raise HTTPException(status_code=400, detail="Issue already returned")
+
+    # Back on the shelf, or set aside for the next hold in the same transaction
+    hold = release_copy(cur, issue["serial_no"], actual_dt)
+    return fine, hold
+
+
+@router.post("/fine")
+async def complete_return(
+    issue_id: int = Form(...),
+    actual_return_date: str = Form(...),
+    fine_paid: bool = Form(False),
+):
+    # Parse date
     try:
-        # Update issue record
-        cur.execute(
-            """
-            UPDATE issues
-            SET actual_return_date = ?, 
-                fine_amount = ?, 
-                fine_paid = ?
-            WHERE issue_id = ?
-            """,
-            (
-                actual_return_date,
-                fine,
-                1 if fine_paid and fine > 0 else 0,
-                issue_id,
-            ),
+        actual_dt = date.fromisoformat(actual_return_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+
+    fine, hold = await db.run_write(return_copy, issue_id, actual_dt, fine_paid)
+
+    if hold:
+        return {"message": "Return completed, copy reserved for a hold", "fine": fine, "hold": hold}
+    return {"message": "Return completed", "fine": fine}
+
+
+def return_copies(conn, issue_ids, membership_id, actual_dt, fine_paid):
+    """
+    Return several of one member's issues, all or nothing, inside one
+    write transaction. `fine_paid` covers the combined fine. Returns the
+    per-issue results and the total fine.
+    """
+    # expired or removed members still have to be able to return copies
+    cur = conn.execute("SELECT 1 FROM members WHERE membership_id=?", (membership_id,))
+    if not cur.fetchone():
+        raise HTTPException(status_code=404, detail="Member not found")
+
+    items, failed, total = [], False, 0
+    for issue_id in issue_ids:
+        try:
+            # the combined fine is checked below, so charge without the rule
+            fine, hold = return_copy(conn, issue_id, actual_dt, True, membership_id)
+        except HTTPException as e:
+            items.append({"issue_id": issue_id, "ok": False, "detail": e.detail})
+            failed = True
+        else:
+            items.append({"issue_id": issue_id, "ok": True, "fine": fine, "hold": hold})
+            total += fine
+    if failed:
+        _batch_failed("No copies returned", items)
+    if total > 0 and not fine_paid:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": "Fine pending, please mark Fine Paid", "total_fine": total},
         )
+    return items, total
 
-        # Mark book as available again
-        cur.execute(
-            "UPDATE books SET status = 'Available' WHERE serial_no = ?",
-            (issue["serial_no"],),
+
+@router.post("/fine/batch")
+async def complete_returns(
+    issue_id: list[int] = Form(..., description="Repeat for every issue"),
+    membership_id: str = Form(...),
+    actual_return_date: str = Form(...),
+    fine_paid: bool = Form(False),
+):
+    """
+    Return several copies of one member in a single transaction, with
+    one combined fine. Either every copy is returned or none is.
+    """
+    if len(issue_id) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} copies per batch")
+    try:
+        actual_dt = date.fromisoformat(actual_return_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format")
+
+    items, total = await db.run_write(
+        return_copies, issue_id, membership_id, actual_dt, fine_paid
+    )
+    return {"message": f"{len(items)} copies returned", "items": items, "fine": total}
+
+
+# ------------------ HOLDS ------------------ #
+#
+# issue_requests doubles as the hold queue. A hold is Waiting until a copy
+# of its title comes back, then Fulfilled (the copy is set aside as
+# Reserved, serial_no says which), then Collected when that copy is
+# issued to the member -- or Cancelled. Waiting holds queue per title in
+# request_id order; a partial index on (book_name, request_id) makes the
+# head of any queue a single index lookup, however many holds there are.
+# Holds of members who are no longer active are passed over. A copy left
+# uncollected for HOLD_PICKUP_DAYS is released by the expire_holds job
+# (see scheduler.py). The unary + keeps the members status index out of
+# the plan, so the queue index still drives the lookup.
+
+HOLD_PICKUP_DAYS = int(os.getenv("HOLD_PICKUP_DAYS", "7"))
+
+HOLD_QUEUE_HEAD_SQL = """
+    SELECT r.request_id, r.membership_id, r.book_name
+    FROM books b
+    JOIN issue_requests r ON r.book_name = b.name AND r.status = 'Waiting'
+    JOIN members m ON m.membership_id = r.membership_id
+        AND +m.status = 'Active' AND +m.end_date >= :today
+    WHERE b.serial_no = :serial_no
+    ORDER BY r.request_id
+    LIMIT 1
+"""
+
+HOLD_POSITION_SQL = """
+    SELECT COUNT(*) FROM issue_requests
+    WHERE book_name = ? AND status = 'Waiting' AND request_id <= ?
+"""
+
+
+def release_copy(cur, serial_no, on_date):
+    """
+    Free a copy coming back from an issue (or a cancelled hold): reserve
+    it for the first waiting hold on its title, or make it Available.
+    Returns the hold fulfilled, or None.
+    """
+    cur.execute(HOLD_QUEUE_HEAD_SQL, {"serial_no": serial_no, "today": on_date.isoformat()})
+    head = cur.fetchone()
+    cur.execute(
+        "UPDATE books SET status = ? WHERE serial_no = ? AND status IN ('Issued', 'Reserved')",
+        ("Reserved" if head else "Available", serial_no),
+    )
+    if head is None or cur.rowcount == 0:
+        return None
+    cur.execute(
+        "UPDATE issue_requests SET status = 'Fulfilled', fulfilled_date = ?, serial_no = ? "
+        "WHERE request_id = ?",
+        (on_date.isoformat(), serial_no, head["request_id"]),
+    )
+    return {
+        "request_id": head["request_id"],
+        "membership_id": head["membership_id"],
+        "book_name": head["book_name"],
+        "serial_no": serial_no,
+    }
+
+
+def add_hold(conn, membership_id, book_name, on_date):
+    """
+    Queue a hold on a title for an active member. Only titles with no
+    copy on the shelf can be held, and a member holds a title once.
+    Returns the request id and the position in the title's queue.
+    """
+    cur = conn.cursor()
+    _check_member(cur, membership_id)
+
+    cur.execute(
+        "SELECT COUNT(*) AS copies, COALESCE(SUM(status = 'Available'), 0) AS available "
+        "FROM books WHERE name = ?",
+        (book_name,),
+    )
+    title = cur.fetchone()
+    if title["copies"] == 0:
+        raise HTTPException(status_code=404, detail="Title not found")
+    if title["available"]:
+        raise HTTPException(status_code=400, detail="A copy is available, issue it instead")
+
+    cur.execute(
+        "SELECT 1 FROM issue_requests WHERE book_name = ? AND membership_id = ? AND status = 'Waiting'",
+        (book_name, membership_id),
+    )
+    if cur.fetchone():
+        raise HTTPException(status_code=400, detail="Member already holds this title")
+
+    cur.execute(
+        "INSERT INTO issue_requests(membership_id, book_name, requested_date, status) "
+        "VALUES (?, ?, ?, 'Waiting')",
+        (membership_id, book_name, on_date.isoformat()),
+    )
+    request_id = cur.lastrowid
+    cur.execute(HOLD_POSITION_SQL, (book_name, request_id))
+    return request_id, cur.fetchone()[0]
+
+
+def cancel_hold(conn, request_id, on_date):
+    """
+    Cancel a waiting or fulfilled hold. A copy set aside for it passes to
+    the next hold on the title, or back to the shelf. Returns the hold
+    that copy went to, or None.
+    """
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT status, serial_no FROM issue_requests WHERE request_id = ?", (request_id,)
+    )
+    hold = cur.fetchone()
+    if not hold:
+        raise HTTPException(status_code=404, detail="Hold not found")
+    if hold["status"] not in ("Waiting", "Fulfilled"):
+        raise HTTPException(status_code=400, detail=f"Hold already {hold['status'].lower()}")
+
+    cur.execute("UPDATE issue_requests SET status = 'Cancelled' WHERE request_id = ?", (request_id,))
+    if hold["status"] == "Fulfilled":
+        return release_copy(cur, hold["serial_no"], on_date)
+    return None
+
+
+@router.post("/holds")
+async def place_hold(
+    membership_id: str = Form(...),
+    book_name: str = Form(...),
+):
+    """
+    Reserve a title with no copy on the shelf. The next copy returned
+    goes to the first hold in the title's queue.
+    """
+    request_id, position = await db.run_write(add_hold, membership_id, book_name, date.today())
+    return {"message": "Hold placed", "request_id": request_id, "position": position}
+
+
+@router.get("/holds")
+async def list_holds(
+    membership_id: str | None = Query(None, description="A member's open holds"),
+    book_name: str | None = Query(None, description="A title's waiting queue, in order"),
+):
+    if bool(membership_id) == bool(book_name):
+        raise HTTPException(status_code=400, detail="Give either membership_id or book_name")
+
+    position = (
+        "CASE WHEN r.status = 'Waiting' THEN ("
+        " SELECT COUNT(*) FROM issue_requests q WHERE q.book_name = r.book_name"
+        " AND q.status = 'Waiting' AND q.request_id <= r.request_id) END AS position"
+    )
+    columns = "r.request_id, r.membership_id, r.book_name, r.requested_date, r.status, r.serial_no, r.fulfilled_date"
+    if membership_id:
+        sql = (
+            f"SELECT {columns}, {position} FROM issue_requests r "
+            "WHERE r.membership_id = ? AND r.status IN ('Waiting', 'Fulfilled')"
         )
+        params = (membership_id,)
+    else:
+        sql = (
+            f"SELECT {columns}, {position} FROM issue_requests r "
+            "WHERE r.book_name = ? AND r.status = 'Waiting'"
+        )
+        params = (book_name,)
+    sql += " ORDER BY r.request_id"
 
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        conn.close()
+    def _list(conn):
+        return json_object_body(results=json_array(conn, sql, params, order_by="request_id"))
+
+    return Response(await db.read(_list), media_type="application/json")
 
-    return {"message": "Return completed", "fine": fine}
 
+@router.post("/holds/{request_id}/cancel")
+async def withdraw_hold(request_id: int):
+    hold = await db.run_write(cancel_hold, request_id, date.today())
+    if hold:
+        return {"message": "Hold cancelled, copy passed to the next hold", "hold": hold}
+    return {"message": "Hold cancelled"}
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from . import db, fines
+from .routers.transactions import HOLD_PICKUP_DAYS, cancel_hold
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "30"))
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "90"))
+SCHEDULER_CHUNK_SIZE = int(os.getenv("SCHEDULER_CHUNK_SIZE", "500"))
+SCHEDULER_CHUNK_PAUSE_MS = float(os.getenv("SCHEDULER_CHUNK_PAUSE_MS", "10"))
+JOB_HISTORY_DAYS = int(os.getenv("JOB_HISTORY_DAYS", "30"))
+
+LEASE_NAME = "scheduler"
+
+# identifies this worker process in the lease row and the job history
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseLost(Exception):
+    """Another worker took over the scheduler lease mid-job."""
+
+
+# ------------------ JOBS ------------------ #
+#
+# A job is a chunk function `step(conn, today, cursor)` that does one
+# bounded batch of work and returns (rows_affected, next_cursor); the job
+# is finished when next_cursor is None. The first call gets cursor "".
+# Every chunk is its own short write transaction, so the issue desk only
+# ever waits for one batch, never for a whole job.
+
+def expire_memberships(conn, today, cursor):
+    """Mark Active members whose end_date has passed as Expired."""
+    cur = conn.execute(
+        """
+        UPDATE members SET status='Expired'
+        WHERE membership_id IN (
+            SELECT membership_id FROM members
+            WHERE status='Active' AND end_date < :today
+            LIMIT :chunk
+        )
+        """,
+        {"today": today.isoformat(), "chunk": SCHEDULER_CHUNK_SIZE},
+    )
+    # updated rows drop out of the subquery, so just go again while full
+    return cur.rowcount, ("" if cur.rowcount == SCHEDULER_CHUNK_SIZE else None)
+
+
+def accrue_fines(conn, today, cursor):
+    """Refresh pending_fine for the next chunk of members, in id order."""
+    row = conn.execute(
+        "SELECT membership_id FROM members WHERE membership_id > ? "
+        "ORDER BY membership_id LIMIT 1 OFFSET ?",
+        (cursor, SCHEDULER_CHUNK_SIZE - 1),
+    ).fetchone()
+    upto = row["membership_id"] if row else None
+    updated = fines.refresh_pending_fines(conn, today, after=cursor, upto=upto)
+    return updated, upto
+
+
+def expire_holds(conn, today, cursor):
+    """
+    Cancel Fulfilled holds not collected within HOLD_PICKUP_DAYS, or whose
+    member is no longer active; each copy passes to the next hold on its
+    title, or back to the shelf.
+    """
+    rows = conn.execute(
+        """
+        SELECT r.request_id FROM issue_requests r
+        JOIN members m ON m.membership_id = r.membership_id
+        WHERE r.status = 'Fulfilled'
+          AND (r.fulfilled_date < :cutoff OR m.status != 'Active' OR m.end_date < :today)
+        LIMIT :chunk
+        """,
+        {
+            "cutoff": (today - timedelta(days=HOLD_PICKUP_DAYS)).isoformat(),
+            "today": today.isoformat(),
+            "chunk": SCHEDULER_CHUNK_SIZE,
+        },
+    ).fetchall()
+    # holds the copies pass to are fulfilled today for active members,
+    # so they never match again
+    for row in rows:
+        cancel_hold(conn, row["request_id"], today)
+    return len(rows), ("" if len(rows) == SCHEDULER_CHUNK_SIZE else None)
+
+
+def purge_job_history(conn, today, cursor):
+    """Delete job_runs rows older than JOB_HISTORY_DAYS."""
+    cutoff = (today - timedelta(days=JOB_HISTORY_DAYS)).isoformat()
+    cur = conn.execute(
+        """
+        DELETE FROM job_runs WHERE run_id IN (
+            SELECT run_id FROM job_runs WHERE started_at < :cutoff LIMIT :chunk
+        )
+        """,
+        {"cutoff": cutoff, "chunk": SCHEDULER_CHUNK_SIZE},
+    )
+    return cur.rowcount, ("" if cur.rowcount == SCHEDULER_CHUNK_SIZE else None)
+
+
+# name -> (step, seconds between successful runs)
+JOBS = {
+    "expire_memberships": (
+        expire_memberships,
+        float(os.getenv("JOB_EXPIRE_MEMBERSHIPS_SECONDS", "3600")),
+    ),
+    "accrue_fines": (
+        accrue_fines,
+        float(os.getenv("JOB_ACCRUE_FINES_SECONDS", "86400")),
+    ),
+    "expire_holds": (
+        expire_holds,
+        float(os.getenv("JOB_EXPIRE_HOLDS_SECONDS", "3600")),
+    ),
+    "purge_job_history": (
+        purge_job_history,
+        float(os.getenv("JOB_PURGE_HISTORY_SECONDS", "86400")),
+    ),
+}
+
+
+# ------------------ LEASE ------------------ #
+#
+# One row in scheduler_lease names the current leader and when its lease
+# runs out. A worker takes the lease if it is free, expired or already
+# its own; the leader renews it every tick and inside every job chunk.
+
+def claim_lease(conn, owner=OWNER):
+    """Take or renew the lease. Call inside a write transaction."""
+    now = time.time()
+    row = conn.execute(
+        """
+        INSERT INTO scheduler_lease(name, owner, expires_at)
+        VALUES (:name, :owner, :expires_at)
+        ON CONFLICT(name) DO UPDATE
+            SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE scheduler_lease.owner = excluded.owner
+               OR scheduler_lease.expires_at < :now
+        RETURNING owner
+        """,
+        {
+            "name": LEASE_NAME,
+            "owner": owner,
+            "expires_at": now + SCHEDULER_LEASE_SECONDS,
+            "now": now,
+        },
+    ).fetchone()
+    return row is not None
+
+
+def release_lease(conn, owner=OWNER):
+    conn.execute(
+        "DELETE FROM scheduler_lease WHERE name=? AND owner=?", (LEASE_NAME, owner)
+    )
+
+
+# ------------------ RUNNING ------------------ #
+
+def _utcnow():
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def _start_run(conn, job):
+    cur = conn.execute(
+        "INSERT INTO job_runs(job, owner, started_at, status) VALUES (?, ?, ?, 'running')",
+        (job, OWNER, _utcnow()),
+    )
+    return cur.lastrowid
+
+
+def _finish_run(conn, run_id, duration_ms, rows, error):
+    conn.execute(
+        """
+        UPDATE job_runs
+        SET finished_at=?, duration_ms=?, rows_affected=?, status=?, error=?
+        WHERE run_id=?
+        """,
+        (
+            _utcnow(),
+            round(duration_ms, 3),
+            rows,
+            "failed" if error else "ok",
+            error,
+            run_id,
+        ),
+    )
+
+
+def _chunk(conn, step, today, cursor, hold_lease):
+    if hold_lease and not claim_lease(conn):
+        raise LeaseLost(LEASE_NAME)
+    return step(conn, today, cursor)
+
+
+async def run_job(name, hold_lease=False):
+    """
+    Run job `name` to completion, one chunk transaction at a time, and
+    record it in job_runs. With hold_lease, every chunk renews the
+    scheduler lease and the job stops if the lease was lost.
+    Returns the job_runs row.
+    """
+    step, _ = JOBS[name]
+    today = date.today()
+    run_id = await db.run_write(_start_run, name)
+    started = time.perf_counter()
+    rows, cursor, error = 0, "", None
+    try:
+        while cursor is not None:
+            done, cursor = await db.run_write(_chunk, step, today, cursor, hold_lease)
+            rows += done
+            if cursor is not None:
+                # let queued requests at the write lock in between chunks
+                await asyncio.sleep(SCHEDULER_CHUNK_PAUSE_MS / 1000)
+    except asyncio.CancelledError:
+        error = "cancelled"
+        raise
+    except LeaseLost:
+        error = "lease lost"
+        raise
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        logger.exception("Job %s failed", name)
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        await asyncio.shield(db.run_write(_finish_run, run_id, duration_ms, rows, error))
+    return await db.fetch_one("SELECT * FROM job_runs WHERE run_id=?", (run_id,))
+
+
+def _due_jobs(conn):
+    now = datetime.now(timezone.utc)
+    due = []
+    for name, (_, interval) in JOBS.items():
+        row = conn.execute(
+            "SELECT MAX(started_at) AS last FROM job_runs WHERE job=? AND status='ok'",
+            (name,),
+        ).fetchone()
+        last = row["last"]
+        if last is None or now - datetime.fromisoformat(last) >= timedelta(seconds=interval):
+            due.append(name)
+    return due
+
+
+class Scheduler:
+    """
+    Background loop started from the app lifespan. Every worker runs one;
+    only the lease holder runs jobs, the others just keep trying to
+    take the lease in case the leader goes away.
+    """
+
+    def __init__(self):
+        self._task = None
+
+    def start(self):
+        if SCHEDULER_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._loop(), name="scheduler")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await db.run_write(release_lease)
+
+    async def _loop(self):
+        while True:
+            try:
+                if await db.run_write(claim_lease):
+                    for name in await db.read(_due_jobs):
+                        await run_job(name, hold_lease=True)
+            except asyncio.CancelledError:
+                raise
+            except LeaseLost:
+                logger.warning("Scheduler lease taken over by another worker")
+            except Exception:
+                logger.exception("Scheduler tick failed")
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+
+
+scheduler = Scheduler()
@@ -39,6 +39,8 @@ function showAdminMenus() {
   if (reports) reports.classList.remove("hidden");
   const openMaintBtn = document.getElementById("openMaintenanceBtn");
   if (openMaintBtn) openMaintBtn.style.display = "inline-block";
+  const membersBtn = document.getElementById("membersReportBtn");
+  if (membersBtn) membersBtn.style.display = "";
 }
 
 function hideAdminMenus() {
@@ -49,6 +51,9 @@ function hideAdminMenus() {
   if (reports) reports.classList.remove("hidden"); // user can view reports
   const openMaintBtn = document.getElementById("openMaintenanceBtn");
   if (openMaintBtn) openMaintBtn.style.display = "none";
+  // the member list (phone, address, aadhar) is admin only
+  const membersBtn = document.getElementById("membersReportBtn");
+  if (membersBtn) membersBtn.style.display = "none";
 }
 
 async function apiFetch(url, options = {}) {
@@ -119,6 +124,7 @@ function initLoginForm() {
       if (logoutBtn) logoutBtn.disabled = false;
 
       await checkAuthStatus();
+      loadProductDetails();
     } catch (err) {
       console.error("Login error", err);
       if (errDiv) errDiv.textContent = "Error contacting server";
@@ -280,6 +286,18 @@ const reportConfig = {
       { key: "fine_amount", label: "Fine Calculations" },
     ],
   },
+  "overdue-current": {
+    url: "/api/reports/overdue/current",
+    title: "Currently Overdue",
+    columns: [
+      { key: "serial_no", label: "Serial No Book/Movie" },
+      { key: "membership_id", label: "Membership Id" },
+      { key: "issue_date", label: "Date of Issue" },
+      { key: "planned_return", label: "Date of Planned Return" },
+      { key: "days_late", label: "Days Late" },
+      { key: "accrued_fine", label: "Fine Accrued" },
+    ],
+  },
   requests: {
     url: "/api/reports/requests",
     title: "Issue Requests",
@@ -288,6 +306,7 @@ const reportConfig = {
       { key: "book_name", label: "Name of Book/Movie" },
       { key: "requested_date", label: "Requested Date" },
       { key: "fulfilled_date", label: "Request Fulfilled Date" },
+      { key: "status", label: "Status" },
     ],
   },
 };
@@ -319,56 +338,95 @@ function showReport(name) {
   thead.innerHTML = "";
   tbody.innerHTML = "<tr><td>Loading...</td></tr>";
 
-  fetch(cfg.url)
-    .then((resp) => resp.json().then((data) => ({ resp, data })))
-    .then(({ resp, data }) => {
-      if (!resp.ok) {
-        tbody.innerHTML = "";
-        errDiv.textContent = data.detail || "Error loading report";
-        return;
-      }
+  const moreBtn = document.getElementById("reportMoreBtn");
+  if (moreBtn) moreBtn.classList.add("hidden");
+
+  // Full report as a streamed CSV download
+  const exportLink = document.getElementById("reportExportLink");
+  if (exportLink) {
+    exportLink.href =
+      cfg.url.replace("/api/reports/", "/api/reports/export/") + "?format=csv";
+    // the members export (personal details) is admin only
+    const adminOnly = name === "members";
+    const isAdmin = currentRole && currentRole.toLowerCase() === "admin";
+    exportLink.classList.toggle("hidden", adminOnly && !isAdmin);
+  }
 
-      const rows = data.results || [];
+  // Reports are paginated server-side; "Load more" appends the next page
+  function loadPage(cursor) {
+    const url = cursor
+      ? `${cfg.url}?after=${encodeURIComponent(cursor)}`
+      : cfg.url;
 
-      const headRow = document.createElement("tr");
-      cfg.columns.forEach((col) => {
-        const th = document.createElement("th");
-        th.textContent = col.label;
-        headRow.appendChild(th);
-      });
-      thead.appendChild(headRow);
+    return fetch(url)
+      .then((resp) => resp.json().then((data) => ({ resp, data })))
+      .then(({ resp, data }) => {
+        if (!resp.ok) {
+          tbody.innerHTML = "";
+          errDiv.textContent = data.detail || "Error loading report";
+          return;
+        }
 
-      tbody.innerHTML = "";
-      if (rows.length === 0) {
-        const tr = document.createElement("tr");
-        const td = document.createElement("td");
-        td.colSpan = cfg.columns.length;
-        td.textContent = "No data available.";
-        tr.appendChild(td);
-        tbody.appendChild(tr);
-        return;
-      }
+        const rows = data.results || [];
+
+        if (!cursor) {
+          const headRow = document.createElement("tr");
+          cfg.columns.forEach((col) => {
+            const th = document.createElement("th");
+            th.textContent = col.label;
+            headRow.appendChild(th);
+          });
+          thead.appendChild(headRow);
+
+          tbody.innerHTML = "";
+          if (rows.length === 0) {
+            const tr = document.createElement("tr");
+            const td = document.createElement("td");
+            td.colSpan = cfg.columns.length;
+            td.textContent = "No data available.";
+            tr.appendChild(td);
+            tbody.appendChild(tr);
+            return;
+          }
+        }
 
-      rows.forEach((row) => {
-        const tr = document.createElement("tr");
-        cfg.columns.forEach((col) => {
-          const td = document.createElement("td");
-          let value = row[col.key];
+        rows.forEach((row) => {
+          const tr = document.createElement("tr");
+          cfg.columns.forEach((col) => {
+            const td = document.createElement("td");
+            let value = row[col.key];
 
-          if (value === null || value === undefined) value = "";
-          if (col.key === "fine_paid") value = value ? "Yes" : "No";
+            if (value === null || value === undefined) value = "";
+            if (col.key === "fine_paid") value = value ? "Yes" : "No";
 
-          td.textContent = value;
-          tr.appendChild(td);
+            td.textContent = value;
+            tr.appendChild(td);
+          });
+          tbody.appendChild(tr);
         });
-        tbody.appendChild(tr);
+
+        if (moreBtn) {
+          if (data.next_cursor) {
+            moreBtn.classList.remove("hidden");
+            moreBtn.onclick = () => {
+              moreBtn.disabled = true;
+              loadPage(data.next_cursor).finally(() => {
+                moreBtn.disabled = false;
+              });
+            };
+          } else {
+            moreBtn.classList.add("hidden");
+          }
+        }
+      })
+      .catch(() => {
+        thead.innerHTML = "";
+        tbody.innerHTML = "";
+        errDiv.textContent = "Server error while loading report.";
       });
-    })
-    .catch(() => {
-      thead.innerHTML = "";
-      tbody.innerHTML = "";
-      errDiv.textContent = "Server error while loading report.";
-    });
+  }
+
+  loadPage(null);
 }
 
 // ---------- SIMPLE NAV HELPERS ----------
@@ -439,6 +497,7 @@ function initAvailability() {
   const takeBtn = document.getElementById("availTakeToIssueBtn");
   const clearBtn = document.getElementById("availClearBtn"); // NEW
   const countEl = document.getElementById("availCount"); // NEW
+  const moreBtn = document.getElementById("availMoreBtn");
 
   if (!form || !titleEl || !authorEl || !errDiv || !tbody) return;
 
@@ -504,35 +563,48 @@ function initAvailability() {
     const avail = rows
       ? rows.filter((r) => r.status === "Available").length
       : 0;
+    // the master list is paged: say so while more pages are left
+    const more = nextCursor ? " so far, more to load" : "";
     // If everything is available (typical default), show "Available Books: X"
     if (total > 0 && total === avail) {
-      countEl.textContent = `Available Books: ${avail}`;
+      countEl.textContent = `Available Books: ${avail}${more}`;
     } else {
-      countEl.textContent = `Books shown: ${total} (Available: ${avail})`;
+      countEl.textContent = `Books shown: ${total} (Available: ${avail})${more}`;
     }
   }
 
   // ---------------- LOAD AVAILABLE BOOKS BY DEFAULT ----------------
   let currentRows = [];
+  // cursor of the master list's next page, null once it is all loaded
+  let nextCursor = null;
+
+  function showMore(cursor) {
+    nextCursor = cursor || null;
+    if (moreBtn) moreBtn.classList.toggle("hidden", !nextCursor);
+  }
 
-  async function loadMasterListAvailable() {
-    if (countEl) countEl.textContent = "Loading books...";
-    tbody.innerHTML = "<tr><td>Loading...</td></tr>";
+  // "Load more" appends the next page of the master list
+  async function loadMasterListAvailable(cursor) {
+    if (!cursor) {
+      if (countEl) countEl.textContent = "Loading books...";
+      tbody.innerHTML = "<tr><td>Loading...</td></tr>";
+    }
     errDiv.textContent = "";
     try {
-      const resp = await fetch("/api/reports/books");
+      let url = "/api/reports/books?status=Available";
+      if (cursor) url += `&after=${encodeURIComponent(cursor)}`;
+      const resp = await fetch(url);
       const data = await resp.json();
       if (!resp.ok) {
-        tbody.innerHTML = "";
+        if (!cursor) tbody.innerHTML = "";
         errDiv.textContent = data.detail || "Error loading book list";
-        if (countEl) countEl.textContent = "";
+        if (countEl && !cursor) countEl.textContent = "";
         return;
       }
 
       const rows = data.results || [];
-      const onlyAvail = rows.filter((r) => r.status === "Available");
-
-      currentRows = onlyAvail;
+      currentRows = cursor ? currentRows.concat(rows) : rows;
+      showMore(data.next_cursor);
       loadRows(currentRows);
     } catch (e) {
       tbody.innerHTML = "";
@@ -555,6 +627,7 @@ function initAvailability() {
       await loadMasterListAvailable();
       return;
     }
+    showMore(null);
 
     try {
       const params = new URLSearchParams({ book: title, author });
@@ -612,6 +685,15 @@ function initAvailability() {
   titleEl.addEventListener("input", liveFilter);
   authorEl.addEventListener("input", liveFilter);
 
+  if (moreBtn) {
+    moreBtn.addEventListener("click", () => {
+      moreBtn.disabled = true;
+      loadMasterListAvailable(nextCursor).finally(() => {
+        moreBtn.disabled = false;
+      });
+    });
+  }
+
   // ---------------- CLEAR FILTERS (NEW) ----------------
   if (clearBtn) {
     clearBtn.addEventListener("click", (e) => {
@@ -690,6 +772,18 @@ async function loadProductDetails() {
 
     const data = await resp.json();
 
+    // category choices for Add Book/Movie (serials follow the code range)
+    const catSelect = document.getElementById("abCategory");
+    if (catSelect && Array.isArray(data)) {
+      catSelect.innerHTML = '<option value="">(none)</option>';
+      data.forEach((row) => {
+        const opt = document.createElement("option");
+        opt.value = row.category;
+        opt.textContent = row.category;
+        catSelect.appendChild(opt);
+      });
+    }
+
     if (!Array.isArray(data) || data.length === 0) {
       const tr = document.createElement("tr");
       const td = document.createElement("td");
@@ -821,24 +915,17 @@ function initReturn() {
     currentIssueForReturn = data;
   }
 
-  // ---------------- Fetch active issues for member ----------------
-  async function fetchActiveIssues(memberId) {
-    try {
-      const resp = await fetch("/api/reports/active-issues");
-      const data = await resp.json();
-      if (!resp.ok) return [];
-      return (data.results || []).filter((r) => r.membership_id === memberId);
-    } catch {
-      return [];
-    }
-  }
-
-  async function fetchBookBySerial(serial) {
+  // ---------------- Fetch member desk view ----------------
+  // One request returns member status plus open issues joined to book
+  // names and accrued fines, so nothing is filtered client-side.
+  async function fetchMemberDesk(memberId) {
     try {
-      const resp = await fetch("/api/reports/books");
+      const resp = await fetch(
+        `/api/transactions/member/${encodeURIComponent(memberId)}/desk`
+      );
       const data = await resp.json();
       if (!resp.ok) return null;
-      return (data.results || []).find((b) => b.serial_no === serial) || null;
+      return data;
     } catch {
       return null;
     }
@@ -857,18 +944,17 @@ function initReturn() {
       div.style.padding = "6px";
       div.style.borderBottom = "1px solid #eee";
       div.style.cursor = "pointer";
-      div.textContent = `Serial: ${it.serial_no} | Issue: ${it.issue_date} | Planned: ${it.planned_return}`;
+      div.textContent = `Serial: ${it.serial_no} | ${it.book_name || ""} | Issue: ${it.issue_date} | Planned: ${it.planned_return}`;
 
-      div.addEventListener("click", async () => {
-        const book = await fetchBookBySerial(it.serial_no);
+      div.addEventListener("click", () => {
         populateReturnUI({
           issue_id: it.issue_id,
           membership_id: it.membership_id,
           serial_no: it.serial_no,
           issue_date: it.issue_date,
           return_date: it.planned_return,
-          book_name: book ? book.name : "",
-          author: book ? book.author : "",
+          book_name: it.book_name || "",
+          author: it.author || "",
         });
         memberIssuesListEl.style.display = "none";
       });
@@ -887,8 +973,14 @@ function initReturn() {
     memberIssuesListEl.style.display = "block";
     memberIssuesListEl.textContent = "Loading active issues...";
 
-    const issues = await fetchActiveIssues(mid);
+    const desk = await fetchMemberDesk(mid);
+    if (!desk) {
+      memberIssuesListEl.textContent = "Member not found.";
+      setTimeout(() => (memberIssuesListEl.style.display = "none"), 2000);
+      return;
+    }
 
+    const issues = desk.issues || [];
     if (!issues.length) {
       memberIssuesListEl.textContent = "No active issues found.";
       setTimeout(() => (memberIssuesListEl.style.display = "none"), 2000);
@@ -897,15 +989,14 @@ function initReturn() {
 
     if (issues.length === 1) {
       const it = issues[0];
-      const book = await fetchBookBySerial(it.serial_no);
       populateReturnUI({
         issue_id: it.issue_id,
         membership_id: it.membership_id,
         serial_no: it.serial_no,
         issue_date: it.issue_date,
         return_date: it.planned_return,
-        book_name: book ? book.name : "",
-        author: book ? book.author : "",
+        book_name: it.book_name || "",
+        author: it.author || "",
       });
       memberIssuesListEl.style.display = "none";
       return;
@@ -1222,6 +1313,8 @@ function initBookMaintenance() {
       formData.append("name", name);
       formData.append("procurement_date", procurementDate);
       formData.append("quantity", String(qty));
+      const catEl = document.getElementById("abCategory");
+      if (catEl && catEl.value) formData.append("category", catEl.value);
 
       try {
         const resp = await fetch("/api/maintenance/book/add", {
@@ -1236,7 +1329,10 @@ function initBookMaintenance() {
           return;
         }
 
-        errDiv.textContent = "Book/Movie added successfully.";
+        errDiv.textContent =
+          data.serial_from === data.serial_to
+            ? `Book/Movie added successfully (${data.serial_from}).`
+            : `Book/Movie added successfully (${data.serial_from} – ${data.serial_to}).`;
         document.getElementById("abName").value = "";
         document.getElementById("abDate").value = "";
         document.getElementById("abQty").value = "1";
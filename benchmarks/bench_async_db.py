@@ -0,0 +1,110 @@
+"""
+Concurrent-request throughput with and without the async DB layer.
+
+A handful of slow report queries (full scan of a large members table) run
+concurrently with many cheap point lookups. In "inline" mode the queries
+run directly on the event loop, the way the routers used to; in "executor"
+mode they go through app.db.run(). The cheap lookups' latency shows how
+long the loop was blocked.
+
+    python -m benchmarks.bench_async_db --members 200000 --requests 500
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def _prepare(members):
+    from app import db
+    from app.db_init import init_db
+
+    init_db()
+    conn = db.get_connection()
+    conn.executemany(
+        "INSERT INTO members(membership_id,first_name,last_name,phone,address,aadhar,start_date,end_date,status,pending_fine) "
+        "VALUES (?,?,?,?,?,?,?,?,?,0)",
+        (
+            (f"B{i:07d}", "First", "Last", "9999999999", "Address", "0", "2024-01-01", "2025-01-01", "Active")
+            for i in range(members)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+SLOW_SQL = "SELECT * FROM members ORDER BY last_name, phone, membership_id DESC"
+FAST_SQL = "SELECT * FROM users WHERE username=?"
+
+
+async def _scenario(mode, slow, requests, interval):
+    from app import db
+
+    if mode == "inline":
+        async def query(sql, params=()):
+            conn = db.get_connection()
+            try:
+                return [dict(r) for r in conn.execute(sql, params).fetchall()]
+            finally:
+                conn.close()
+    else:
+        query = db.fetch_all
+
+    latencies = []
+
+    async def fast(arrival):
+        await query(FAST_SQL, ("adm",))
+        latencies.append((time.perf_counter() - arrival) * 1000)
+
+    async def fast_stream(started):
+        # open-loop arrivals: latency is measured from when the request
+        # "arrived", so time spent waiting on a blocked loop is counted
+        tasks = []
+        for i in range(requests):
+            arrival = started + i * interval
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fast(arrival)))
+        await asyncio.gather(*tasks)
+
+    async def slow_query():
+        await asyncio.sleep(0)
+        await query(SLOW_SQL)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(slow_query() for _ in range(slow)), fast_stream(started))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round((requests + slow) / elapsed, 1),
+        "fast_p50_ms": round(statistics.median(latencies), 3),
+        "fast_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--members", type=int, default=200_000)
+    parser.add_argument("--slow", type=int, default=4, help="concurrent slow report queries")
+    parser.add_argument("--requests", type=int, default=500, help="cheap lookups issued meanwhile")
+    parser.add_argument("--interval-ms", type=float, default=2.0, help="gap between cheap lookups")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    _prepare(args.members)
+
+    from app import db
+
+    for mode in ("inline", "executor"):
+        print(asyncio.run(_scenario(mode, args.slow, args.requests, args.interval_ms / 1000)))
+    db.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Desk checkout/return of several copies: one request per copy (the old
+flow: /issue, then /return/start + /fine per copy) vs one /issue/batch and
+one /fine/batch request. Counts HTTP round trips and write commits and
+times both through the ASGI app.
+
+    python -m benchmarks.bench_batch_checkout --members 50 --copies 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+
+def _prepare(members, copies):
+    from app.db import get_connection
+    from app.db_init import init_db
+
+    init_db()
+    conn = get_connection()
+    conn.executemany(
+        "INSERT INTO books(serial_no,name,author,category,status,cost,procurement_date,type) "
+        "VALUES (?,?,'','','Available',0,'2024-01-01','Book')",
+        [(f"DESK{i:06d}", f"Desk copy {i}") for i in range(members * copies)],
+    )
+    conn.executemany(
+        "INSERT INTO members(membership_id,first_name,last_name,phone,address,aadhar,start_date,end_date,status,pending_fine) "
+        "VALUES (?,'Desk','Member','0','-','0','2024-01-01','2999-01-01','Active',0)",
+        [(f"BM{i:05d}",) for i in range(members)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _single(client, member, serials, today, due):
+    for serial in serials:
+        r = client.post("/api/transactions/issue", data={
+            "serial_no": serial, "membership_id": member,
+            "issue_date": today, "planned_return": due,
+        })
+        r.raise_for_status()
+    for serial in serials:
+        r = client.post("/api/transactions/return/start", data={
+            "membership_id": member, "serial_no": serial,
+        })
+        r.raise_for_status()
+        r = client.post("/api/transactions/fine", data={
+            "issue_id": r.json()["issue_id"], "actual_return_date": today,
+        })
+        r.raise_for_status()
+    return len(serials) * 3
+
+
+def _batch(client, member, serials, today, due):
+    r = client.post("/api/transactions/issue/batch", data={
+        "serial_no": serials, "membership_id": member,
+        "issue_date": today, "planned_return": due,
+    })
+    r.raise_for_status()
+    r = client.post("/api/transactions/fine/batch", data={
+        "issue_id": [item["issue_id"] for item in r.json()["items"]],
+        "membership_id": member, "actual_return_date": today,
+    })
+    r.raise_for_status()
+    return 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--copies", type=int, default=5, help="copies per member visit")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    os.environ["SCHEDULER_ENABLED"] = "0"
+    from fastapi.testclient import TestClient
+
+    from app import db
+    from app.main import app
+
+    _prepare(args.members, args.copies)
+    today = date.today().isoformat()
+    due = (date.today() + timedelta(days=7)).isoformat()
+
+    with TestClient(app) as client:
+        client.post("/api/auth/login", data={"username": "adm", "password": "adm"}).raise_for_status()
+        for label, flow in (("one copy per request", _single), ("batch", _batch)):
+            commits_before = db.write_stats()["transactions"]
+            requests, samples = 0, []
+            for m in range(args.members):
+                serials = [f"DESK{m * args.copies + c:06d}" for c in range(args.copies)]
+                started = time.perf_counter()
+                requests += flow(client, f"BM{m:05d}", serials, today, due)
+                samples.append((time.perf_counter() - started) * 1000)
+            commits = db.write_stats()["transactions"] - commits_before
+            print(
+                f"{label:<22} {requests / args.members:>5.1f} requests/visit  "
+                f"{commits / args.members:>5.1f} commits/visit  "
+                f"median {statistics.median(samples):>7.2f} ms/visit"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Memory use of streamed report exports as the table grows.
+
+Fills the catalogue to each size in turn and downloads the full books
+export (CSV, then NDJSON) through the ASGI app, discarding the body as
+it arrives. Peak Python heap (tracemalloc) should stay flat from the
+smallest table to the largest: only one batch is in memory at a time.
+Exits non-zero when the peak at the largest size exceeds the peak at the
+smallest by more than --max-growth-mb. Sizes below two export batches
+(EXPORT_BATCH_SIZE) are refused: they never fill a batch, so the baseline
+would be too low. tests/test_export_memory.py checks the same with a
+small batch size.
+(Process RSS also counts the database pages SQLite maps in, see
+DB_MMAP_SIZE, so it grows with the file while loading.)
+
+    python -m benchmarks.bench_export_memory --sizes 100000,1000000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def _grow(conn, start, stop):
+    categories = ["Science", "Economics", "Fiction", "Children", "Personal Development"]
+    conn.executemany(
+        "INSERT INTO books(serial_no,name,author,category,status,cost,procurement_date,type) "
+        "VALUES (?,?,?,?,'Available',450.5,'2024-01-01','Book')",
+        (
+            (f"EX{i:08d}", f"Export Title {i}", f"Author {i % 5000}", categories[i % 5])
+            for i in range(start, stop)
+        ),
+    )
+    conn.commit()
+
+
+async def _download(app, path, token):
+    """GET `path` against the ASGI app; returns (status, body bytes, chunks)."""
+    headers = [(b"host", b"bench"), (b"cookie", f"access_token={token}".encode())]
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "server": ("bench", 80), "client": ("bench", 1),
+        "root_path": "", "path": path.split("?")[0], "raw_path": path.split("?")[0].encode(),
+        "query_string": path.partition("?")[2].encode(), "headers": headers,
+    }
+    status, size, chunks = None, 0, 0
+    requested, done = False, asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # the client stays connected until the whole body has arrived
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, size, chunks
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+            chunks += 1
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    return status, size, chunks
+
+
+def _rss_mb():
+    # ru_maxrss is KiB on Linux: high-water mark of the whole process
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _run(args):
+    from app import db
+    from app.main import app
+    from app.routers.auth import create_access_token
+    from app.routers.reports import EXPORT_BATCH_SIZE
+
+    # exports need a login: sign a session for the seeded admin
+    token = create_access_token({"sub": "adm", "role": "Admin"})
+
+    lifespan = app.router.lifespan_context(app)
+    await lifespan.__aenter__()
+    peaks = {}  # format -> [(size, peak bytes)]
+    try:
+        conn = db.get_connection()
+        loaded = 0
+        print(f"batch size {EXPORT_BATCH_SIZE}")
+        for size in sorted(args.sizes):
+            _grow(conn, loaded, size)
+            loaded = size
+            for fmt in ("csv", "ndjson"):
+                tracemalloc.start()
+                started = time.perf_counter()
+                status, body, chunks = await _download(
+                    app, f"/api/reports/export/books?format={fmt}", token
+                )
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                assert status == 200, status
+                peaks.setdefault(fmt, []).append((size, peak))
+                print(
+                    f"{size:>9,} rows {fmt:<6} {body / 1e6:>8.1f} MB in {chunks:>4} chunks "
+                    f"{elapsed:>6.1f}s  heap peak {peak / 1e6:>6.2f} MB  "
+                    f"process RSS high-water {_rss_mb():>6.0f} MB"
+                )
+        conn.close()
+    finally:
+        await lifespan.__aexit__(None, None, None)
+
+    failed = False
+    for fmt, runs in peaks.items():
+        (small, small_peak), (large, large_peak) = runs[0], runs[-1]
+        growth = (large_peak - small_peak) / 1e6
+        ok = growth <= args.max_growth_mb
+        failed |= not ok
+        print(
+            f"{fmt:<6} heap peak {small:,} -> {large:,} rows: {growth:+.2f} MB "
+            f"(limit {args.max_growth_mb:.2f} MB) {'ok' if ok else 'FAIL'}"
+        )
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=lambda s: [int(n) for n in s.split(",")], default=[100_000, 1_000_000],
+        help="comma-separated catalogue sizes",
+    )
+    parser.add_argument(
+        "--max-growth-mb", type=float, default=2.0,
+        help="allowed heap peak growth from the smallest size to the largest",
+    )
+    args = parser.parse_args()
+
+    os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    os.environ["SCHEDULER_ENABLED"] = "0"
+    from app.db_init import init_db
+    from app.routers.reports import EXPORT_BATCH_SIZE
+
+    if min(args.sizes) < 2 * EXPORT_BATCH_SIZE:
+        parser.error(f"sizes must be at least two export batches ({2 * EXPORT_BATCH_SIZE} rows)")
+
+    init_db()
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
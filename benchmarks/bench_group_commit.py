@@ -0,0 +1,145 @@
+"""
+Concurrent small writes: group commit vs one transaction per write.
+
+Coroutines issue short write transactions (an issue_requests insert plus
+a member update) through db.run_write for a fixed time, while others
+page a report on read-only connections. Compared modes:
+
+- connection per write: every write opens its own BEGIN IMMEDIATE on an
+  executor thread and waits on SQLite's lock (the old path)
+- single writer, group of 1: the writer queue committing every write
+- group commit: the writer queue with DB_WRITE_GROUP_SIZE
+
+    python -m benchmarks.bench_group_commit --writers 32 --readers 4 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def _prepare(members):
+    from app.db import get_connection
+    from app.db_init import init_db
+
+    init_db()
+    conn = get_connection()
+    conn.executemany(
+        "INSERT INTO members(membership_id,first_name,last_name,phone,address,aadhar,start_date,end_date,status,pending_fine) "
+        "VALUES (?,'Group','Member','0','-','0','2024-01-01','2999-01-01','Active',0)",
+        [(f"GC{i:05d}",) for i in range(members)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _request_book(conn, member, title):
+    conn.execute(
+        "INSERT INTO issue_requests(membership_id, book_name, requested_date) VALUES (?, ?, date('now'))",
+        (member, title),
+    )
+    conn.execute("UPDATE members SET phone = phone WHERE membership_id = ?", (member,))
+
+
+def _own_transaction(conn, member, title):
+    from app import db
+
+    for attempt in range(db.DB_WRITE_RETRIES + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            _request_book(conn, member, title)
+            conn.commit()
+            return
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not db._is_busy(e) or attempt == db.DB_WRITE_RETRIES:
+                raise
+
+
+def _read_page(conn):
+    return conn.execute(
+        "SELECT * FROM issue_requests ORDER BY request_id DESC LIMIT 50"
+    ).fetchall()
+
+
+async def _measure(write, args):
+    from app import db
+
+    writes, reads = [], []
+    deadline = time.perf_counter() + args.seconds
+
+    async def writer(i):
+        n = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await write(f"GC{i % args.members:05d}", f"Title {i}-{n}")
+            writes.append((time.perf_counter() - started) * 1000)
+            n += 1
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await db.read(_read_page)
+            reads.append((time.perf_counter() - started) * 1000)
+
+    before = db.write_stats()
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(writer(i) for i in range(args.writers)), *(reader() for _ in range(args.readers))
+    )
+    elapsed = time.perf_counter() - started
+    commits = db.write_stats()["commits"] - before["commits"]
+    return elapsed, sorted(writes), sorted(reads), commits
+
+
+def _p(samples, pct):
+    return samples[max(0, int(len(samples) * pct / 100) - 1)] if samples else 0
+
+
+async def _run(args):
+    from app import db
+
+    async def per_connection(member, title):
+        await db.run(_own_transaction, member, title)
+
+    async def queued(member, title):
+        await db.run_write(_request_book, member, title)
+
+    group_size = db.writer.group_size
+    modes = [
+        ("connection per write", per_connection, None),
+        ("single writer, group 1", queued, 1),
+        (f"group commit (<= {group_size})", queued, group_size),
+    ]
+    for label, write, size in modes:
+        if size is not None:
+            db.writer.group_size = size
+        elapsed, writes, reads, commits = await _measure(write, args)
+        ops = len(writes)
+        print(
+            f"{label:<26} {ops / elapsed:>8.0f} writes/s  "
+            f"write p50 {statistics.median(writes):>6.2f} p99 {_p(writes, 99):>7.2f} ms  "
+            f"read p99 {_p(reads, 99):>6.2f} ms  "
+            f"{(ops / commits) if commits else 1:>5.1f} writes/commit"
+        )
+    db.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=32, help="concurrent writing coroutines")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent report readers")
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    _prepare(args.members)
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
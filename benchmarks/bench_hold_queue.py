@@ -0,0 +1,151 @@
+"""
+Return latency as the hold queue grows.
+
+For each queue size, loads that many waiting holds on other titles,
+then one more hold on each of a batch of checked-out titles, and returns
+every copy through return_copy (one write transaction each, via the
+writer queue); each return fulfils its title's hold. Measured with the partial queue indexes and,
+for contrast, without them (the head lookup then scans issue_requests).
+
+    python -m benchmarks.bench_hold_queue --sizes 0,1000,10000,100000 --returns 300
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+QUEUE_INDEXES = ("idx_issue_requests_queue", "idx_issue_requests_waiting_member")
+
+
+def _prepare(members):
+    from app.db import get_connection
+    from app.db_init import init_db
+
+    init_db()
+    conn = get_connection()
+    conn.executemany(
+        "INSERT INTO members(membership_id,first_name,last_name,phone,address,aadhar,start_date,end_date,status,pending_fine) "
+        "VALUES (?,'Hold','Member','0','-','0','2024-01-01','2999-01-01','Active',0)",
+        [(f"HQ{i:05d}",) for i in range(members)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _load_round(conn, label, returns, holds, members):
+    """
+    `holds` waiting holds on other titles, then `returns` checked-out
+    single-copy titles with one hold each, queued behind all the others.
+    """
+    today = date.today()
+    titles = [f"Hold Title {label}-{t}" for t in range(returns)]
+    # previous round's leftovers out, so each size is measured on its own
+    conn.execute("DELETE FROM issue_requests WHERE status='Waiting'")
+    conn.executemany(
+        "INSERT INTO books(serial_no,name,author,category,status,cost,procurement_date,type) "
+        "VALUES (?,?,'Bench','Fiction','Issued',0,'2024-01-01','Book')",
+        [(f"HQ-{label}-{t}", title) for t, title in enumerate(titles)],
+    )
+    conn.executemany(
+        "INSERT INTO issues(serial_no,membership_id,issue_date,planned_return,actual_return_date,fine_amount,fine_paid) "
+        "VALUES (?,'HQ00000',?,?,NULL,0,0)",
+        [
+            (f"HQ-{label}-{t}", today.isoformat(), (today + timedelta(days=7)).isoformat())
+            for t in range(returns)
+        ],
+    )
+    sql = (
+        "INSERT INTO issue_requests(membership_id,book_name,requested_date,status) "
+        "VALUES (?,?,?,'Waiting')"
+    )
+    # the backlog: queues `members` deep on titles nobody returns here
+    conn.executemany(
+        sql,
+        [
+            (f"HQ{h % members:05d}", f"Queued Title {label}-{h // members}", today.isoformat())
+            for h in range(holds)
+        ],
+    )
+    conn.executemany(
+        sql, [(f"HQ{t % members:05d}", title, today.isoformat()) for t, title in enumerate(titles)]
+    )
+    conn.commit()
+    return [
+        r[0]
+        for r in conn.execute(
+            "SELECT issue_id FROM issues WHERE serial_no LIKE ? AND actual_return_date IS NULL",
+            (f"HQ-{label}-%",),
+        )
+    ]
+
+
+def _time_returns(issue_ids):
+    from app import db
+    from app.routers.transactions import return_copy
+
+    today = date.today()
+    samples, fulfilled = [], 0
+    for issue_id in issue_ids:
+        started = time.perf_counter()
+        _, hold = db.write(return_copy, issue_id, today, True)
+        samples.append((time.perf_counter() - started) * 1000)
+        fulfilled += hold is not None
+    return sorted(samples), fulfilled
+
+
+def _p(samples, pct):
+    return samples[max(0, int(len(samples) * pct / 100) - 1)] if samples else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=lambda s: [int(n) for n in s.split(",")],
+        default=[0, 1_000, 10_000, 100_000], help="comma-separated waiting hold counts",
+    )
+    parser.add_argument("--returns", type=int, default=300, help="returns timed per size")
+    parser.add_argument("--members", type=int, default=1000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    _prepare(args.members)
+
+    from app import db
+
+    conn = db.get_connection()
+    saved = {
+        r["name"]: r["sql"]
+        for r in conn.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE name IN ({','.join('?' * len(QUEUE_INDEXES))})",
+            QUEUE_INDEXES,
+        )
+    }
+    try:
+        for indexed in (True, False):
+            if not indexed:
+                for name in saved:
+                    conn.execute(f"DROP INDEX {name}")
+                conn.commit()
+            mode = "queue index" if indexed else "no queue index"
+            for size in args.sizes:
+                label = f"{'i' if indexed else 'n'}{size}"
+                issue_ids = _load_round(conn, label, args.returns, size, args.members)
+                samples, fulfilled = _time_returns(issue_ids)
+                print(
+                    f"{mode:<15} {size:>8,} holds ahead  return p50 {statistics.median(samples):>7.2f} "
+                    f"p99 {_p(samples, 99):>7.2f} ms  {fulfilled:>4}/{len(samples)} fulfilled a hold"
+                )
+    finally:
+        for sql in saved.values():
+            conn.execute(sql.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1).replace(
+                "CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX IF NOT EXISTS", 1
+            ))
+        conn.commit()
+        conn.close()
+        db.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Issue/return contention: many desks (threads) fight over a few copies.
+
+Each thread loops: pick a random copy, try to issue it to its own member,
+and if that worked return it again. Right after every successful issue
+the copy's open issues are counted -- more than one is a double issue --
+and at the end book statuses are checked against open issues. Runs the
+atomic flows from app.routers.transactions and, for comparison, the old
+check-then-act flow.
+
+    python -m benchmarks.bench_issue_contention --threads 16 --copies 4 --seconds 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date
+
+
+def _prepare(copies, threads):
+    from app.db import get_connection
+    from app.db_init import init_db
+
+    init_db()
+    conn = get_connection()
+    conn.executemany(
+        "INSERT INTO books(serial_no,name,author,category,status,cost,procurement_date,type) "
+        "VALUES (?,?,'','','Available',0,'2024-01-01','Book')",
+        [(f"HOT{i:04d}", f"Hot copy {i}") for i in range(copies)],
+    )
+    conn.executemany(
+        "INSERT INTO members(membership_id,first_name,last_name,phone,address,aadhar,start_date,end_date,status,pending_fine) "
+        "VALUES (?,'Desk','Member','0','-','0','2024-01-01','2999-01-01','Active',0)",
+        [(f"DESK{i:03d}",) for i in range(threads)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _naive_issue(conn, serial_no, membership_id, today):
+    """The pre-fix flow: read status, check in Python, then write."""
+    status = conn.execute("SELECT status FROM books WHERE serial_no=?", (serial_no,)).fetchone()
+    if status["status"] != "Available":
+        return None
+    time.sleep(0)  # let other desks interleave, as a real request would
+    cur = conn.execute(
+        "INSERT INTO issues(serial_no,membership_id,issue_date,planned_return,actual_return_date,fine_amount,fine_paid) "
+        "VALUES (?,?,?,?,NULL,0,0)",
+        (serial_no, membership_id, today, today),
+    )
+    conn.execute("UPDATE books SET status='Issued' WHERE serial_no=?", (serial_no,))
+    conn.commit()
+    return cur.lastrowid
+
+
+def _naive_return(conn, issue_id, today):
+    row = conn.execute("SELECT serial_no FROM issues WHERE issue_id=?", (issue_id,)).fetchone()
+    conn.execute("UPDATE issues SET actual_return_date=? WHERE issue_id=?", (today, issue_id))
+    conn.execute("UPDATE books SET status='Available' WHERE serial_no=?", (row["serial_no"],))
+    conn.commit()
+
+
+def _worker(mode, index, copies, deadline, counters, lock):
+    from fastapi import HTTPException
+
+    from app import db
+    from app.routers.transactions import issue_copy, return_copy
+
+    rnd = random.Random(index)
+    member = f"DESK{index:03d}"
+    today = date.today()
+    local = {"issued": 0, "returned": 0, "conflicts": 0, "errors": 0, "double_issues": 0}
+    conn = db.get_connection()
+    try:
+        while time.perf_counter() < deadline:
+            serial = f"HOT{rnd.randrange(copies):04d}"
+            try:
+                if mode == "atomic":
+                    issue_id = db.write(
+                        issue_copy, serial, member, today.isoformat(), today.isoformat()
+                    )
+                else:
+                    issue_id = _naive_issue(conn, serial, member, today.isoformat())
+                    if issue_id is None:
+                        local["conflicts"] += 1
+                        continue
+                local["issued"] += 1
+                open_issues = conn.execute(
+                    "SELECT COUNT(*) FROM issues WHERE serial_no=? AND actual_return_date IS NULL",
+                    (serial,),
+                ).fetchone()[0]
+                if open_issues > 1:
+                    local["double_issues"] += 1
+                if mode == "atomic":
+                    db.write(return_copy, issue_id, today, False)
+                else:
+                    _naive_return(conn, issue_id, today.isoformat())
+                local["returned"] += 1
+            except HTTPException:
+                local["conflicts"] += 1
+            except sqlite3.OperationalError:
+                if conn.in_transaction:
+                    conn.rollback()
+                local["errors"] += 1
+    finally:
+        conn.close()
+    with lock:
+        for key, value in local.items():
+            counters[key] += value
+
+
+def _reset():
+    from app.db import get_connection
+
+    conn = get_connection()
+    conn.execute("DELETE FROM issues WHERE serial_no GLOB 'HOT*'")
+    conn.execute("UPDATE books SET status='Available' WHERE serial_no GLOB 'HOT*'")
+    conn.commit()
+    conn.close()
+
+
+def _status_mismatches():
+    from app.db import get_connection
+
+    conn = get_connection()
+    try:
+        return conn.execute(
+            """
+            SELECT COUNT(*) FROM books b WHERE b.serial_no GLOB 'HOT*' AND
+              (b.status = 'Issued') != EXISTS (
+                  SELECT 1 FROM issues i
+                  WHERE i.serial_no = b.serial_no AND i.actual_return_date IS NULL
+              )
+            """
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--copies", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--mode", choices=("atomic", "naive", "both"), default="both")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DB_POOL_SIZE", str(args.threads + 2))
+    os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    from app import db
+
+    _prepare(args.copies, args.threads)
+
+    modes = ("naive", "atomic") if args.mode == "both" else (args.mode,)
+    for mode in modes:
+        _reset()
+        before = db.write_stats()
+
+        counters = {"issued": 0, "returned": 0, "conflicts": 0, "errors": 0, "double_issues": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.seconds
+        workers = [
+            threading.Thread(target=_worker, args=(mode, i, args.copies, deadline, counters, lock))
+            for i in range(args.threads)
+        ]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+        after = db.write_stats()
+        attempts = counters["issued"] + counters["conflicts"] + counters["errors"]
+        retries = after["retries"] - before["retries"]
+        commits = after["commits"] - before["commits"]
+        print({
+            "mode": mode,
+            "threads": args.threads,
+            "copies": args.copies,
+            "issue_return_cycles_per_s": round(counters["returned"] / args.seconds, 1),
+            "issue_attempts_per_s": round(attempts / args.seconds, 1),
+            **counters,
+            "busy_retries": retries,
+            "group_commits": commits,
+            "retry_rate": round(retries / max(attempts, 1), 4),
+            "status_mismatches": _status_mismatches(),
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Login throughput under concurrency with hashed passwords.
+
+Concurrent clients log in through the ASGI app for a fixed time while a probe
+measures how late the event loop wakes up (what every other request
+would wait). For contrast, the same number of coroutines verifies
+passwords directly on the event loop, as a naive handler would.
+
+    python -m benchmarks.bench_login --concurrency 16 --seconds 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+async def _probe(stop, lags, interval=0.005):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append((loop.time() - expected) * 1000)
+
+
+async def _measure(worker, concurrency, seconds):
+    lags, latencies = [], []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(stop, lags))
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await worker()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    return len(latencies) / elapsed, sorted(latencies), sorted(lags)
+
+
+def _report(label, rate, latencies, lags):
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(
+        f"{label:<22} {rate:>8.1f} logins/s  "
+        f"p50 {statistics.median(latencies):>7.1f} ms  p95 {p95:>7.1f} ms  "
+        f"loop lag p99 {lags[int(len(lags) * 0.99) - 1] if lags else 0:>7.1f} ms  "
+        f"max {max(lags, default=0):>7.1f} ms"
+    )
+
+
+async def _run(args):
+    import httpx
+
+    from app import passwords
+    from app.main import app
+
+    lifespan = app.router.lifespan_context(app)
+    await lifespan.__aenter__()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def http_login():
+                r = await client.post(
+                    "/api/auth/login", data={"username": "user", "password": "user"}
+                )
+                r.raise_for_status()
+
+            # first login upgrades nothing (seeded users are hashed), but
+            # warms the pool and connection
+            await http_login()
+            _report(
+                f"hash pool ({passwords.PASSWORD_HASH_WORKERS} threads)",
+                *await _measure(http_login, args.concurrency, args.seconds),
+            )
+
+            stored = passwords.hash_password("user")
+
+            async def on_loop():
+                passwords.verify_password("user", stored)
+                await asyncio.sleep(0)
+
+            _report("hash on event loop", *await _measure(on_loop, args.concurrency, args.seconds))
+    finally:
+        await lifespan.__aexit__(None, None, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    os.environ["SCHEDULER_ENABLED"] = "0"
+    from app.db_init import init_db
+
+    init_db()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
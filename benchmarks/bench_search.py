@@ -0,0 +1,87 @@
+"""
+Catalogue search latency: the old LIKE scan vs the FTS5 index.
+
+    python -m benchmarks.bench_search --books 300000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+WORDS = (
+    "river stone light shadow garden empire silent winter market quantum "
+    "history secret ocean mountain digital economy children science story "
+    "journey forest machine city night dream money mind habit planet"
+).split()
+
+LIKE_SQL = "SELECT * FROM books WHERE status='Available' AND (name LIKE ? OR author LIKE ?)"
+FTS_SQL = (
+    "SELECT b.* FROM books_fts f JOIN books b ON b.rowid = f.rowid "
+    "WHERE books_fts MATCH ? AND b.status='Available' "
+    "ORDER BY bm25(books_fts, 10.0, 5.0, 1.0), b.serial_no LIMIT 50"
+)
+
+
+def _populate(conn, count, rnd):
+    categories = ["Science", "Economics", "Fiction", "Children", "Personal Development"]
+    conn.executemany(
+        "INSERT INTO books(serial_no,name,author,category,status,cost,procurement_date,type) "
+        "VALUES (?,?,?,?,?,0,'2024-01-01',?)",
+        (
+            (
+                f"BENCH{i:08d}",
+                " ".join(rnd.choices(WORDS, k=3)) + f" {i}",
+                f"Author {rnd.randrange(20000)}",
+                rnd.choice(categories),
+                "Available" if rnd.random() < 0.8 else "Issued",
+                "Book" if rnd.random() < 0.85 else "Movie",
+            )
+            for i in range(count)
+        ),
+    )
+    conn.commit()
+
+
+def _time(conn, sql, params, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=300_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    from app.db import get_connection
+    from app.db_init import init_db
+
+    init_db()
+    conn = get_connection()
+    started = time.perf_counter()
+    _populate(conn, args.books, random.Random(args.seed))
+    print(f"loaded {args.books} books in {time.perf_counter() - started:.1f}s")
+
+    cases = [
+        ("name 'quantum'", ("%quantum%", "%%"), 'name : ("quantum"*)'),
+        ("name prefix 'quan'", ("%quan%", "%%"), 'name : ("quan"*)'),
+        ("two words", ("%silent%winter%", "%%"), 'name : ("silent"* "winter"*)'),
+        ("author", ("%%", "%Author 1234%"), 'author : ("author"* "1234"*)'),
+    ]
+    for label, like_params, match in cases:
+        like_ms = _time(conn, LIKE_SQL, like_params, args.runs)
+        fts_ms = _time(conn, FTS_SQL, (match,), args.runs)
+        print(f"{label:<22} LIKE {like_ms:>9.3f} ms   FTS5 {fts_ms:>9.3f} ms")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Report encoding cost per 100k rows: dict rows + jsonable_encoder (the old
+path) vs rows rendered to JSON by SQLite (app.jsonrows).
+
+    python -m benchmarks.bench_serialize --books 100000
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+SQL = "SELECT * FROM books ORDER BY serial_no"
+
+
+def _populate(conn, count):
+    conn.executemany(
+        "INSERT INTO books(serial_no,name,author,category,status,cost,procurement_date,type) "
+        "VALUES (?,?,?,?,'Available',?,'2024-01-01','Book')",
+        (
+            (f"BENCH{i:08d}", f"Title number {i}", f"Author {i % 5000}", "Science", i % 700 + 0.5)
+            for i in range(count)
+        ),
+    )
+    conn.commit()
+
+
+def _old_path(conn):
+    from fastapi.encoders import jsonable_encoder
+
+    rows = [dict(r) for r in conn.execute(SQL).fetchall()]
+    content = jsonable_encoder({"results": rows, "next_cursor": None})
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _dicts_orjson(conn):
+    from app.jsonrows import dumps
+
+    rows = [dict(r) for r in conn.execute(SQL).fetchall()]
+    return dumps({"results": rows, "next_cursor": None})
+
+
+def _sqlite_json(conn):
+    from app.jsonrows import json_array, json_object_body
+
+    return json_object_body(results=json_array(conn, SQL, order_by="serial_no"), next_cursor=None)
+
+
+def _time(fn, conn, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        body = fn(conn)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    from app import jsonrows
+    from app.db import get_connection
+    from app.db_init import init_db
+
+    init_db()
+    conn = get_connection()
+    conn.execute("DELETE FROM books")
+    _populate(conn, args.books)
+
+    per = 100_000 / args.books
+    results = {}
+    cases = [("dict + jsonable_encoder", _old_path), ("sqlite json_object", _sqlite_json)]
+    if jsonrows.orjson is not None:
+        cases.insert(1, ("dict + orjson", _dicts_orjson))
+    for label, fn in cases:
+        ms, body = _time(fn, conn, args.runs)
+        results[label] = json.loads(body)
+        print(f"{label:<24} {ms * per:>9.1f} ms / 100k rows   {len(body) / 1e6:.1f} MB")
+    conn.close()
+
+    bodies = list(results.values())
+    assert all(b == bodies[0] for b in bodies), "encoders disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+End-to-end load test: concurrent desk sessions against the HTTP API.
+
+Every virtual user is one desk serving one member. It logs in, then loops:
+search availability, issue a copy it found, browse a report page (with
+and without If-None-Match, like the browser), and return its oldest copy
+through /return/start + /fine. Results are per endpoint: requests,
+errors, throughput and p50/p95/p99 latency, written as JSON.
+
+In-process (ASGI transport, throwaway database):
+
+    python -m benchmarks.loadtest --users 20 --seconds 30 --books 20000
+
+Against a running server (seeds through the admin import API):
+
+    python -m benchmarks.loadtest --url http://127.0.0.1:8000 --users 50 --output run.json
+
+Exit status is 1 if any request failed unexpectedly (5xx or transport error).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+WORDS = (
+    "river stone light shadow garden empire silent winter market quantum "
+    "history secret ocean mountain digital economy children science story "
+    "journey forest machine city night dream money mind habit planet"
+).split()
+# not product_details categories: their code ranges are only a few
+# serials long, these fall back to plain B/M serials
+CATEGORIES = ["Poetry", "History", "Travel", "Biography", "Reference"]
+# reports a desk (non-admin) login may browse; members is admin only
+REPORTS = [
+    "/api/reports/books",
+    "/api/reports/movies",
+    "/api/reports/active-issues",
+    "/api/reports/overdue/current",
+    "/api/reports/requests",
+]
+
+# statuses a desk meets in normal operation (copy taken by another desk,
+# search with no hits ...) -- counted, but not failures
+EXPECTED = {200, 304, 400, 404}
+
+
+class Recorder:
+    """Latency samples and status counts per endpoint label."""
+
+    def __init__(self):
+        self.samples = {}
+        self.statuses = {}
+        self.failures = {}
+
+    async def call(self, label, send):
+        started = time.perf_counter()
+        try:
+            response = await send()
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, "error"
+        elapsed = (time.perf_counter() - started) * 1000
+        self.samples.setdefault(label, []).append(elapsed)
+        counts = self.statuses.setdefault(label, {})
+        counts[str(status)] = counts.get(str(status), 0) + 1
+        if status not in EXPECTED:
+            self.failures[label] = self.failures.get(label, 0) + 1
+        return response
+
+    def report(self, seconds):
+        endpoints = {}
+        for label, samples in sorted(self.samples.items()):
+            samples.sort()
+            endpoints[label] = {
+                "requests": len(samples),
+                "failures": self.failures.get(label, 0),
+                "statuses": self.statuses[label],
+                "throughput_rps": round(len(samples) / seconds, 2),
+                "mean_ms": round(sum(samples) / len(samples), 3),
+                "p50_ms": round(_percentile(samples, 50), 3),
+                "p95_ms": round(_percentile(samples, 95), 3),
+                "p99_ms": round(_percentile(samples, 99), 3),
+                "max_ms": round(samples[-1], 3),
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        return {
+            "seconds": round(seconds, 3),
+            "requests": total,
+            "failures": sum(e["failures"] for e in endpoints.values()),
+            "throughput_rps": round(total / seconds, 2),
+            "endpoints": endpoints,
+        }
+
+
+def _percentile(sorted_samples, pct):
+    # nearest-rank percentile
+    rank = max(1, -(-pct * len(sorted_samples) // 100))
+    return sorted_samples[int(rank) - 1]
+
+
+# ------------------ SEEDING ------------------ #
+
+def _books_csv(count, rnd):
+    yield "type,name,author,category,cost,procurement_date,quantity\n"
+    for i in range(count):
+        name = " ".join(rnd.choices(WORDS, k=3)) + f" {i}"
+        kind = "Book" if rnd.random() < 0.85 else "Movie"
+        yield f"{kind},{name},Author {rnd.randrange(2000)},{rnd.choice(CATEGORIES)},100,2024-01-01,1\n"
+
+
+def _members_csv(users, prefix):
+    yield "membership_id,first_name,last_name,phone,address,aadhar,start_date,plan\n"
+    today = date.today().isoformat()
+    for i in range(users):
+        yield f"{prefix}{i:05d},Load,Desk {i},0000000000,Test,000000000000,{today},2y\n"
+
+
+async def _seed(client, args, prefix):
+    login = await client.post(
+        "/api/auth/login",
+        data={"username": args.admin_user, "password": args.admin_password},
+    )
+    login.raise_for_status()
+    rnd = random.Random(args.seed)
+    for path, body in (
+        ("/api/maintenance/import/books", "".join(_books_csv(args.books, rnd))),
+        ("/api/maintenance/import/memberships", "".join(_members_csv(args.users, prefix))),
+    ):
+        r = await client.post(path, content=body, headers={"content-type": "text/csv"})
+        r.raise_for_status()
+        if r.json().get("failed"):
+            raise SystemExit(f"seeding {path} failed: {r.json()['errors'][:3]}")
+
+
+# ------------------ DESK SESSION ------------------ #
+
+async def _desk(client, rec, member, args, deadline, rnd):
+    today = date.today().isoformat()
+    due = (date.today() + timedelta(days=7)).isoformat()
+    r = await rec.call("POST /auth/login", lambda: client.post(
+        "/api/auth/login", data={"username": args.username, "password": args.password},
+    ))
+    if r is None or r.status_code != 200:
+        return
+
+    held, etags = [], {}
+    while time.perf_counter() < deadline:
+        word = rnd.choice(WORDS)
+        r = await rec.call("GET /transactions/availability", lambda: client.get(
+            "/api/transactions/availability", params={"q": word, "limit": 20},
+        ))
+        results = r.json().get("results", []) if r is not None and r.status_code == 200 else []
+
+        if results and len(held) < args.max_held:
+            serial = rnd.choice(results)["serial_no"]
+            r = await rec.call("POST /transactions/issue", lambda: client.post(
+                "/api/transactions/issue",
+                data={"serial_no": serial, "membership_id": member,
+                      "issue_date": today, "planned_return": due},
+            ))
+            if r is not None and r.status_code == 200:
+                held.append(serial)
+
+        path = rnd.choice(REPORTS)
+        headers = {"If-None-Match": etags[path]} if path in etags and rnd.random() < 0.5 else {}
+        r = await rec.call(f"GET {path.removeprefix('/api')}", lambda: client.get(
+            path, params={"limit": 100}, headers=headers,
+        ))
+        if r is not None and "etag" in r.headers:
+            etags[path] = r.headers["etag"]
+
+        if held and (len(held) >= args.max_held or rnd.random() < 0.5):
+            serial = held.pop(0)
+            r = await rec.call("POST /transactions/return/start", lambda: client.post(
+                "/api/transactions/return/start",
+                data={"membership_id": member, "serial_no": serial},
+            ))
+            if r is not None and r.status_code == 200:
+                issue_id = r.json()["issue_id"]
+                await rec.call("POST /transactions/fine", lambda: client.post(
+                    "/api/transactions/fine",
+                    data={"issue_id": issue_id, "actual_return_date": today},
+                ))
+
+        if args.think_ms:
+            await asyncio.sleep(rnd.uniform(0, args.think_ms) / 1000)
+
+
+async def _run(args):
+    lifespan = None
+    if args.url:
+        def client_for():
+            return httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from app.main import app
+
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        transport = httpx.ASGITransport(app=app)
+
+        def client_for():
+            return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout)
+
+    # a fresh prefix per run, so repeated runs against one server don't collide
+    prefix = f"LT{int(time.time()) % 100000:05d}-"
+    try:
+        async with client_for() as admin:
+            await _seed(admin, args, prefix)
+
+        rec = Recorder()
+        clients = [client_for() for _ in range(args.users)]
+        started = time.perf_counter()
+        deadline = started + args.seconds
+        try:
+            await asyncio.gather(*(
+                _desk(c, rec, f"{prefix}{i:05d}", args, deadline, random.Random(args.seed + i))
+                for i, c in enumerate(clients)
+            ))
+        finally:
+            for c in clients:
+                await c.aclose()
+        result = rec.report(time.perf_counter() - started)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    result["config"] = {
+        "url": args.url or "in-process",
+        "users": args.users,
+        "seconds": args.seconds,
+        "books": args.books,
+        "think_ms": args.think_ms,
+        "seed": args.seed,
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="base URL of a running server (default: in-process)")
+    parser.add_argument("--users", type=int, default=20, help="concurrent desk sessions")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--books", type=int, default=5000, help="catalogue titles to seed")
+    parser.add_argument("--max-held", type=int, default=3, help="copies a desk holds before returning")
+    parser.add_argument("--think-ms", type=float, default=0, help="max random pause between steps")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--username", default="user")
+    parser.add_argument("--password", default="user")
+    parser.add_argument("--admin-user", default="adm")
+    parser.add_argument("--admin-password", default="adm")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    if not args.url:
+        os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "loadtest.db"))
+        os.environ.setdefault("SCHEDULER_ENABLED", "0")
+        from app.db_init import init_db
+
+        init_db()
+
+    result = asyncio.run(_run(args))
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for label, e in result["endpoints"].items():
+        print(
+            f"{label:<34} {e['requests']:>7} req {e['throughput_rps']:>8.1f}/s  "
+            f"p50 {e['p50_ms']:>8.2f}  p95 {e['p95_ms']:>8.2f}  p99 {e['p99_ms']:>8.2f} ms"
+            f"  failures {e['failures']}",
+            file=sys.stderr,
+        )
+    sys.exit(1 if result["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
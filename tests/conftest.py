@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# app.db reads its settings at import: point it at a throwaway database
+# before any test module imports the app
+os.environ.setdefault("LIBRARY_DB_PATH", os.path.join(tempfile.mkdtemp(), "test.db"))
+os.environ.setdefault("SCHEDULER_ENABLED", "0")
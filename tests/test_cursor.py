@@ -0,0 +1,21 @@
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers.reports import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips_key_values():
+    assert decode_cursor(encode_cursor(("SC(B/M)000001", 3, 1.5, None))) == [
+        "SC(B/M)000001", 3, 1.5, None,
+    ]
+
+
+@pytest.mark.parametrize("value", [[], [{"a": 1}], ["SC", [1]], {"a": 1}, "SC"])
+def test_cursor_must_be_a_list_of_scalars(value):
+    cursor = base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor)
+    assert e.value.status_code == 400
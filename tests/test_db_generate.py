@@ -0,0 +1,40 @@
+import argparse
+
+import pytest
+
+from app import db, db_generate
+
+
+def _schema_objects():
+    conn = db.get_connection()
+    try:
+        return {
+            tuple(r)
+            for r in conn.execute(
+                "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') "
+                "AND sql IS NOT NULL"
+            )
+        }
+    finally:
+        conn.close()
+
+
+def test_failed_load_puts_indexes_and_triggers_back(monkeypatch):
+    args = argparse.Namespace(
+        books=50, members=10, issues=100, open_ratio=0.05, overdue_ratio=0.3,
+        member_skew=2.0, history_days=60, seed=1, today="2026-01-01",
+    )
+    db_generate.migrate()
+    before = _schema_objects()
+    real_load = db_generate._load
+
+    def failing_load(conn, label, sql, rows):
+        if label == "issues":
+            raise RuntimeError("interrupted")
+        return real_load(conn, label, sql, rows)
+
+    monkeypatch.setattr(db_generate, "_load", failing_load)
+    with pytest.raises(RuntimeError):
+        db_generate.generate(args)
+
+    assert before and _schema_objects() == before
@@ -0,0 +1,16 @@
+from app.http_cache import etag_match, variant_etag
+
+
+def test_encoded_variants_get_distinct_etags():
+    assert variant_etag('"abc"', "identity") == '"abc"'
+    assert variant_etag('"abc"', "gzip") == '"abc-gz"'
+    assert variant_etag('"abc"', "br") == '"abc-br"'
+
+
+def test_if_none_match_accepts_any_variant_as_whole_tokens():
+    assert etag_match('"abc"', '"abc"') == '"abc"'
+    assert etag_match('"x", W/"abc-gz"', '"abc"') == '"abc-gz"'
+    assert etag_match("*", '"abc"') == '"abc"'
+    assert etag_match('"abcd"', '"abc"') is None
+    assert etag_match('"xabc", "ab"', '"abc"') is None
+    assert etag_match(None, '"abc"') is None
@@ -0,0 +1,67 @@
+import asyncio
+import tracemalloc
+
+import pytest
+
+from app import db
+from app.db_init import migrate
+from app.routers import reports
+
+BATCH = 200
+
+
+@pytest.fixture
+def catalogue(monkeypatch):
+    monkeypatch.setattr(reports, "EXPORT_BATCH_SIZE", BATCH)
+    conn = db.get_connection()
+    migrate(conn)
+    conn.execute("DELETE FROM books")
+    conn.commit()
+
+    def grow(rows):
+        start = conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO books(serial_no,name,author,category,status,cost,procurement_date,type) "
+            "VALUES (?,?,?,'Fiction','Available',450.5,'2024-01-01','Book')",
+            [(f"EX{i:08d}", f"Export Title {i}", f"Author {i % 500}") for i in range(start, rows)],
+        )
+        conn.commit()
+
+    yield grow
+    conn.execute("DELETE FROM books")
+    conn.commit()
+    conn.close()
+
+
+def _export_peak(fmt):
+    """Peak traced heap while streaming the whole books export; the body is discarded."""
+
+    async def _consume():
+        query = reports.books_report()
+        names = await db.read(reports._report_columns, query)
+        size = 0
+        async for chunk in reports._stream_export(query, names, fmt):
+            size += len(chunk)
+        return size
+
+    tracemalloc.start()
+    try:
+        size = asyncio.run(_consume())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, peak
+
+
+@pytest.mark.parametrize("fmt", ["csv", "ndjson"])
+def test_export_memory_stays_flat_as_the_table_grows(catalogue, fmt):
+    catalogue(10 * BATCH)
+    _export_peak(fmt)  # warm up: executor thread, pooled connection, statement cache
+    small_size, small_peak = _export_peak(fmt)
+
+    catalogue(100 * BATCH)
+    large_size, large_peak = _export_peak(fmt)
+
+    # the body grew tenfold; one batch in memory at a time keeps the peak put
+    assert large_size > 9 * small_size
+    assert large_peak - small_peak < 256 * 1024, (small_peak, large_peak, large_size)
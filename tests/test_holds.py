@@ -0,0 +1,89 @@
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.db_init import migrate
+from app.routers.transactions import _claim_copy, release_copy
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO members(membership_id,first_name,last_name,phone,address,aadhar,start_date,end_date,status,pending_fine) "
+        "VALUES (?,'Hold','Member','0','-','0','2024-01-01',?,?,0)",
+        [("M1", "2999-01-01", "Active"), ("M2", "2999-01-01", "Active")],
+    )
+    conn.execute(
+        "INSERT INTO books(serial_no,name,author,category,status,cost,procurement_date,type) "
+        "VALUES ('B1','Held Title','A','Fiction','Issued',0,'2024-01-01','Book')"
+    )
+    yield conn
+    conn.close()
+
+
+def _hold(conn, membership_id):
+    conn.execute(
+        "INSERT INTO issue_requests(membership_id,book_name,requested_date,status) "
+        "VALUES (?,'Held Title','2024-01-01','Waiting')",
+        (membership_id,),
+    )
+
+
+def _status(conn, serial_no="B1"):
+    return conn.execute("SELECT status FROM books WHERE serial_no=?", (serial_no,)).fetchone()[0]
+
+
+def test_returned_copy_is_reserved_and_collected_by_the_holder(conn):
+    _hold(conn, "M1")
+    hold = release_copy(conn.cursor(), "B1", date.today())
+    assert hold["membership_id"] == "M1"
+    assert _status(conn) == "Reserved"
+
+    with pytest.raises(HTTPException) as e:
+        _claim_copy(conn.cursor(), "B1", "M2")
+    assert e.value.detail == "Book reserved for another member"
+
+    _claim_copy(conn.cursor(), "B1", "M1")
+    assert _status(conn) == "Issued"
+
+
+def test_claim_refuses_a_held_copy_that_is_no_longer_reserved(conn):
+    _hold(conn, "M1")
+    release_copy(conn.cursor(), "B1", date.today())
+    conn.execute("UPDATE books SET status='Issued' WHERE serial_no='B1'")
+
+    with pytest.raises(HTTPException) as e:
+        _claim_copy(conn.cursor(), "B1", "M1")
+    assert e.value.status_code == 409
+
+
+def test_returned_copy_skips_holds_of_inactive_members(conn):
+    conn.execute("UPDATE members SET end_date='2000-01-01' WHERE membership_id='M1'")
+    _hold(conn, "M1")
+    _hold(conn, "M2")
+    hold = release_copy(conn.cursor(), "B1", date.today())
+    assert hold["membership_id"] == "M2"
+
+
+def test_expire_holds_passes_uncollected_copies_on(conn):
+    from app.scheduler import HOLD_PICKUP_DAYS, expire_holds
+
+    _hold(conn, "M1")
+    _hold(conn, "M2")
+    long_ago = date.today() - timedelta(days=HOLD_PICKUP_DAYS + 1)
+    release_copy(conn.cursor(), "B1", long_ago)
+
+    assert expire_holds(conn, date.today(), "") == (1, None)
+    holds = conn.execute(
+        "SELECT membership_id, status FROM issue_requests ORDER BY request_id"
+    ).fetchall()
+    assert [tuple(h) for h in holds] == [("M1", "Cancelled"), ("M2", "Fulfilled")]
+    assert _status(conn) == "Reserved"
+
+    # nothing left to expire: the copy's new hold was fulfilled today
+    assert expire_holds(conn, date.today(), "") == (0, None)
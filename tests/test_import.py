@@ -0,0 +1,46 @@
+import pytest
+
+from app.routers import maintenance
+from app.routers.maintenance import BOOK_MAX_QUANTITY, _CsvRecords, _parse_book
+
+
+def _book(quantity):
+    return {"type": "book", "name": "Title", "quantity": str(quantity)}
+
+
+def test_book_quantity_is_bounded():
+    assert _parse_book(_book(BOOK_MAX_QUANTITY))[6] == BOOK_MAX_QUANTITY
+    with pytest.raises(ValueError):
+        _parse_book(_book(BOOK_MAX_QUANTITY + 1))
+    with pytest.raises(ValueError):
+        _parse_book(_book(0))
+
+
+def _records(lines):
+    splitter = _CsvRecords()
+    records = []
+    for line in lines:
+        records += splitter.feed(line)
+    return records + splitter.finish()
+
+
+def test_csv_records_may_span_lines_in_quoted_fields():
+    assert _records(['a,"two', 'lines",b', 'c,"say ""hi""",d']) == [
+        'a,"two\nlines",b',
+        'c,"say ""hi""",d',
+    ]
+
+
+def test_stray_quote_in_an_unquoted_field_is_plain_text():
+    assert _records(['Book,5" Floppy,x', "Book,Next,y"]) == ['Book,5" Floppy,x', "Book,Next,y"]
+
+
+def test_unterminated_quote_loses_only_its_own_record(monkeypatch):
+    monkeypatch.setattr(maintenance, "IMPORT_MAX_RECORD_LINES", 3)
+    records = _records(['Book,"open,x', "Book,B,y", "Book,C,z", "Book,D,w"])
+    assert isinstance(records[0], ValueError)
+    assert records[1:] == ["Book,B,y", "Book,C,z", "Book,D,w"]
+
+    records = _records(["Book,A,x", 'Book,"open,x', "Book,B,y"])
+    assert records[0] == "Book,A,x" and isinstance(records[1], ValueError)
+    assert records[2:] == ["Book,B,y"]
@@ -0,0 +1,37 @@
+import sqlite3
+
+import pytest
+from fastapi import HTTPException
+
+from app.db_init import migrate
+from app.routers.maintenance import allocate_serials
+
+
+@pytest.fixture
+def cur():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrate(conn)  # seeds Science as SC(B/M)000001 .. SC(B/M)000004
+    yield conn.cursor()
+    conn.close()
+
+
+def test_serials_stay_within_the_category_code_range(cur):
+    assert allocate_serials(cur, "Book", 3, "Science") == [
+        "SC(B/M)000001", "SC(B/M)000002", "SC(B/M)000003",
+    ]
+    with pytest.raises(HTTPException) as e:
+        allocate_serials(cur, "Book", 2, "Science")
+    assert e.value.status_code == 400
+    # the refused block reserved nothing
+    assert allocate_serials(cur, "Book", 1, "Science") == ["SC(B/M)000004"]
+
+
+def test_first_allocation_checks_the_range_too(cur):
+    with pytest.raises(HTTPException):
+        allocate_serials(cur, "Book", 5, "Economics")
+    assert cur.execute("SELECT COUNT(*) FROM serial_sequences").fetchone()[0] == 0
+
+
+def test_other_categories_get_plain_serials(cur):
+    assert allocate_serials(cur, "Movie", 2, "Poetry") == ["M000001", "M000002"]
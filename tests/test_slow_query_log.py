@@ -0,0 +1,39 @@
+import sqlite3
+
+from app import db
+from app.db import SlowQueryLog, TimedCursor
+
+
+def test_slow_new_statement_replaces_cheapest_entry():
+    log = SlowQueryLog(max_entries=3)
+    for table in ("a", "b", "c"):
+        log.record(None, f"SELECT * FROM {table} WHERE id = 1", None, 0.010)
+
+    log.record(None, "SELECT * FROM d WHERE id = 1", None, 5.0)
+
+    entries = {e["sql"]: e for e in log.top(limit=10)}
+    assert len(entries) == 3
+    assert entries["SELECT * FROM d WHERE id = ?"]["total_ms"] == 5000.0
+    assert "SELECT * FROM a WHERE id = ?" not in entries
+
+
+def test_cheap_new_statement_is_not_kept_over_costlier_ones():
+    log = SlowQueryLog(max_entries=2)
+    log.record(None, "SELECT * FROM a", None, 1.0)
+    log.record(None, "SELECT * FROM b", None, 2.0)
+
+    log.record(None, "SELECT * FROM c", None, 0.010)
+
+    assert {e["sql"] for e in log.top(limit=10)} == {"SELECT * FROM a", "SELECT * FROM b"}
+
+
+def test_threshold_set_between_execute_and_fetch(monkeypatch):
+    monkeypatch.setattr(db, "slow_queries", SlowQueryLog(max_entries=10))
+    monkeypatch.setattr(db, "DB_SLOW_QUERY_MS", 0)
+    conn = sqlite3.connect(":memory:")
+    cur = TimedCursor(conn.cursor()).execute("SELECT 1")
+
+    monkeypatch.setattr(db, "DB_SLOW_QUERY_MS", 1e-9)
+    assert cur.fetchall() == [(1,)]
+    assert [e["sql"] for e in db.slow_queries.top(limit=10)] == ["SELECT ?"]
+    conn.close()
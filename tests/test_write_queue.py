@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+from app import db
+
+
+def _answer(conn):
+    return conn.execute("SELECT 42").fetchone()[0]
+
+
+@pytest.fixture
+def writer():
+    writer = db.WriteQueue(group_wait_ms=0)
+    yield writer
+    writer.stop()
+
+
+def test_writer_survives_a_failed_connection_checkout(writer, monkeypatch):
+    real = db.get_connection
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("unable to open database file")
+        return real()
+
+    monkeypatch.setattr(db, "get_connection", flaky)
+    with pytest.raises(sqlite3.OperationalError):
+        writer.submit(_answer, ()).result(timeout=5)
+    assert writer.submit(_answer, ()).result(timeout=5) == 42
+
+
+def test_writer_survives_a_failing_group(writer, monkeypatch):
+    def broken(conn, op):
+        raise RuntimeError("bug in the group loop")
+
+    monkeypatch.setattr(writer, "_group", broken)
+    with pytest.raises(RuntimeError):
+        writer.submit(_answer, ()).result(timeout=5)
+
+    monkeypatch.undo()
+    assert writer.submit(_answer, ()).result(timeout=5) == 42
+